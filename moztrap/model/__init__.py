@@ -7,11 +7,17 @@ from django.dispatch import receiver
 
 from registration.models import RegistrationProfile
 
-from .mtmodel import ConcurrencyError
+from .mtmodel import (
+    ConcurrencyError, post_soft_delete, post_undelete, track_choices,
+    bump_choices_generation, defer)
 from .core.models import MTModel, Product, ProductVersion, ApiKey
 from .core.auth import User, Role, Permission
-from .environments.models import Environment, Profile, Element, Category
-from .execution.models import Run, RunSuite, RunCaseVersion, Result, StepResult
+from .environments.models import (
+    Environment, Profile, Element, Category, ProfileTooLarge,
+    EnvironmentMatrix)
+from .execution.models import (
+    Run, RunSuite, RunCaseVersion, Result, StepResult, RunResultSummary,
+    RunCaseVersionStatus)
 from .library.bulk import BulkParser
 from .library.models import (
     Case, CaseVersion, CaseAttachment, CaseStep, Suite, SuiteCase)
@@ -21,19 +27,89 @@ from .tags.models import Tag
 API_VERSION = "v1"
 
 
-@receiver(signals.post_save, sender=Tag)
+# Models listed as choices of list filters, or queried by paginated lists;
+# filter choices (moztrap.view.lists.filters.ModelFilter) and list totals
+# (moztrap.view.lists.pagination.cached_count) are cached by generation.
+# MTModels bump their own generation on save, bulk create, queryset update and
+# (un)delete; their many-to-many tables on changes through related managers.
+_tracked = [
+    Tag, User, Role, Element, Suite, Run, Product, ProductVersion,
+    Case, CaseVersion, RunCaseVersion, Result, Environment, Profile, Category,
+    ]
+track_choices(*_tracked)
+track_choices(*[
+        f.rel.through for m in _tracked for f in m._meta.many_to_many
+        if f.rel.through._meta.auto_created
+        ])
+
+
+
 @receiver(signals.post_save, sender=User)
 @receiver(signals.post_save, sender=Role)
-@receiver(signals.post_save, sender=Element)
-@receiver(signals.post_save, sender=Suite)
-@receiver(signals.post_save, sender=Run)
-@receiver(signals.post_save, sender=Product)
-@receiver(signals.post_save, sender=ProductVersion)
+@receiver(signals.post_delete, sender=User)
+@receiver(signals.post_delete, sender=Role)
 def invalidate_model_choices(sender, instance, **kwargs):
-    """This makes sure that the model choices for forms related to these
-    are invalidated when changes are made.
+    """Start a new choices generation for the non-MTModel choice models."""
+    bump_choices_generation(sender)
+
+
+
+@receiver(signals.m2m_changed)
+def invalidate_m2m_choices(sender, action, **kwargs):
+    """Start a new choices generation for a changed many-to-many table."""
+    if action.startswith("post_"):
+        bump_choices_generation(sender)
+
+
+
+@receiver(signals.m2m_changed, sender=Environment.elements.through)
+def update_environment_fingerprints(sender, instance, action, reverse, pk_set,
+                                    **kwargs):
+    """Keep fingerprints of environments whose elements changed current."""
+    if not reverse:
+        if action.startswith("post_"):
+            Environment.update_fingerprints([instance.pk])
+            instance._element_names = None
+            instance.fingerprint = Environment._base_manager.filter(
+                pk=instance.pk).values_list("fingerprint", flat=True)[0]
+    elif action == "pre_clear":
+        instance._fingerprint_env_ids = list(
+            Environment._base_manager.filter(elements=instance).values_list(
+                "id", flat=True))
+    elif action == "post_clear":
+        Environment.update_fingerprints(
+            getattr(instance, "_fingerprint_env_ids", []))
+    elif action.startswith("post_"):
+        Environment.update_fingerprints(pk_set)
+
+
+
+@receiver(post_soft_delete, sender=Result)
+@receiver(post_undelete, sender=Result)
+@receiver(post_soft_delete, sender=RunCaseVersion)
+@receiver(post_undelete, sender=RunCaseVersion)
+def rebuild_result_summaries(sender, pks, **kwargs):
+    """Rebuild summaries of runs whose results or rcvs were (un)deleted."""
+    if sender is Result:
+        # results of deleted rcvs aren't counted, so (un)deleting them
+        # changes nothing; a cascade (un)deleting their rcvs as well is
+        # covered by the rcvs' own signal.
+        runs = Run.everything.filter(
+            runcaseversions__results__in=pks,
+            runcaseversions__deleted_on__isnull=True,
+            )
+    else:
+        runs = Run.everything.filter(runcaseversions__in=pks)
+    defer(
+        RunResultSummary.rebuild,
+        runs.values_list("id", flat=True).distinct())
+
+
 
-    The place where the caching is set is in
-    moztrap.view.lists.filters.ModelFilter
-    """
-    MTModel.delete_modelfilter_choices_cache(sender)
+@receiver(post_soft_delete, sender=Result)
+@receiver(post_undelete, sender=Result)
+def refresh_current_statuses(sender, pks, **kwargs):
+    """Refresh current statuses of rcvs whose results were (un)deleted."""
+    RunCaseVersionStatus.refresh(
+        Result.everything.filter(pk__in=pks).values_list(
+            "runcaseversion", flat=True).distinct())
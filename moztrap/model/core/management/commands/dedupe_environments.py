@@ -0,0 +1,142 @@
+"""
+Management command to report (and optionally merge) duplicate environments.
+
+"""
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, get_models
+
+from moztrap.model.environments.models import (
+    Environment, HasEnvironmentsModel)
+from moztrap.model.execution.models import (
+    Result, RunCaseVersion, RunResultSummary)
+from moztrap.model.mtmodel import bump_choices_generation
+
+
+
+class Command(BaseCommand):
+    help = (
+        "Reports environments with identical element sets. With --merge, "
+        "points every product version, run, case version and run case "
+        "version at the lowest-id environment of each set instead, and "
+        "deletes the others."
+        )
+    option_list = BaseCommand.option_list + (
+        make_option("--merge",
+                    action="store_true",
+                    dest="merge",
+                    default=False,
+                    help="Merge duplicates instead of only reporting them."),
+        )
+
+
+    def handle(self, *args, **options):
+        verbosity = int(options.get("verbosity", 1))
+
+        fingerprints = (
+            Environment.objects.exclude(fingerprint="").order_by().values(
+                "fingerprint").annotate(num=Count("id")).filter(
+                num__gt=1).values_list("fingerprint", flat=True)
+            )
+
+        groups = 0
+        merged = 0
+        for fingerprint in fingerprints:
+            envs = list(
+                Environment.objects.filter(fingerprint=fingerprint).order_by(
+                    "id").select_related("profile"))
+            keeper, duplicates = envs[0], envs[1:]
+            groups += 1
+            if verbosity:
+                self.stdout.write(
+                    "Environment {0} ({1}) is duplicated by {2}\n".format(
+                        keeper.id,
+                        keeper,
+                        ", ".join(str(e.id) for e in duplicates),
+                        )
+                    )
+            if options["merge"]:
+                merged += self.merge(keeper, duplicates, verbosity)
+
+        if verbosity:
+            if options["merge"]:
+                self.stdout.write(
+                    "Merged {0} duplicate environment(s) of {1} set(s).\n"
+                    .format(merged, groups))
+            else:
+                self.stdout.write(
+                    "Found {0} duplicated element set(s).\n".format(groups))
+
+
+    def merge(self, keeper, duplicates, verbosity):
+        """
+        Replace ``duplicates`` with ``keeper`` everywhere; return number.
+
+        Duplicates that have results are reported and left alone, since
+        results (and the summaries built from them) record the environment
+        they were run in. Duplicates that belong to a profile other than the
+        keeper's stay in that profile, but are no longer used anywhere else.
+        Result summaries of runs whose case versions' environments change are
+        rebuilt, as their totals count those environments.
+
+        """
+        with_results = set(
+            Result.everything.filter(
+                environment__in=duplicates).values_list(
+                "environment", flat=True).distinct()
+            )
+        duplicates = [d for d in duplicates if d.id not in with_results]
+        for env_id in sorted(with_results):
+            if verbosity:
+                self.stdout.write(
+                    "Environment {0} has results; not merged.\n".format(
+                        env_id))
+        if not duplicates:
+            return 0
+
+        with transaction.commit_on_success():
+            run_ids = set(
+                RunCaseVersion.environments.through.objects.filter(
+                    environment__in=duplicates).values_list(
+                    "runcaseversion__run", flat=True)
+                )
+            for through, from_name in env_through_tables():
+                for dup in duplicates:
+                    having = list(
+                        through.objects.filter(
+                            environment=keeper).values_list(
+                            from_name, flat=True)
+                        )
+                    through.objects.filter(
+                        environment=dup,
+                        **{"{0}__in".format(from_name): having}).delete()
+                    through.objects.filter(environment=dup).update(
+                        environment=keeper)
+                bump_choices_generation(through)
+            RunResultSummary.rebuild(run_ids)
+
+            Environment.objects.filter(
+                pk__in=[
+                    d.id for d in duplicates
+                    if d.profile_id in [None, keeper.profile_id]
+                    ]
+                ).delete()
+
+        return len(duplicates)
+
+
+
+def env_through_tables():
+    """
+    Return (through model, object field name) of each environments relation.
+
+    """
+    tables = []
+    for model in get_models():
+        if issubclass(model, HasEnvironmentsModel):
+            field = model.environments.field
+            tables.append(
+                (field.rel.through, "{0}_id".format(field.m2m_field_name())))
+    return tables
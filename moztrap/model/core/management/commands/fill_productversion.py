@@ -0,0 +1,75 @@
+"""
+Management command to clone the test cases of one product version into another.
+
+"""
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from moztrap.model.core.auth import User
+from moztrap.model.core.models import ProductVersion
+from moztrap.model.library.models import CaseVersion
+
+
+
+class Command(BaseCommand):
+    args = "<from_productversion_id> <to_productversion_id>"
+    help = (
+        "Clones the caseversions of the first product version into the "
+        "second, for every case that has no version there yet, reporting "
+        "progress as it goes. Safe to re-run if interrupted."
+        )
+    option_list = BaseCommand.option_list + (
+        make_option("--user",
+                    dest="username",
+                    default=None,
+                    help="Username to record as creator of the clones."),
+        make_option("--batch-size",
+                    type="int",
+                    dest="batch_size",
+                    default=500,
+                    help="Number of caseversions to clone per transaction."),
+        )
+
+
+    def handle(self, *args, **options):
+        if not len(args) == 2:
+            raise CommandError("Usage: {0}".format(self.args))
+
+        try:
+            source, target = [
+                ProductVersion.objects.get(pk=int(a)) for a in args]
+        except (ValueError, ProductVersion.DoesNotExist):
+            raise CommandError(
+                "Product versions must be ids of existing product versions.")
+        if source.product_id != target.product_id:
+            raise CommandError(
+                "Product versions must be versions of the same product.")
+
+        user = None
+        if options["username"]:
+            try:
+                user = User.objects.get(username=options["username"])
+            except User.DoesNotExist:
+                raise CommandError(
+                    'User "{0}" does not exist'.format(options["username"]))
+
+        verbosity = int(options.get("verbosity", 1))
+
+        def progress(done, total):
+            if verbosity:
+                self.stdout.write(
+                    "Cloned {0} of {1} caseversion(s)\n".format(done, total))
+
+        count = CaseVersion.clone_forward(
+            source,
+            target,
+            user=user,
+            batch_size=max(options["batch_size"], 1),
+            progress=progress,
+            )
+
+        if verbosity:
+            self.stdout.write(
+                "Cloned {0} caseversion(s) from {1} into {2}.\n".format(
+                    count, source, target))
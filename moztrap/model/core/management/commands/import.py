@@ -28,16 +28,73 @@ The data must be in JSON format and structured like this::
         ]
     }
 
+With ``--stream``, files are parsed incrementally and cases imported in
+chunks, so memory use doesn't grow with file size. With ``--workers``, the
+files of a directory are imported in parallel worker processes. Either way
+each file is imported in its own transaction, and progress is reported as
+files (and chunks of cases) are imported.
+
 """
 
 from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
 
+from multiprocessing import Pool
 from optparse import make_option
 import json
 import os.path
+import time
 
 from moztrap.model.core.models import Product, ProductVersion
 from moztrap.model.library.importer import Importer
+from moztrap.model.library.jsonstream import iter_sections
+
+
+
+def import_file(productversion, path, force_dupes=False, bulk=False,
+                stream=False, progress=None):
+    """
+    Import one JSON file into ``productversion``; return ImportResult.
+
+    Raises ``ValueError`` if the file can't be parsed as JSON.
+
+    """
+    with open(path) as fh:
+        if stream:
+            return Importer().import_stream(
+                productversion,
+                iter_sections(fh),
+                force_dupes=force_dupes,
+                bulk=bulk,
+                progress=progress,
+                )
+
+        case_data = json.load(fh)
+
+        # @@@: support importing as CSV.  Rather than returning an
+        # error above, just try CSV import instead.
+
+        return Importer().import_data(
+            productversion,
+            case_data,
+            force_dupes=force_dupes,
+            bulk=bulk,
+            )
+
+
+
+def _import_file_worker(job):
+    """
+    Import one file in a worker process; return (path, result, seconds).
+
+    ``job`` is a (productversion id, path, import_file keyword args) tuple.
+
+    """
+    productversion_id, path, kwargs = job
+    start = time.time()
+    result = import_file(
+        ProductVersion.objects.get(pk=productversion_id), path, **kwargs)
+    return path, result, time.time() - start
 
 
 
@@ -56,6 +113,30 @@ class Command(BaseCommand):
             default=False,
             help="Force importing cases, even if the case name is a"
             " duplicate"),
+        make_option(
+            "-b",
+            "--bulk",
+            action='store_true',
+            dest="bulk",
+            default=False,
+            help="Import cases with bulk inserts; much faster for large"
+            " files"),
+        make_option(
+            "-s",
+            "--stream",
+            action='store_true',
+            dest="stream",
+            default=False,
+            help="Parse files incrementally, importing cases in chunks;"
+            " memory use doesn't grow with file size"),
+        make_option(
+            "-w",
+            "--workers",
+            type="int",
+            dest="workers",
+            default=1,
+            help="Number of worker processes to import the files of a"
+            " directory with"),
 
         )
 
@@ -63,7 +144,14 @@ class Command(BaseCommand):
         if not len(args) == 3:
             raise CommandError("Usage: {0}".format(self.args))
 
-        force_dupes = options.get("force_dupes")
+        import_kwargs = {
+            "force_dupes": options.get("force_dupes"),
+            "bulk": options.get("bulk"),
+            "stream": options.get("stream"),
+            }
+        workers = options.get("workers") or 1
+        # progress is only reported when asked for a streaming/parallel import
+        self.report = import_kwargs["stream"] or workers > 1
 
         try:
             product = Product.objects.get(name=args[0])
@@ -89,42 +177,110 @@ class Command(BaseCommand):
             else:
                 files.append(args[2])
 
+            start = time.time()
+            if workers > 1 and len(files) > 1:
+                imported = self.import_parallel(
+                    product_version, files, workers, import_kwargs)
+            else:
+                imported = self.import_serial(
+                    product_version, files, import_kwargs)
+
             results_for_files = None
-            for file in files:
-                with open(file) as fh:
-
-                    # try to import this as JSON
-                    try:
-                        case_data = json.load(fh)   # pragma: no branch
-                    except ValueError as e:
-                        raise CommandError(
-                            "Could not parse JSON: {0}: {1}".format(
-                                str(e),
-                                fh,
-                                ))
-
-                    # @@@: support importing as CSV.  Rather than returning an
-                    # error above, just try CSV import instead.
-
-                    result = Importer().import_data(
-                        product_version, case_data, force_dupes=force_dupes)
-
-                    # append this result to those for any of the other files.
-                    if not results_for_files:
-                        results_for_files = result
-                    else:
-                        results_for_files.append(result)  # pragma: no branch
+            for file, result, seconds in imported:
+                self.progress(
+                    "{0}: {1} cases, {2} suites in {3}\n".format(
+                        file,
+                        result.num_cases,
+                        result.num_suites,
+                        self.throughput(result.num_cases, seconds),
+                        )
+                    )
+
+                # append this result to those for any of the other files.
+                if not results_for_files:
+                    results_for_files = result
+                else:
+                    results_for_files.append(result)  # pragma: no branch
 
             if results_for_files:
+                self.progress(
+                    "Total: {0} cases in {1}\n".format(
+                        results_for_files.num_cases,
+                        self.throughput(
+                            results_for_files.num_cases, time.time() - start),
+                        )
+                    )
                 result_list = results_for_files.get_as_list()
                 result_list.append("")
                 self.stdout.write("\n".join(result_list))
             else:
                 self.stdout.write("No files found to import.\n")
 
-
         except IOError as (errno, strerror):
             raise CommandError(
                 'Could not open "{0}", I/O error {1}: {2}'.format(
                     args[2], errno, strerror)
                 )
+
+
+    def import_serial(self, productversion, files, import_kwargs):
+        """Import files one by one; yield (path, result, seconds) for each."""
+        for file in files:
+            start = time.time()
+
+            def progress(result):
+                self.progress(
+                    "{0}: {1} cases so far, {2}\n".format(
+                        file,
+                        result.num_cases,
+                        self.throughput(result.num_cases, time.time() - start),
+                        )
+                    )
+
+            try:
+                result = import_file(
+                    productversion, file, progress=progress, **import_kwargs)
+            except ValueError as e:
+                raise CommandError(
+                    "Could not parse JSON: {0}: {1}".format(str(e), file))
+            yield file, result, time.time() - start
+
+
+    def import_parallel(self, productversion, files, workers, import_kwargs):
+        """
+        Import files in a pool of worker processes.
+
+        Yields (path, result, seconds) for each file as it is finished. Each
+        worker opens its own database connection, so ours is closed first
+        rather than shared with the forked workers.
+
+        """
+        connection.close()
+        pool = Pool(processes=min(workers, len(files)))
+        try:
+            jobs = [(productversion.id, file, import_kwargs) for file in files]
+            results = pool.imap_unordered(_import_file_worker, jobs)
+            while True:
+                try:
+                    imported = next(results)
+                except StopIteration:
+                    break
+                except ValueError as e:
+                    raise CommandError(
+                        "Could not parse JSON: {0}".format(str(e)))
+                yield imported
+        finally:
+            pool.terminate()
+            pool.join()
+
+
+    def progress(self, message):
+        """Write a progress message, if reporting progress."""
+        if self.report:
+            self.stdout.write(message)
+
+
+    def throughput(self, num_cases, seconds):
+        """Return description of elapsed time and cases per second."""
+        return "{0:.1f}s ({1:.0f} cases/s)".format(
+            seconds, num_cases / seconds if seconds else 0)
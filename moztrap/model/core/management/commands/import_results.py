@@ -0,0 +1,136 @@
+"""
+Import test results from a newline-delimited JSON (NDJSON) file.
+
+Each line of the file is one result record, formed like the objects submitted
+to the result API endpoint::
+
+    {"run_id": 1, "case": 14, "environment": 23, "status": "passed"}
+    {"run_id": 1, "case": 15, "environment": 23, "status": "failed", "comment": "why u no pass?", "stepnumber": 1, "bug": "http://example.com/bug/1"}
+
+Blank lines are ignored. The file is read one line at a time, so memory use
+doesn't depend on its size; records are recorded and committed in batches.
+Invalid records are reported (with their line number) and skipped, without
+affecting the rest of their batch.
+
+"""
+from optparse import make_option
+import json
+import sys
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from moztrap.model.core.auth import User
+from moztrap.model.execution.models import record_results
+
+
+
+class Command(BaseCommand):
+    args = "<username> <filename>"
+    help = (
+        "Imports results from an NDJSON file (one result per line, or '-' "
+        "for stdin), recorded as run by the given user.")
+
+    option_list = BaseCommand.option_list + (
+        make_option(
+            "-b",
+            "--batch-size",
+            type="int",
+            dest="batch_size",
+            default=1000,
+            help="Number of records to record and commit at a time."),
+        )
+
+
+    def handle(self, *args, **options):
+        if not len(args) == 2:
+            raise CommandError("Usage: {0}".format(self.args))
+
+        try:
+            user = User.objects.get(username=args[0])
+        except User.DoesNotExist:
+            raise CommandError('User "{0}" does not exist'.format(args[0]))
+
+        batch_size = max(options["batch_size"], 1)
+        self.imported = 0
+        self.errors = 0
+
+        try:
+            if args[1] == "-":
+                self.import_file(sys.stdin, user, batch_size)
+            else:
+                with open(args[1]) as fh:
+                    self.import_file(fh, user, batch_size)
+        except IOError as (errno, strerror):
+            raise CommandError(
+                'Could not open "{0}", I/O error {1}: {2}'.format(
+                    args[1], errno, strerror)
+                )
+
+        self.stdout.write(
+            "Imported {0} record(s), {1} error(s).\n".format(
+                self.imported, self.errors))
+        if self.errors:
+            raise CommandError(
+                "{0} record(s) could not be imported.".format(self.errors))
+
+
+    def import_file(self, fh, user, batch_size):
+        """Read records from open file ``fh``, recording them in batches."""
+        batch = []
+        for lineno, line in enumerate(fh, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                if not isinstance(record, dict):
+                    raise ValueError("not a JSON object")
+            except ValueError as e:
+                self.error(lineno, "Could not parse JSON: {0}".format(e))
+                continue
+            batch.append((lineno, record))
+            if len(batch) >= batch_size:
+                self.import_batch(batch, user)
+                batch = []
+        if batch:
+            self.import_batch(batch, user)
+
+
+    @transaction.commit_on_success
+    def import_batch(self, batch, user):
+        """
+        Record and commit a batch of (line number, record) pairs.
+
+        The batch is recorded in one go; if any record in it is invalid, that
+        is rolled back to a savepoint and the records are recorded one at a
+        time, each in its own savepoint, so the invalid ones can be reported
+        and skipped.
+
+        """
+        sid = transaction.savepoint()
+        try:
+            record_results([r for _, r in batch], user, batch_size=len(batch))
+        except ValidationError:
+            transaction.savepoint_rollback(sid)
+        else:
+            transaction.savepoint_commit(sid)
+            self.imported += len(batch)
+            return
+
+        for lineno, record in batch:
+            sid = transaction.savepoint()
+            try:
+                record_results([record], user)
+            except ValidationError as e:
+                transaction.savepoint_rollback(sid)
+                self.error(lineno, "; ".join(e.messages))
+            else:
+                transaction.savepoint_commit(sid)
+                self.imported += 1
+
+
+    def error(self, lineno, message):
+        """Report an error for the record on line ``lineno``."""
+        self.errors += 1
+        self.stderr.write("Line {0}: {1}\n".format(lineno, message))
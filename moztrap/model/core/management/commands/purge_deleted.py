@@ -0,0 +1,138 @@
+"""
+Management command to permanently remove long soft-deleted rows.
+
+"""
+from optparse import make_option
+import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import get_models
+
+from moztrap.model.mtmodel import MTModel, cascade_relations, utcnow
+
+
+
+class Command(BaseCommand):
+    help = (
+        "Permanently removes rows that were soft-deleted more than the given "
+        "number of days ago, in small batches."
+        )
+    option_list = BaseCommand.option_list + (
+        make_option("--days",
+                    type="int",
+                    dest="days",
+                    default=90,
+                    help="Purge rows deleted more than this many days ago."),
+        make_option("--batch-size",
+                    type="int",
+                    dest="batch_size",
+                    default=500,
+                    help="Number of rows to remove per transaction."),
+        make_option("--sleep",
+                    type="float",
+                    dest="sleep",
+                    default=0.0,
+                    help="Seconds to pause between batches."),
+        make_option("--dry-run",
+                    action="store_true",
+                    dest="dry_run",
+                    default=False,
+                    help="Only report what would be purged."),
+        )
+
+
+    def handle(self, *args, **options):
+        if options["days"] < 0:
+            raise CommandError("--days must not be negative.")
+        cutoff = utcnow() - datetime.timedelta(days=options["days"])
+        batch_size = max(options["batch_size"], 1)
+        verbosity = int(options.get("verbosity", 1))
+
+        total = 0
+        for model in purge_order():
+            deleted = model.everything.filter(deleted_on__lt=cutoff)
+            name = model._meta.object_name
+            if options["dry_run"]:
+                count = deleted.count()
+                if count and verbosity:
+                    self.stdout.write(
+                        "{0}: up to {1} row(s) would be purged\n".format(
+                            name, count))
+            else:
+                count = self.purge(
+                    model, deleted, batch_size, options["sleep"])
+                if count and verbosity:
+                    self.stdout.write(
+                        "{0}: {1} row(s) purged\n".format(name, count))
+            total += count
+
+        if verbosity:
+            self.stdout.write(
+                "{0} {1} row(s) deleted before {2:%Y-%m-%d %H:%M}.\n".format(
+                    "Would purge up to" if options["dry_run"] else "Purged",
+                    total,
+                    cutoff,
+                    )
+                )
+
+
+    def purge(self, model, deleted, batch_size, sleep):
+        """
+        Permanently delete rows of ``deleted`` in batches; return number.
+
+        Rows still referenced by rows of other models they cascade to (which
+        weren't purged, because they were deleted more recently or not at
+        all) are left alone, so a purge never removes anything that isn't
+        itself due.
+
+        """
+        for related in cascade_relations(model):
+            deleted = deleted.filter(
+                **{"{0}__isnull".format(
+                        related.field.related_query_name()): True})
+
+        count = 0
+        last = 0
+        while True:
+            pks = list(
+                deleted.filter(pk__gt=last).order_by("pk").values_list(
+                    "pk", flat=True)[:batch_size])
+            if not pks:
+                break
+            last = pks[-1]
+            with transaction.commit_on_success():
+                model.everything.filter(pk__in=pks).delete(permanent=True)
+            count += len(pks)
+            if sleep:
+                time.sleep(sleep)
+        return count
+
+
+
+def purge_order():
+    """
+    Return all ``MTModel`` classes, each after those that cascade to it.
+
+    Purging in this order removes dependent rows (results, say) before the
+    rows they depend on (runcaseversions), so each batch's own permanent
+    delete cascade stays small.
+
+    """
+    models = [m for m in get_models() if issubclass(m, MTModel)]
+    ordered = []
+    visiting = set()
+
+    def visit(model):
+        if model in ordered or model in visiting:
+            return
+        visiting.add(model)
+        for related in cascade_relations(model):
+            visit(related.model)
+        visiting.discard(model)
+        ordered.append(model)
+
+    for model in sorted(models, key=lambda m: m._meta.db_table):
+        visit(model)
+    return ordered
@@ -0,0 +1,112 @@
+"""
+Management command to rebuild (or check) the denormalized run result summaries
+and runcaseversion current statuses.
+
+"""
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from moztrap.model.execution.models import (
+    Run, RunResultSummary, RunCaseVersionStatus)
+
+
+
+class Command(BaseCommand):
+    args = "[run_id run_id ...]"
+    help = (
+        "Rebuild run result summaries and current statuses from results, for "
+        "the given runs (default all), and check them against the results."
+        )
+    option_list = BaseCommand.option_list + (
+        make_option("--check",
+                    action="store_true",
+                    dest="check",
+                    default=False,
+                    help="Only check the summaries, don't rebuild them."),
+        make_option("--batch-size",
+                    type="int",
+                    dest="batch_size",
+                    default=100,
+                    help="Number of runs to rebuild per transaction."),
+        )
+
+
+    def handle(self, *args, **options):
+        try:
+            run_ids = [int(a) for a in args]
+        except ValueError:
+            raise CommandError("Run ids must be integers.")
+        if not run_ids:
+            run_ids = list(
+                Run.everything.order_by("id").values_list("id", flat=True))
+
+        batch_size = max(options["batch_size"], 1)
+        verbosity = int(options.get("verbosity", 1))
+        mismatches = 0
+        for i in range(0, len(run_ids), batch_size):
+            batch = run_ids[i:i + batch_size]
+            if not options["check"]:
+                with transaction.commit_on_success():
+                    RunResultSummary.rebuild(batch)
+                    RunCaseVersionStatus.rebuild(batch)
+                if verbosity:
+                    self.stdout.write(
+                        "Rebuilt result summaries for {0} run(s)\n".format(
+                            len(batch)))
+            mismatches += self.check_runs(batch)
+            mismatches += self.check_statuses(batch)
+
+        if mismatches:
+            raise CommandError(
+                "{0} result summary count(s) or status(es) don't match "
+                "results.".format(mismatches))
+        if verbosity:
+            self.stdout.write(
+                "Result summaries of {0} run(s) match results.\n".format(
+                    len(run_ids)))
+
+
+    def check_runs(self, run_ids):
+        """Report summary counts that don't match results; return number."""
+        live = RunResultSummary.live(run_ids)
+        stored = dict(
+            ((run_id, env_id, status), count)
+            for run_id, env_id, status, count
+            in RunResultSummary.objects.filter(run__in=run_ids).values_list(
+                "run", "environment", "status", "count")
+            )
+        mismatches = 0
+        for key in sorted(set(live).union(stored)):
+            if live.get(key, 0) != stored.get(key, 0):
+                mismatches += 1
+                self.stdout.write(
+                    "Run {0}, environment {1}, {2}: "
+                    "summary {3}, results {4}\n".format(
+                        key[0], key[1], key[2],
+                        stored.get(key, 0), live.get(key, 0))
+                    )
+        return mismatches
+
+
+    def check_statuses(self, run_ids):
+        """Report current statuses that don't match results; return number."""
+        live = RunCaseVersionStatus.live(run_ids)
+        stored = dict(
+            ((rcv_id, env_id), status)
+            for rcv_id, env_id, status
+            in RunCaseVersionStatus.objects.filter(
+                runcaseversion__run__in=run_ids).values_list(
+                "runcaseversion", "environment", "status")
+            )
+        mismatches = 0
+        for key in sorted(set(live).union(stored)):
+            if live.get(key) != stored.get(key):
+                mismatches += 1
+                self.stdout.write(
+                    "Runcaseversion {0}, environment {1}: "
+                    "status {2}, results {3}\n".format(
+                        key[0], key[1], stored.get(key), live.get(key))
+                    )
+        return mismatches
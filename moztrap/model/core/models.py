@@ -5,7 +5,7 @@ Core MozTrap models (Product).
 import uuid
 
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import connection, models, transaction
 
 from pkg_resources import parse_version
 from preferences.models import Preferences
@@ -33,12 +33,14 @@ class Product(MTModel, TeamModel):
         ordering = ["name"]
 
 
+    clone_cascade = ["team"]
+
+
     def clone(self, *args, **kwargs):
         """
         Clone Product, with team.
 
         """
-        kwargs.setdefault("cascade", ["team"])
         overrides = kwargs.setdefault("overrides", {})
         overrides.setdefault("name", "Cloned: {0}".format(self.name))
         return super(Product, self).clone(*args, **kwargs)
@@ -51,25 +53,55 @@ class Product(MTModel, TeamModel):
         If an ``update_instance`` is given, update it with new order and
         ``latest`` flag.
 
+        Versions are ordered in Python (version strings don't sort in SQL),
+        but saved with a single ``UPDATE ... CASE`` statement, and the latest
+        caseversion of every case of the product is then recomputed with a
+        constant number of statements, however many cases there are.
+
         """
-        ordered = sorted(self.versions.all(), key=by_version)
-        for i, version in enumerate(ordered, 1):
-            version.order = i
-            version.latest = (i == len(ordered))
-            version.save(force_update=True, skip_reorder=True, notrack=True)
-            if version == update_instance:
-                update_instance.order = version.order
-                update_instance.latest = version.latest
-                update_instance.cc_version += 1
-        # now we have to update latest caseversions too, @@@ too slow?
-        for case in self.cases.all():
-            case.set_latest_version()
+        ordered = [
+            version_id for version_id, version in sorted(
+                self.versions.values_list("id", "version"),
+                key=lambda v: parse_version(v[1]),
+                )
+            ]
+        if not ordered:
+            return
+        latest_id = ordered[-1]
+
+        qn = connection.ops.quote_name
+        sql = """UPDATE {table}
+            SET {order} = CASE id {cases} END,
+                latest = CASE id WHEN {latest_id:d} THEN %s ELSE %s END,
+                cc_version = cc_version + 1
+            WHERE id IN ({ids})
+            """.format(
+            table=ProductVersion._meta.db_table,
+            order=qn("order"),
+            cases=" ".join(
+                "WHEN {0:d} THEN {1:d}".format(version_id, i)
+                for i, version_id in enumerate(ordered, 1)
+                ),
+            latest_id=latest_id,
+            ids=", ".join(str(version_id) for version_id in ordered),
+            )
+        cursor = connection.cursor()
+        cursor.execute(sql, [True, False])
+        transaction.set_dirty()
+
+        if update_instance is not None and update_instance.id in ordered:
+            update_instance.order = ordered.index(update_instance.id) + 1
+            update_instance.latest = (update_instance.id == latest_id)
+            update_instance.cc_version += 1
+
+        # now we have to update latest caseversions too
+        Product.cases.related.model.set_latest_versions(self)
 
 
 
 class ProductVersion(MTModel, TeamModel, HasEnvironmentsModel):
     product = models.ForeignKey(Product, related_name="versions")
-    version = models.CharField(max_length=100)
+    version = models.CharField(max_length=100, db_index=True)
     codename = models.CharField(max_length=100, blank=True)
     order = models.IntegerField(default=0, editable=False)
     # denormalized for querying
@@ -156,6 +188,9 @@ class ProductVersion(MTModel, TeamModel, HasEnvironmentsModel):
         return {Run: runs, CaseVersion: caseversions}
 
 
+    clone_cascade = ["environments", "team"]
+
+
     def clone(self, *args, **kwargs):
         """
         Clone ProductVersion, with ".next" version and "Cloned:" codename.
@@ -164,7 +199,6 @@ class ProductVersion(MTModel, TeamModel, HasEnvironmentsModel):
         overrides = kwargs.setdefault("overrides", {})
         overrides["version"] = "%s.next" % self.version
         overrides["codename"] = "Cloned: %s" % self.codename
-        kwargs.setdefault("cascade", ["environments", "team"])
         return super(ProductVersion, self).clone(*args, **kwargs)
 
 
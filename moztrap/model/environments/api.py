@@ -121,6 +121,40 @@ class EnvironmentResource(MTResource):
         return Environment
 
 
+    def apply_filters(self, request, applicable_filters):
+        """
+        Also filter by exact set of elements, optionally within a run or
+        product version.
+
+        Each ``element_set`` parameter is an element id or name; the result
+        is the environments with exactly those elements, found by
+        fingerprint. ``run`` or ``productversion`` (an id) restrict that to
+        the environments of the given run or product version.
+
+        """
+        qs = super(EnvironmentResource, self).apply_filters(
+            request, applicable_filters)
+        elements = request.GET.getlist("element_set")
+        if not elements:
+            return qs
+
+        within = None
+        from ..core.models import ProductVersion
+        from ..execution.models import Run
+        for param, model in [("run", Run), ("productversion", ProductVersion)]:
+            if request.GET.get(param):
+                try:
+                    within = model.objects.get(pk=int(request.GET[param]))
+                except (ValueError, model.DoesNotExist):
+                    error_msg = "{0} must be the id of an existing {0}.".format(
+                        param)
+                    logger.error(error_msg)
+                    raise ImmediateHttpResponse(
+                        response=http.HttpBadRequest(error_msg))
+        return qs.filter(
+            pk__in=Environment.matching(elements, within).values("pk"))
+
+
     def hydrate_m2m(self, bundle):
         """Validate the elements,
         which should each belong to separate categories."""
@@ -2,12 +2,37 @@
 Models for environments.
 
 """
+import hashlib
 import itertools
+import operator
 from collections import defaultdict
 
+from django.core.cache import cache
 from django.db import models
+from django.db.models.query import QuerySet
 
-from ..mtmodel import MTModel
+from ..mtmodel import (
+    MTModel, bump_choices_generation, choices_generation, deferring, utcnow)
+
+
+
+# number of objects whose environment rows are inserted per query
+ENV_CASCADE_CHUNK_SIZE = 500
+
+# element names of environments are cached by environment id and the
+# generations of the models they're built from; see
+# ``Environment.element_names_for``.
+ELEMENT_NAMES_CACHE_TIMEOUT = 60 * 60 * 24
+
+# environment matrices are cached by object and generations likewise; see
+# ``HasEnvironmentsModel.environment_matrix``.
+ENVIRONMENT_MATRIX_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+
+class ProfileTooLarge(ValueError):
+    """A generated profile would have more environments than allowed."""
+    pass
 
 
 
@@ -35,23 +60,99 @@ class Profile(MTModel):
         Elements are split by category, and then an environment is generated
         for each combination of one element from each category.
 
+        The combinations are streamed ``batch_size`` (keyword argument,
+        default 1000) at a time; each batch of environments, and then their
+        element rows, is inserted with a single bulk insert. If the number
+        of combinations exceeds the ``max_environments`` keyword argument,
+        ``ProfileTooLarge`` is raised before anything is created. A
+        ``progress`` callable, if given, is called with (number created so
+        far, total number) before the first batch and after each one.
+
         """
-        by_category = defaultdict(list)
-        for element in elements:
-            by_category[element.category].append(element)
+        batch_size = kwargs.pop("batch_size", 1000)
+        max_environments = kwargs.pop("max_environments", None)
+        progress = kwargs.pop("progress", None)
+        user = kwargs.get("user")
+
+        by_category = _element_ids_by_category(elements)
+        total = cls.count_combinations(*elements)
+        if max_environments is not None and total > max_environments:
+            raise ProfileTooLarge(
+                "Profile would have {0} environments; "
+                "the maximum is {1}.".format(total, max_environments))
+        if progress is not None:
+            progress(0, total)
 
         new = cls.objects.create(name=name, **kwargs)
 
-        for element_list in itertools.product(*by_category.values()):
-            e = Environment.objects.create(profile=new)
-            e.elements.add(*element_list)
+        through = Environment.elements.through
+        combinations = itertools.product(*by_category)
+        done = 0
+        last_id = 0
+        while True:
+            batch = list(itertools.islice(combinations, batch_size))
+            if not batch:
+                break
+            now = utcnow()
+            by_fingerprint = dict(
+                (Environment.fingerprint_for(element_ids), element_ids)
+                for element_ids in batch
+                )
+            Environment.objects.bulk_create(
+                [
+                    Environment(
+                        profile=new,
+                        fingerprint=fingerprint,
+                        created_on=now,
+                        created_by=user,
+                        modified_on=now,
+                        modified_by=user,
+                        )
+                    for fingerprint in by_fingerprint
+                    ]
+                )
+            # bulk insert doesn't give us the new ids; but nothing else adds
+            # environments to a new profile, and each combination of elements
+            # has its own fingerprint.
+            new_envs = list(
+                Environment.everything.filter(
+                    profile=new, id__gt=last_id).order_by("id").values_list(
+                    "id", "fingerprint"))
+            if len(new_envs) != len(batch):
+                raise RuntimeError(
+                    "Expected {0} new environments, found {1}.".format(
+                        len(batch), len(new_envs)))
+            last_id = new_envs[-1][0]
+            through.objects.bulk_create(
+                [
+                    through(environment_id=env_id, element_id=element_id)
+                    for env_id, fingerprint in new_envs
+                    for element_id in by_fingerprint[fingerprint]
+                    ]
+                )
+            done += len(batch)
+            if progress is not None:
+                progress(done, total)
+        bump_choices_generation(through)
 
         return new
 
 
+    @classmethod
+    def count_combinations(cls, *elements):
+        """Return number of environments ``generate`` would create."""
+        return reduce(
+            operator.mul,
+            [len(ids) for ids in _element_ids_by_category(elements)],
+            1,
+            )
+
+
+    clone_cascade = ["environments"]
+
+
     def clone(self, *args, **kwargs):
         """Clone profile, with environments."""
-        kwargs.setdefault("cascade", ["environments"])
         overrides = kwargs.setdefault("overrides", {})
         overrides.setdefault("name", "Cloned: {0}".format(self.name))
         return super(Profile, self).clone(*args, **kwargs)
@@ -161,10 +262,16 @@ class Environment(MTModel):
 
     elements = models.ManyToManyField(Element, related_name="environments")
 
+    # canonical digest of the sorted ids of ``elements``; kept up to date by
+    # ``update_fingerprints``, so environments with the same element set can
+    # be found with one indexed lookup.
+    fingerprint = models.CharField(
+        max_length=40, db_index=True, blank=True, default="")
+
 
     def __unicode__(self):
         """Return unicode representation."""
-        return u", ".join(unicode(e) for e in self.ordered_elements())
+        return u", ".join(self.element_names)
 
 
     class Meta:
@@ -181,10 +288,148 @@ class Environment(MTModel):
         return iter(self.elements.order_by("category__name"))
 
 
-    def clone(self, *args, **kwargs):
-        """Clone environment, including element relationships."""
-        kwargs.setdefault("cascade", ["elements"])
-        return super(Environment, self).clone(*args, **kwargs)
+    @property
+    def element_names(self):
+        """
+        Names of all elements in category name order.
+
+        Comes from the cache (see ``element_names_for``) unless already
+        fetched for this instance, in bulk by ``fetch_element_names`` or
+        previously here.
+
+        """
+        if getattr(self, "_element_names", None) is None:
+            self._element_names = self.element_names_for([self.id])[self.id]
+        return self._element_names
+
+
+    @classmethod
+    def fetch_element_names(cls, envs):
+        """Fetch ``element_names`` of all given environments at once."""
+        envs = [e for e in envs if e is not None]
+        names = cls.element_names_for([e.id for e in envs])
+        for env in envs:
+            env._element_names = names[env.id]
+        return envs
+
+
+    @classmethod
+    def element_names_for(cls, env_ids):
+        """
+        Return dict mapping given environment ids to lists of element names.
+
+        Names are in category name order. Each environment's names are cached
+        under its id and the current generations of elements, categories and
+        environment elements, so any change to those simply leaves the
+        cached names unused; names missing from the cache are all fetched in
+        one query per ``ENV_CASCADE_CHUNK_SIZE`` environments.
+
+        """
+        through = cls.elements.through
+        generations = "-".join(
+            str(choices_generation(m)) for m in [Element, Category, through])
+        keys = dict(
+            (env_id, "environment-element-names-{0}-{1}".format(
+                    env_id, generations))
+            for env_id in set(env_ids)
+            )
+        cached = cache.get_many(keys.values()) if keys else {}
+
+        names = {}
+        missing = []
+        for env_id, key in keys.items():
+            if key in cached:
+                names[env_id] = cached[key]
+            else:
+                missing.append(env_id)
+
+        fetched = dict((env_id, []) for env_id in missing)
+        for i in range(0, len(missing), ENV_CASCADE_CHUNK_SIZE):
+            rows = through.objects.filter(
+                environment__in=missing[i:i + ENV_CASCADE_CHUNK_SIZE],
+                element__deleted_on__isnull=True,
+                ).order_by("element__category__name", "element")
+            for env_id, name in rows.values_list(
+                    "environment_id", "element__name"):
+                fetched[env_id].append(name)
+        if fetched:
+            cache.set_many(
+                dict((keys[env_id], n) for env_id, n in fetched.items()),
+                ELEMENT_NAMES_CACHE_TIMEOUT,
+                )
+        names.update(fetched)
+        return names
+
+
+    @staticmethod
+    def fingerprint_for(element_ids):
+        """Return fingerprint of an environment with given element ids."""
+        return hashlib.sha1(
+            ",".join(str(i) for i in sorted(set(map(int, element_ids))))
+            ).hexdigest()
+
+
+    @classmethod
+    def update_fingerprints(cls, env_ids):
+        """Recompute stored fingerprints of environments with given ids."""
+        env_ids = list(env_ids)
+        through = cls.elements.through
+        for i in range(0, len(env_ids), ENV_CASCADE_CHUNK_SIZE):
+            chunk = env_ids[i:i + ENV_CASCADE_CHUNK_SIZE]
+            element_ids = defaultdict(list)
+            for env_id, element_id in through.objects.filter(
+                    environment__in=chunk).values_list(
+                    "environment_id", "element_id"):
+                element_ids[env_id].append(element_id)
+            changed = defaultdict(list)
+            for env_id, old in cls._base_manager.filter(
+                    pk__in=chunk).values_list("id", "fingerprint"):
+                new = cls.fingerprint_for(element_ids[env_id])
+                if new != old:
+                    changed[new].append(env_id)
+            for fingerprint, ids in changed.items():
+                cls._base_manager.filter(pk__in=ids).update(
+                    fingerprint=fingerprint)
+
+
+    @classmethod
+    def matching(cls, elements, within=None):
+        """
+        Return environments with exactly the given set of elements.
+
+        ``elements`` is an iterable of element ids, or element names; a name
+        shared by elements of several categories matches any of them. With
+        ``within`` (a product version, run, or other object with
+        environments), only its environments are returned.
+
+        """
+        candidates = []
+        names = []
+        for e in elements:
+            try:
+                candidates.append([int(e)])
+            except (TypeError, ValueError):
+                names.append(e)
+        if names:
+            by_name = defaultdict(list)
+            lookup = reduce(
+                operator.or_, [models.Q(name__iexact=n) for n in names])
+            for name, element_id in Element.objects.filter(
+                    lookup).values_list("name", "id"):
+                by_name[name.lower()].append(element_id)
+            for name in names:
+                if not by_name.get(name.lower()):
+                    return cls.objects.none()
+                candidates.append(by_name[name.lower()])
+
+        fingerprints = [
+            cls.fingerprint_for(ids) for ids in itertools.product(*candidates)]
+        qs = cls.objects.all() if within is None else within.environments.all()
+        return qs.filter(fingerprint__in=fingerprints)
+
+
+    # clone environment, including element relationships
+    clone_cascade = ["elements"]
 
 
     # @@@ there should be some way to annotate this onto a queryset efficiently
@@ -218,6 +463,17 @@ class Environment(MTModel):
 
 
 
+def _element_ids_by_category(elements):
+    """Return list of lists of distinct element ids, one list per category."""
+    by_category = defaultdict(list)
+    for element in elements:
+        ids = by_category[element.category_id]
+        if element.id not in ids:
+            ids.append(element.id)
+    return by_category.values()
+
+
+
 class HasEnvironmentsModel(models.Model):
     """
     Base for models that inherit/cascade environments to/from parents/children.
@@ -273,18 +529,73 @@ class HasEnvironmentsModel(models.Model):
         return {}
 
 
+    @classmethod
+    def _add_envs(cls, objs, envs):
+        """
+        Add one or more environments to one or more objects of this class.
+
+        ``objs`` and ``envs`` can be querysets, lists of instances or lists of
+        ids. The environment rows each object lacks are inserted in bulk,
+        ``ENV_CASCADE_CHUNK_SIZE`` objects at a time, then the addition is
+        cascaded a whole level at once: each model in ``cascade_envs_to``
+        gets a single ``_add_envs`` call for all its instances. Work the
+        cascade ``defer``s is done once, after all of it.
+
+        """
+        env_ids = sorted(set(_ids(envs)))
+        if not env_ids:
+            return
+        field = cls.environments.field
+        through = field.rel.through
+        from_name = field.m2m_field_name()
+        to_name = field.m2m_reverse_field_name()
+        obj_ids = _ids(objs)
+        for i in range(0, len(obj_ids), ENV_CASCADE_CHUNK_SIZE):
+            chunk = obj_ids[i:i + ENV_CASCADE_CHUNK_SIZE]
+            existing = set(
+                through._base_manager.filter(
+                    **{
+                        "{0}__in".format(from_name): chunk,
+                        "{0}__in".format(to_name): env_ids,
+                        }
+                    ).values_list(from_name, to_name)
+                )
+            through._base_manager.bulk_create(
+                [
+                    through(
+                        **{
+                            "{0}_id".format(from_name): obj_id,
+                            "{0}_id".format(to_name): env_id,
+                            }
+                        )
+                    for obj_id in chunk
+                    for env_id in env_ids
+                    if (obj_id, env_id) not in existing
+                    ]
+                )
+        bump_choices_generation(through)
+
+        with deferring():
+            for model, instances in cls.cascade_envs_to(
+                    objs, adding=True).items():
+                model._add_envs(instances, env_ids)
+
+
     @classmethod
     def _remove_envs(cls, objs, envs):
         """Remove one or environments from one or more objects of this class."""
-        for model, instances in cls.cascade_envs_to(objs, adding=False).items():
-            model._remove_envs(instances, envs)
-        m2m_reverse_name = cls.environments.field.related_query_name()
-        cls.environments.through._base_manager.filter(
-            **{
-                "{0}__in".format(m2m_reverse_name): objs,
-                "environment__in": envs
-                }
-              ).delete()
+        with deferring():
+            for model, instances in cls.cascade_envs_to(
+                    objs, adding=False).items():
+                model._remove_envs(instances, envs)
+            m2m_reverse_name = cls.environments.field.related_query_name()
+            cls.environments.through._base_manager.filter(
+                **{
+                    "{0}__in".format(m2m_reverse_name): objs,
+                    "environment__in": envs
+                    }
+                  ).delete()
+            bump_choices_generation(cls.environments.through)
 
 
     def remove_envs(self, *envs):
@@ -294,9 +605,117 @@ class HasEnvironmentsModel(models.Model):
 
     def add_envs(self, *envs):
         """Add one or more environments to this object's profile."""
-        # @@@ optimize this to reduce queries once we have bulk insert in 1.4
-        self.environments.add(*envs)
-        for model, instances in self.cascade_envs_to(
-                [self], adding=True).items():
-            for instance in instances:
-                instance.add_envs(*envs)
+        self._add_envs([self], envs)
+
+
+    def environment_matrix(self):
+        """
+        Return ``EnvironmentMatrix`` of this object's environments.
+
+        Cached under this object and the current generations of its
+        environments, environment elements, elements and categories, so any
+        change to its environments leaves the cached matrix unused.
+
+        """
+        key = "environment-matrix-{0}-{1}-{2}".format(
+            self._meta,
+            self.id,
+            "-".join(
+                str(choices_generation(m)) for m in [
+                    self.environments.through,
+                    Environment,
+                    Environment.elements.through,
+                    Element,
+                    Category,
+                    ]
+                ),
+            )
+        matrix = cache.get(key)
+        if matrix is None:
+            matrix = EnvironmentMatrix.build(self.environments.all())
+            cache.set(key, matrix, ENVIRONMENT_MATRIX_CACHE_TIMEOUT)
+        return matrix
+
+
+
+class EnvironmentMatrix(object):
+    """
+    Compact matrix of a set of environments: categories x elements -> env.
+
+    ``categories`` is a list of (id, name) of all categories with elements in
+    any of the environments, in name order; ``elements`` has a list of (id,
+    name) of those elements, in name order, for each category. ``env_ids`` is
+    a list of the ids of the environments, and ``rows`` a parallel list with,
+    for each environment, its element id in each category (None if it has no
+    element in the category).
+
+    """
+    def __init__(self, categories, elements, env_ids, rows):
+        self.categories = categories
+        self.elements = elements
+        self.env_ids = env_ids
+        self.rows = rows
+        self._rows_by_env = dict(zip(env_ids, rows))
+
+
+    @classmethod
+    def build(cls, environments):
+        """Build matrix of ``environments`` (a queryset) with one query."""
+        through = Environment.elements.through
+        relationships = list(
+            through.objects.filter(
+                environment__in=environments).order_by(
+                "environment").values_list(
+                "environment_id",
+                "element_id",
+                "element__name",
+                "element__category_id",
+                "element__category__name",
+                )
+            )
+
+        categories = sorted(
+            set((r[3], r[4]) for r in relationships), key=lambda c: c[1])
+        column = dict((c[0], i) for i, c in enumerate(categories))
+
+        elements = [[] for c in categories]
+        seen = set()
+        env_ids = []
+        rows = []
+        for env_id, element_id, name, category_id, _ in relationships:
+            if not env_ids or env_ids[-1] != env_id:
+                env_ids.append(env_id)
+                rows.append([None] * len(categories))
+            rows[-1][column[category_id]] = element_id
+            if element_id not in seen:
+                seen.add(element_id)
+                elements[column[category_id]].append((element_id, name))
+        for category_elements in elements:
+            category_elements.sort(key=lambda e: e[1])
+
+        return cls(categories, elements, env_ids, rows)
+
+
+    def row(self, env_id):
+        """Return element ids of environment with given id, or None."""
+        return self._rows_by_env.get(env_id)
+
+
+    def matches(self, element_ids):
+        """
+        Return ids of environments whose elements are all in ``element_ids``.
+
+        """
+        element_ids = set(element_ids)
+        return [
+            env_id for env_id, row in zip(self.env_ids, self.rows)
+            if element_ids.issuperset(e for e in row if e is not None)
+            ]
+
+
+
+def _ids(objs):
+    """Return list of ids of ``objs``: a queryset, instances or ids."""
+    if isinstance(objs, QuerySet):
+        return list(objs.values_list("id", flat=True))
+    return [int(getattr(o, "id", o)) for o in objs]
@@ -1,15 +1,17 @@
 from django.db.models import Count
-from tastypie.resources import ModelResource, ALL_WITH_RELATIONS
+from tastypie.resources import (
+    ModelResource, ALL_WITH_RELATIONS, convert_post_to_patch)
 from tastypie import http, fields
-from tastypie.exceptions import ImmediateHttpResponse
+from tastypie.exceptions import ImmediateHttpResponse, BadRequest
 from tastypie.bundle import Bundle
 
 import json
 
 from django.core.exceptions import ValidationError, ObjectDoesNotExist
+from django.db import transaction
 from django.http import HttpResponse
 
-from .models import Run, RunCaseVersion, RunSuite, Result
+from .models import Run, RunCaseVersion, RunSuite, Result, record_results
 from ..mtapi import MTResource, MTApiKeyAuthentication, MTAuthorization
 from ..core.api import (ProductVersionResource, ProductResource,
                         ReportResultsAuthorization, UserResource)
@@ -263,6 +265,41 @@ class ResultResource(ModelResource):
         authorization = ReportResultsAuthorization()
 
 
+    def patch_list(self, request, **kwargs):
+        """
+        Record all submitted result objects in bulk.
+
+        Rather than one ``obj_create`` per object, the results are resolved,
+        validated and created in batches by ``record_results``; if any object
+        is invalid, none are recorded. Falls back to the default behavior for
+        ``resource_uri`` updates and deletions, which this endpoint doesn't
+        otherwise support.
+
+        """
+        request = convert_post_to_patch(request)
+        deserialized = self.deserialize(
+            request,
+            request.body,
+            format=request.META.get("CONTENT_TYPE", "application/json"),
+            )
+
+        collection_name = self._meta.collection_name
+        if collection_name not in deserialized:
+            raise BadRequest(
+                "Invalid data sent: missing '{0}'".format(collection_name))
+        objects = deserialized[collection_name]
+        if (deserialized.get("deleted_{0}".format(collection_name)) or
+                any("resource_uri" in data for data in objects)):
+            return super(ResultResource, self).patch_list(request, **kwargs)
+
+        bundle = self.build_bundle(request=request)
+        self.authorized_create_detail(self.get_object_list(request), bundle)
+        with transaction.commit_on_success():
+            record_results(objects, request.user)
+
+        return http.HttpAccepted()
+
+
     def obj_create(self, bundle, request=None, **kwargs):
         """
         Manually create the proper results objects.
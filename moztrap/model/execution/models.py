@@ -3,25 +3,26 @@ Models for test execution (runs, results).
 
 """
 import datetime
+import hashlib
 
 from django.core.exceptions import ValidationError, ObjectDoesNotExist
-from django.db import connection, transaction, models
-from django.db.models import Q, Count, Max
+from django.db import connection, transaction, models, IntegrityError
+from django.db.models import Count, Max, Sum
 
 from model_utils import Choices
 
-from ..mtmodel import MTModel, TeamModel, DraftStatusModel
+from ..mtmodel import MTModel, TeamModel, DraftStatusModel, defer, utcnow
 from ..core.auth import User
 from ..core.models import ProductVersion
 from ..environments.models import Environment, HasEnvironmentsModel
-from ..library.models import CaseVersion, Suite, CaseStep
+from ..library.models import CaseVersion, Suite, SuiteCase, CaseStep
 
 
 
 class Run(MTModel, TeamModel, DraftStatusModel, HasEnvironmentsModel):
     """A test run."""
     productversion = models.ForeignKey(ProductVersion, related_name="runs")
-    name = models.CharField(max_length=200)
+    name = models.CharField(max_length=200, db_index=True)
     description = models.TextField(blank=True)
     start = models.DateField(default=datetime.date.today)
     end = models.DateField(blank=True, null=True)
@@ -29,6 +30,13 @@ class Run(MTModel, TeamModel, DraftStatusModel, HasEnvironmentsModel):
     is_series = models.BooleanField(default=False)
     series = models.ForeignKey("self", null=True, blank=True)
 
+    # snapshot of the inputs to the last runcaseversion lock; lets refresh
+    # skip (or apply incrementally) when little or nothing has changed.
+    lock_watermark = models.CharField(
+        max_length=64, blank=True, editable=False)
+    lock_watermark_on = models.DateTimeField(
+        blank=True, null=True, editable=False)
+
     caseversions = models.ManyToManyField(
         CaseVersion, through="RunCaseVersion", related_name="runs")
     suites = models.ManyToManyField(
@@ -62,12 +70,15 @@ class Run(MTModel, TeamModel, DraftStatusModel, HasEnvironmentsModel):
         return {RunCaseVersion: RunCaseVersion.objects.filter(run__in=objs)}
 
 
+    clone_cascade = ["runsuites", "environments", "team"]
+
+
     def clone(self, *args, **kwargs):
         """Clone this Run with default cascade behavior."""
-        kwargs.setdefault(
-            "cascade", ["runsuites", "environments", "team"])
         overrides = kwargs.setdefault("overrides", {})
         overrides["status"] = self.STATUS.draft
+        overrides["lock_watermark"] = ""
+        overrides["lock_watermark_on"] = None
         overrides.setdefault("name", "Cloned: {0}".format(self.name))
         return super(Run, self).clone(*args, **kwargs)
 
@@ -75,12 +86,12 @@ class Run(MTModel, TeamModel, DraftStatusModel, HasEnvironmentsModel):
     def clone_for_series(self, *args, **kwargs):
         """Clone this Run to create a new series item."""
         build = kwargs.pop("build", None)
-        kwargs.setdefault(
-            "cascade", ["runsuites", "environments", "team"])
         overrides = kwargs.setdefault("overrides", {})
         overrides.setdefault("name", "{0} - Build: {1}".format(
             self.name, build))
         overrides["status"] = self.STATUS.draft
+        overrides["lock_watermark"] = ""
+        overrides["lock_watermark_on"] = None
         overrides.setdefault("is_series", False)
         overrides.setdefault("build", build)
         overrides.setdefault("series", self)
@@ -99,206 +110,489 @@ class Run(MTModel, TeamModel, DraftStatusModel, HasEnvironmentsModel):
 
 
     def refresh(self, *args, **kwargs):
-        """Update all the runcaseversions while the run is active."""
+        """
+        Update all the runcaseversions while the run is active.
+
+        Unless ``full=True`` is given, only what changed since the last lock
+        is applied (see ``_refresh_case_versions``).
+
+        """
+        full = kwargs.pop("full", False)
         if self.status == self.STATUS.active:
-            self.update_case_versions()
+            self.update_case_versions(incremental=not full)
 
 
-    def update_case_versions(self):
+    def update_case_versions(self, incremental=False):
         """
         Update the runcaseversions with any changes to suites.
 
-        This can happen while the run is still active.
+        This can happen while the run is still active. If ``incremental`` is
+        True, the lock watermark is used to skip or narrow the update.
+
         """
         # we don't need all the runcaseversions for a series.  It is the
         # series member runs that will use them.  So only lock the caseversions
         # if this is NOT a series.
         if not self.is_series:
-            self._lock_case_versions()
+            if incremental:
+                self._refresh_case_versions()
+            else:
+                self._lock_case_versions()
+
+
+    @transaction.commit_on_success
+    def _refresh_case_versions(self):
+        """
+        Apply changes since the last lock to the runcaseversions.
+
+        If none of the lock inputs changed, this is a no-op. If only
+        caseversions changed (not suites, suite membership or environments),
+        only those caseversions are examined: ones that dropped out of the run
+        have their runcaseversions deleted, and edits that don't affect
+        membership are ignored. Anything else falls back to a full lock.
+
+        """
+        watermark = self._lock_watermark()
+        structure, caseversions, modified_on = watermark
+        stored = self.lock_watermark
+        if stored and stored[:32] == structure:
+            if stored[32:] == caseversions:
+                return
+            # with no watermark time (there were no caseversions at the last
+            # lock) there's nothing to compare modifications to
+            if (self.lock_watermark_on is not None and
+                    self._lock_changed_caseversions(self.lock_watermark_on)):
+                self._set_lock_watermark(*watermark)
+                return
+        self._lock_case_versions(watermark=watermark)
+
+
+    def _lock_changed_caseversions(self, since):
+        """
+        Apply caseversions modified after ``since`` to the lock.
+
+        Returns False (having changed nothing) if a changed caseversion needs
+        a new runcaseversion; placing it requires renumbering the run, so
+        that is left to the full lock.
+
+        """
+        changed = list(
+            CaseVersion.everything.filter(
+                productversion=self.productversion_id,
+                modified_on__gte=since,
+                case__in=self._suitecases().values("case"),
+                ).values_list("id", flat=True).distinct()
+            )
+        needed = set(
+            self._needed_caseversion_ids(
+                list(self.environments.values_list("id", flat=True)),
+                changed,
+                )
+            )
+        existing = dict(
+            self.runcaseversions.filter(
+                caseversion__in=changed).values_list("caseversion_id", "id")
+            )
+        if needed.difference(existing):
+            return False
+        delete_ids = [
+            rcv_id for cv_id, rcv_id in existing.items() if cv_id not in needed]
+        if delete_ids:
+            self._delete_runcaseversions(delete_ids)
+            RunResultSummary.rebuild([self.id])
+        return True
+
+
+    def _suitecases(self):
+        """All SuiteCases (deleted or not) of suites included in this run."""
+        return SuiteCase.everything.filter(
+            suite__in=RunSuite.everything.filter(run=self).values("suite"))
+
+
+    def _lock_watermark(self):
+        """
+        Return ``(structure, caseversions, modified_on)`` for lock inputs.
+
+        ``structure`` is a digest of everything that determines the run's
+        runcaseversions other than the caseversions themselves: run suites,
+        suites, suite membership, and run and caseversion environments.
+        ``caseversions`` is a digest of the caseversions that could be in the
+        run (their number, latest modification and total ``cc_version``,
+        which every save or queryset update increments). ``modified_on`` is
+        the latest modification time of any of those caseversions.
+
+        Soft-deletion updates ``modified_on``, and permanent deletion changes
+        row counts, so both are reflected.
+
+        """
+        caseversions = CaseVersion.everything.filter(
+            productversion=self.productversion_id,
+            case__in=self._suitecases().values("case"),
+            ).aggregate(
+            count=Count("id"),
+            modified_on=Max("modified_on"),
+            cc_version=Sum("cc_version"),
+            )
+
+        names = {
+            "runsuite": RunSuite._meta.db_table,
+            "suite": Suite._meta.db_table,
+            "suitecase": SuiteCase._meta.db_table,
+            "caseversion": CaseVersion._meta.db_table,
+            "environment": Environment._meta.db_table,
+            "run_env": Run.environments.through._meta.db_table,
+            "cv_env": CaseVersion.environments.through._meta.db_table,
+            "run": int(self.id),
+            "pv": int(self.productversion_id),
+            }
+        names["suites"] = (
+            "SELECT suite_id FROM {runsuite} WHERE run_id = {run}".format(
+                **names)
+            )
+        names["cases"] = (
+            "SELECT case_id FROM {suitecase} WHERE suite_id IN ({suites})"
+            .format(**names)
+            )
+        names["cvs"] = (
+            "SELECT id FROM {caseversion} "
+            "WHERE productversion_id = {pv} AND case_id IN ({cases})".format(
+                **names)
+            )
+        # (aggregate, FROM clause) pairs, each selected as a scalar subquery
+        aggregates = [
+            ("COUNT(*)", "{runsuite} WHERE run_id = {run}"),
+            ("MAX(modified_on)", "{runsuite} WHERE run_id = {run}"),
+            ("MAX(modified_on)", "{suite} WHERE id IN ({suites})"),
+            ("COUNT(*)", "{suitecase} WHERE suite_id IN ({suites})"),
+            ("MAX(modified_on)", "{suitecase} WHERE suite_id IN ({suites})"),
+            ("COUNT(*)", "{run_env} WHERE run_id = {run}"),
+            (
+                "SUM({0})".format(_mix_sql("environment_id")),
+                "{run_env} WHERE run_id = {run}"
+                ),
+            (
+                "MAX(e.modified_on)",
+                "{environment} as e INNER JOIN {run_env} as re "
+                "ON re.environment_id = e.id WHERE re.run_id = {run}"
+                ),
+            ("COUNT(*)", "{cv_env} WHERE caseversion_id IN ({cvs})"),
+            (
+                "SUM({0})".format(
+                    _mix_sql("caseversion_id", "environment_id")),
+                "{cv_env} WHERE caseversion_id IN ({cvs})"
+                ),
+            ]
+        sql = "SELECT {0}".format(
+            ", ".join(
+                "(SELECT {0} FROM {1})".format(agg, source.format(**names))
+                for agg, source in aggregates
+                )
+            )
+
+        cursor = connection.cursor()
+        cursor.execute(sql)
+        structure = _digest(cursor.fetchone())
+
+        return (
+            structure,
+            _digest(
+                [
+                    caseversions["count"],
+                    caseversions["modified_on"],
+                    caseversions["cc_version"],
+                    ]
+                ),
+            caseversions["modified_on"],
+            )
+
+
+    def _set_lock_watermark(self, structure, caseversions, modified_on):
+        """Store the given lock watermark on this run."""
+        watermark = structure + caseversions
+        Run.objects.filter(pk=self.pk).update(
+            lock_watermark=watermark,
+            lock_watermark_on=modified_on,
+            notrack=True,
+            )
+        self.lock_watermark = watermark
+        self.lock_watermark_on = modified_on
+        self.cc_version += 1
 
 
     @transaction.commit_on_success
-    def _lock_case_versions(self):
+    def _lock_case_versions(self, watermark=None):
         """
         Select caseversions from suites, create runcaseversions.
 
+        The lock is computed as a diff against the runcaseversions that
+        already exist, and each part of the diff (delete, reorder, insert,
+        environment sync) is applied with a single set-based statement, so the
+        number of queries does not grow with the size of the run.
+
         WARNING: Testing this code in the PyCharm debugger will give an
         incorrect number of queries, because for the debugger to show all the
         information it wants, it must do queries itself.  When testing with
         assertNumQueries, don't use the PyCharm debugger.
 
         """
+        # snapshot the lock inputs first, so that anything changed while we
+        # are locking is picked up by the next refresh.
+        if watermark is None:
+            watermark = self._lock_watermark()
 
         # get the list of environments for this run
-        run_env_ids = self.environments.values_list("id", flat=True)
+        run_env_ids = list(self.environments.values_list("id", flat=True))
 
         # make a list of cvs in order by RunSuite, then SuiteCase.
         # This list is built from the run / suite / env combination and has
         # no knowledge of any possibly existing runcaseversions yet.
-        if len(run_env_ids):
-            cursor = connection.cursor()
-            sql = """SELECT DISTINCT cv.id as id
-                FROM execution_run as r
-                    INNER JOIN execution_runsuite as rs
-                        ON rs.run_id = r.id
-                    INNER JOIN library_suitecase as sc
-                        ON rs.suite_id = sc.suite_id
-                    INNER JOIN library_suite as s
-                        ON sc.suite_id = s.id
-                    INNER JOIN library_caseversion as cv
-                        ON cv.case_id = sc.case_id
-                        AND cv.productversion_id = r.productversion_id
-                    INNER JOIN library_caseversion_environments as cve
-                        ON cv.id = cve.caseversion_id
-                WHERE cv.status = 'active'
-                    AND cv.deleted_on IS NULL
-                    AND s.status = 'active'
-                    AND rs.run_id = {0}
-                    AND cve.environment_id IN ({1})
-                ORDER BY rs.order, sc.order
-                """.format(self.id, ",".join(map(str, run_env_ids)))
-            cursor.execute(sql)
-
-            cv_list = [x[0] for x in cursor.fetchall()]
-
-            # @@@ do we need to check for duplicates?
-            # use itertools.unique_everseen
-            #if len(set(cv_list)) != len(cv_list):
-            #    cv_list = itertools.unique_everseen(cv_list)
-
-        else:
-            cv_list = []
+        cv_list = self._needed_caseversion_ids(run_env_ids)
+
+        # map each needed caseversion to its (1-based) position in the run
+        needed = {}
+        for cv_id in cv_list:
+            needed.setdefault(cv_id, len(needed) + 1)
+
+        # existing rcvs, with the id of their latest result so that if there
+        # are duplicate rcvs for the same caseversion we keep the one with the
+        # latest result and delete the rest.
+        existing = self.runcaseversions.order_by().annotate(
+            latest_result=Max("results__id")).values_list(
+            "id", "caseversion_id", "order", "latest_result")
+
+        keep = {}
+        delete_ids = []
+        for rcv_id, cv_id, order, latest_result in existing:
+            if cv_id not in needed:
+                delete_ids.append(rcv_id)
+                continue
+            current = keep.get(cv_id)
+            if current is None:
+                keep[cv_id] = (rcv_id, order, latest_result)
+            elif (latest_result, -rcv_id) > (current[2], -current[0]):
+                delete_ids.append(current[0])
+                keep[cv_id] = (rcv_id, order, latest_result)
+            else:
+                delete_ids.append(rcv_id)
 
         # delete rcvs that we won't be needing anymore
-        self._delete_runcaseversions(cv_list)
-
-        # audit for duplicate rcvs for the same cv.id
-        dups = self.runcaseversions.values("caseversion_id").annotate(
-            num_records=Count("caseversion")).filter(num_records__gt=1)
-        if len(dups) > 0:
-            for dup in dups:
-                # get the runcaseversions, and sort descending by the id
-                # of the results.  So the first one is the one with the latest
-                # result.  We keep that one and delete the rest.
-                rcv_to_save = self.runcaseversions.annotate(
-                    latest_result=Max("results__id")).filter(
-                        caseversion=dup["caseversion_id"]).order_by(
-                            "-latest_result")[0]
-                self.runcaseversions.filter(
-                    caseversion=dup["caseversion_id"]).exclude(
-                        id=rcv_to_save.id).delete()
-
-        # remaining rcvs should be ones we want to keep, and we need to inject
-        # those ids into the insert/update list for bulk_insert.  So create
-        # a dict mapping cv_id: rcv_id.  If one exists, its order field will
-        # be updated in the build_update cmd.
-        existing_rcv_map = {}
-        for map_item in self.runcaseversions.values("id", "caseversion_id"):
-            existing_rcv_map[map_item["caseversion_id"]] = map_item["id"]
-
-        # build the list of rcvs that we DO need.  Be sure to include the ids
-        # for rcvs that already exist so that we will just be updating the
-        # order and not replacing it.  We will use a special manager that does
-        # an update on insert error.
-
-        # runcaseversion objects we will use to bulk create
-        rcv_to_update = []
-        rcv_proxies_to_create = []
-
-        order = 1
-        for cv in cv_list:
-            if cv in existing_rcv_map:
-                # we will just update the order value
-                rcv_to_update.append({"caseversion_id": cv, "order": order})
-            else:
-                # we need to create a new one
-                kwargs = {
-                    "run_id": self.id,
-                    "caseversion_id": cv,
-                    "order": order
-                    }
-                rcv_proxies_to_create.append(RunCaseVersion(**kwargs))
-            order += 1
-
-        # update existing rcvs
-        for rcv in rcv_to_update:
-            self.runcaseversions.filter(
-                caseversion=rcv["caseversion_id"]).update(order=rcv["order"])
+        self._delete_runcaseversions(delete_ids)
+
+        # existing rcvs we keep only need their order updated (if changed)
+        self._update_runcaseversion_order(
+            dict(
+                (rcv_id, needed[cv_id])
+                for cv_id, (rcv_id, order, _) in keep.items()
+                if order != needed[cv_id]
+                )
+            )
+
+        # insert the rcvs that don't exist yet in bulk
+        self._bulk_insert_new_runcaseversions(
+            [
+                RunCaseVersion(run_id=self.id, caseversion_id=cv_id, order=order)
+                for cv_id, order in sorted(needed.items(), key=lambda i: i[1])
+                if cv_id not in keep
+                ]
+            )
 
-        # insert these rcvs in bulk
-        self._bulk_insert_new_runcaseversions(rcv_proxies_to_create)
+        self._bulk_update_runcaseversion_environments_for_lock(run_env_ids)
 
-        self._bulk_update_runcaseversion_environments_for_lock()
+        RunResultSummary.rebuild([self.id])
+
+        self._set_lock_watermark(*watermark)
 
         self._lock_caseversions_complete()
 
 
-    def _delete_runcaseversions(self, cv_list):
-        """Hook to delete runcaseversions we know we don't need anymore."""
-        self.runcaseversions.exclude(caseversion__in=cv_list).delete(
-            permanent=True)
+    def _needed_caseversion_ids(self, run_env_ids, caseversion_ids=None):
+        """
+        Return ordered list of caseversion ids that belong in this run.
 
+        Ordered by RunSuite order, then SuiteCase order. Only active
+        caseversions in active suites, sharing at least one environment with
+        the run, are included. If ``caseversion_ids`` is given, only those
+        caseversions are considered.
 
-    def _bulk_insert_new_runcaseversions(self, rcv_proxies):
-        """Hook to bulk-insert runcaseversions we know we DO need."""
-        self.runcaseversions.bulk_create(rcv_proxies)
+        """
+        if not run_env_ids or caseversion_ids == []:
+            return []
+        only = ""
+        if caseversion_ids is not None:
+            only = "AND cv.id IN ({0})".format(_id_list(caseversion_ids))
+
+        qn = connection.ops.quote_name
+        cursor = connection.cursor()
+        sql = """SELECT DISTINCT cv.id as id, rs.{order}, sc.{order}
+            FROM execution_run as r
+                INNER JOIN execution_runsuite as rs
+                    ON rs.run_id = r.id
+                INNER JOIN library_suitecase as sc
+                    ON rs.suite_id = sc.suite_id
+                INNER JOIN library_suite as s
+                    ON sc.suite_id = s.id
+                INNER JOIN library_caseversion as cv
+                    ON cv.case_id = sc.case_id
+                    AND cv.productversion_id = r.productversion_id
+                INNER JOIN library_caseversion_environments as cve
+                    ON cv.id = cve.caseversion_id
+            WHERE cv.status = 'active'
+                AND cv.deleted_on IS NULL
+                AND s.status = 'active'
+                AND rs.run_id = {run_id}
+                AND cve.environment_id IN ({env_ids})
+                {only}
+            ORDER BY rs.{order}, sc.{order}
+            """.format(
+            order=qn("order"),
+            run_id=int(self.id),
+            env_ids=_id_list(run_env_ids),
+            only=only,
+            )
+        cursor.execute(sql)
+
+        return [x[0] for x in cursor.fetchall()]
 
 
-    def _bulk_update_runcaseversion_environments_for_lock(self):
+    def _delete_runcaseversions(self, rcv_ids):
         """
-        update runcaseversion_environment records with latest state.
+        Hook to delete runcaseversions we know we don't need anymore.
 
-        Approach:
-          do another raw sql query to get all existing_rcv_envs for this run
-          existing_rcv_envs - needed_rcv_envs = list to delete (no longer needed)
-          needed_rcv_envs - existing_rcv_envs = list to create
-        build a list of RunCaseVersion_environment objects
-        and use bulk_create.
+        Deletion is permanent, and cascades to results, step results,
+        environments and current statuses of those runcaseversions in one
+        statement per table, without loading any of them.
 
         """
+        if not rcv_ids:
+            return
+
+        ids = _id_list(rcv_ids)
+        rcv_table = RunCaseVersion._meta.db_table
+        result_table = Result._meta.db_table
+        cursor = connection.cursor()
+        cursor.execute(
+            "DELETE FROM {0} WHERE result_id IN "
+            "(SELECT id FROM {1} WHERE runcaseversion_id IN ({2}))".format(
+                StepResult._meta.db_table, result_table, ids)
+            )
+        cursor.execute(
+            "DELETE FROM {0} WHERE runcaseversion_id IN ({1})".format(
+                result_table, ids)
+            )
+        cursor.execute(
+            "DELETE FROM {0} WHERE runcaseversion_id IN ({1})".format(
+                RunCaseVersion.environments.through._meta.db_table, ids)
+            )
+        cursor.execute(
+            "DELETE FROM {0} WHERE runcaseversion_id IN ({1})".format(
+                RunCaseVersionStatus._meta.db_table, ids)
+            )
+        cursor.execute(
+            "DELETE FROM {0} WHERE id IN ({1})".format(rcv_table, ids))
 
-        # re-query all the rcvs (including newly created) for this run
-        final_rcvs = RunCaseVersion.objects.filter(run=self).select_related(
-            "caseversion").prefetch_related("caseversion__environments")
 
-        final_rcv_ids = [x.id for x in final_rcvs]
+    def _update_runcaseversion_order(self, orders):
+        """
+        Hook to update order of existing runcaseversions.
 
-        # runcaseversion_environments that were there prior to our changes
-        prev_rcv_envs_set = set(RunCaseVersion.environments.through.objects.filter(
-            runcaseversion_id__in=final_rcv_ids).values_list(
-                "runcaseversion_id", "environment_id"))
+        ``orders`` maps runcaseversion id to its new order; all of them are
+        updated with a single ``UPDATE ... CASE`` statement.
 
-        # runcaseversion_environment objects we will use to bulk create
-        # loop through all cvs and fetch the env intersection with this run
-        needed_rcv_envs_tuples = []
-        run_env_ids = set(
-            self.environments.values_list("id", flat=True))
-        for rcv in final_rcvs:
-            case_env_ids = set([x.id for x in rcv.caseversion.environments.all()])
-            for env in run_env_ids.intersection(case_env_ids):
-                needed_rcv_envs_tuples.append((rcv.id, env))
-        needed_rcv_envs_set = set(needed_rcv_envs_tuples)
+        """
+        if not orders:
+            return
+
+        qn = connection.ops.quote_name
+        cases = " ".join(
+            "WHEN {0:d} THEN {1:d}".format(rcv_id, order)
+            for rcv_id, order in orders.items()
+            )
+        sql = """UPDATE {table}
+            SET {order} = CASE id {cases} END,
+                modified_on = %s,
+                modified_by_id = NULL,
+                cc_version = cc_version + 1
+            WHERE id IN ({ids})
+            """.format(
+            table=RunCaseVersion._meta.db_table,
+            order=qn("order"),
+            cases=cases,
+            ids=_id_list(orders.keys()),
+            )
+        cursor = connection.cursor()
+        cursor.execute(sql, [utcnow()])
 
-        # get the set of rcv_envs we need to delete because they don't belong
-        # to the needed set.
-        delete_rcv_envs = prev_rcv_envs_set - needed_rcv_envs_set
-        if len(delete_rcv_envs):
-            delquery = Q()
-            for combo in delete_rcv_envs:
-                delquery = delquery | Q(
-                    **{"runcaseversion_id": combo[0],
-                       "environment_id": combo[1]})
-            RunCaseVersion.environments.through.objects.filter(delquery).delete()
 
-        # get the set of rcv_envs we need to create that don't already exist
-        needed_rcv_envs_set = needed_rcv_envs_set - prev_rcv_envs_set
+    def _bulk_insert_new_runcaseversions(self, rcv_proxies):
+        """Hook to bulk-insert runcaseversions we know we DO need."""
+        self.runcaseversions.bulk_create(rcv_proxies)
 
-        # build all the objects to pass to bulk_create
-        needed_rcv_envs = [RunCaseVersion.environments.through(
-            runcaseversion_id=needed[0],
-            environment_id=needed[1]) for needed in needed_rcv_envs_set]
 
-        RunCaseVersion.environments.through.objects.bulk_create(needed_rcv_envs)
+    def _bulk_update_runcaseversion_environments_for_lock(self, run_env_ids):
+        """
+        update runcaseversion_environment records with latest state.
+
+        Each runcaseversion should have exactly the intersection of the run's
+        environments and its caseversion's environments. Rather than loading
+        both sides and diffing in Python, one DELETE removes rows that no
+        longer belong and one INSERT ... SELECT adds the missing ones.
+
+        """
+        if not run_env_ids:
+            # no environments means no runcaseversions are left, and their
+            # environments were deleted along with them.
+            return
+
+        rcv_table = RunCaseVersion._meta.db_table
+        rcv_env_table = RunCaseVersion.environments.through._meta.db_table
+        cv_env_table = CaseVersion.environments.through._meta.db_table
+        env_ids = _id_list(run_env_ids)
+        cursor = connection.cursor()
+
+        cursor.execute(
+            """DELETE FROM {rcve}
+            WHERE runcaseversion_id IN (
+                SELECT rcv.id FROM {rcv} as rcv
+                WHERE rcv.run_id = %s AND rcv.deleted_on IS NULL)
+            AND (
+                environment_id NOT IN ({env_ids})
+                OR NOT EXISTS (
+                    SELECT 1 FROM {rcv} as rcv
+                        INNER JOIN {cve} as cve
+                            ON cve.caseversion_id = rcv.caseversion_id
+                    WHERE rcv.id = {rcve}.runcaseversion_id
+                        AND cve.environment_id = {rcve}.environment_id)
+                )
+            """.format(
+                rcve=rcv_env_table,
+                rcv=rcv_table,
+                cve=cv_env_table,
+                env_ids=env_ids,
+                ),
+            [self.id]
+            )
+
+        cursor.execute(
+            """INSERT INTO {rcve} (runcaseversion_id, environment_id)
+            SELECT rcv.id, cve.environment_id
+            FROM {rcv} as rcv
+                INNER JOIN {cve} as cve
+                    ON cve.caseversion_id = rcv.caseversion_id
+            WHERE rcv.run_id = %s
+                AND rcv.deleted_on IS NULL
+                AND cve.environment_id IN ({env_ids})
+                AND NOT EXISTS (
+                    SELECT 1 FROM {rcve} as existing
+                    WHERE existing.runcaseversion_id = rcv.id
+                        AND existing.environment_id = cve.environment_id)
+            """.format(
+                rcve=rcv_env_table,
+                rcv=rcv_table,
+                cve=cv_env_table,
+                env_ids=env_ids,
+                ),
+            [self.id]
+            )
 
 
     def _lock_caseversions_complete(self):
@@ -308,29 +602,21 @@ class Run(MTModel, TeamModel, DraftStatusModel, HasEnvironmentsModel):
 
     def result_summary(self):
         """Return a dict summarizing status of results."""
-        return result_summary(Result.objects.filter(runcaseversion__run=self))
+        counts = RunResultSummary.counts(self)
+        return dict((s, counts.get(s, 0)) for s in Result.COMPLETED_STATES)
 
 
     def completion(self):
         """
         Return fraction of case/env combos that have a completed result.
 
-        Have to specify deleted_on=None for the through, because the
-        default manager doesn't go through our MT model manager.
+        Read from the denormalized ``RunResultSummary`` counts.
+
         """
-        total = RunCaseVersion.environments.through.objects.filter(
-            runcaseversion__run=self,
-            runcaseversion__deleted_on=None,
-            ).count()
-        skipped = Result.objects.filter(
-            runcaseversion__run=self,
-            is_latest=True,
-            status=Result.STATUS.skipped).count()
-        completed = Result.objects.filter(
-            status__in=Result.COMPLETED_STATES,
-            is_latest=True,
-            runcaseversion__run=self).values(
-            "runcaseversion", "environment").distinct().count()
+        counts = RunResultSummary.counts(self)
+        total = counts.get(RunResultSummary.TOTAL, 0)
+        skipped = counts.get(Result.STATUS.skipped, 0)
+        completed = counts.get(RunResultSummary.COMPLETED, 0)
 
         try:
             return float(completed) / (total - skipped)
@@ -340,20 +626,10 @@ class Run(MTModel, TeamModel, DraftStatusModel, HasEnvironmentsModel):
 
     def completion_single_env(self, env_id):
         """Return fraction of cases that have a completed result for an env."""
-        total = RunCaseVersion.objects.filter(
-            environments=env_id,
-            run=self).count()
-        skipped = Result.objects.filter(
-            runcaseversion__run=self,
-            environment=env_id,
-            is_latest=True,
-            status=Result.STATUS.skipped).count()
-        completed = Result.objects.filter(
-            status__in=Result.COMPLETED_STATES,
-            is_latest=True,
-            environment=env_id,
-            runcaseversion__run=self).values(
-            "runcaseversion", "environment").distinct().count()
+        counts = RunResultSummary.counts(self, env_id)
+        total = counts.get(RunResultSummary.TOTAL, 0)
+        skipped = counts.get(Result.STATUS.skipped, 0)
+        completed = counts.get(RunResultSummary.COMPLETED, 0)
 
         try:
             return float(completed) / (total - skipped)
@@ -362,6 +638,44 @@ class Run(MTModel, TeamModel, DraftStatusModel, HasEnvironmentsModel):
 
 
 
+def _digest(values):
+    """Return hex MD5 digest of the given sequence of values."""
+    return hashlib.md5(
+        u"|".join(unicode(v) for v in values).encode("utf-8")).hexdigest()
+
+
+
+# prime modulus of ``_mix_sql`` hashes; below 2 ** 31, so that the product of
+# two residues fits in a 64-bit integer.
+MIX_MODULUS = 2147483647
+
+
+
+def _mix_sql(*columns):
+    """
+    Return SQL for a hash, modulo ``MIX_MODULUS``, of given integer columns.
+
+    Summed over rows this is an order-independent digest of the set of id
+    tuples which, unlike a sum of the ids themselves, doesn't collide when
+    ids are swapped between rows (e.g. environments {1, 4} for {2, 3}).
+
+    """
+    p = MIX_MODULUS
+    x = "({0} % {1})".format(columns[0], p)
+    for column in columns[1:]:
+        x = "(({0} * 48271 + {1}) % {2})".format(x, column, p)
+    for k in [16807, 69621]:
+        x = "((({0} * {0}) % {1} * {0} + {2}) % {1})".format(x, p, k)
+    return x
+
+
+
+def _id_list(ids):
+    """Return comma-separated SQL literal list of the given integer ids."""
+    return ",".join(str(int(i)) for i in ids)
+
+
+
 def _environment_intersection(run, caseversion):
     """Intersection of run/caseversion environment IDs."""
     run_env_ids = set(
@@ -385,6 +699,11 @@ class RunCaseVersion(HasEnvironmentsModel, MTModel):
     caseversion = models.ForeignKey(CaseVersion, related_name="runcaseversions")
     order = models.IntegerField(default=0, db_index=True)
 
+    # statuses recordable with ``get_result_method`` / ``record_results``
+    RESULT_STATUSES = ["passed", "failed", "invalidated", "blocked", "skipped"]
+    # statuses whose result methods take a comment
+    COMMENT_STATUSES = ["failed", "invalidated", "blocked"]
+
 
     def __unicode__(self):
         """Return unicode representation."""
@@ -420,15 +739,42 @@ class RunCaseVersion(HasEnvironmentsModel, MTModel):
         ret = super(RunCaseVersion, self).save(*args, **kwargs)
 
         if adding and inherit_envs:
-            self.environments.add(
-                *_environment_intersection(self.run, self.caseversion))
+            env_ids = _environment_intersection(self.run, self.caseversion)
+            self.environments.add(*env_ids)
+            for env_id in env_ids:
+                RunResultSummary.adjust(
+                    self.run_id, env_id, {RunResultSummary.TOTAL: 1})
 
         return ret
 
 
+    @classmethod
+    def _add_envs(cls, objs, envs):
+        """Add environments to runcaseversions; rebuild run summaries."""
+        super(RunCaseVersion, cls)._add_envs(objs, envs)
+        defer(
+            RunResultSummary.rebuild,
+            Run.everything.filter(
+                runcaseversions__in=objs).values_list(
+                "id", flat=True).distinct()
+            )
+
+
+    @classmethod
+    def _remove_envs(cls, objs, envs):
+        """Remove environments from runcaseversions; rebuild run summaries."""
+        super(RunCaseVersion, cls)._remove_envs(objs, envs)
+        defer(
+            RunResultSummary.rebuild,
+            Run.everything.filter(
+                runcaseversions__in=objs).values_list(
+                "id", flat=True).distinct()
+            )
+
+
     def result_summary(self):
         """Return a dict summarizing status of results."""
-        return result_summary(self.results.values())
+        return result_summary(self.results.all())
 
 
     def completion(self):
@@ -642,26 +988,124 @@ class Result(MTModel):
             )
 
 
+    @transaction.commit_on_success
     def save(self, *args, **kwargs):
-        if self.pk is None:
-            self.set_latest()
+        adding = self.pk is None
+        if adding:
+            replaced = self.set_latest()
+        else:
+            stored = self._summary_fields()
         super(Result, self).save(*args, **kwargs)
+        if adding:
+            self._update_result_summary(replaced)
+            self._update_current_status(replaced)
+            self._replaced = None
+        else:
+            # status or latest-ness may have changed in any way; if anything
+            # the summary counts depend on did (including the latest-ness of
+            # other results, by ``set_latest``), recount the affected runs.
+            if getattr(self, "_replaced", None) or (
+                    stored != self._summary_fields(stored=False)):
+                RunResultSummary.rebuild(
+                    RunCaseVersion.everything.filter(
+                        pk__in=[stored[0], self.runcaseversion_id]
+                        ).values_list("run", flat=True).distinct()
+                    )
+            self._replaced = None
+            RunCaseVersionStatus.refresh(
+                set([stored[0], self.runcaseversion_id]))
+
+
+    def _summary_fields(self, stored=True):
+        """
+        Return the fields the run result summary depends on, as a tuple.
+
+        Stored values by default, values of this instance with ``stored``
+        False.
+
+        """
+        names = [
+            "runcaseversion", "environment", "status", "is_latest", "deleted_on"]
+        if stored:
+            return Result.everything.filter(pk=self.pk).values_list(
+                *names).get()
+        return tuple(
+            getattr(self, self._meta.get_field(name).attname)
+            for name in names
+            )
 
 
     def set_latest(self):
         """
         Set this result to latest, and unset all others with this env/user/rcv
 
-        """
+        Returns the list of statuses of the results that were unset. The
+        runcaseversion's current status is brought up to date when this result
+        is then saved.
 
-        Result.objects.filter(
-            tester=self.tester,
-            runcaseversion=self.runcaseversion,
-            environment=self.environment,
+        """
+        previous = Result.objects.filter(
+            tester=self.tester_id,
+            runcaseversion=self.runcaseversion_id,
+            environment=self.environment_id,
             is_latest=True,
-            ).exclude(pk=self.pk).update(is_latest=False)
+            ).exclude(pk=self.pk)
+        replaced = list(previous.values_list("status", flat=True))
+        if replaced:
+            previous.update(is_latest=False)
 
         self.is_latest = True
+        self._replaced = replaced
+
+        return replaced
+
+
+    def _update_result_summary(self, replaced):
+        """
+        Apply this new latest result to the run's ``RunResultSummary``.
+
+        ``replaced`` is the list of statuses of the latest results (by this
+        tester, for this runcaseversion and environment) this one replaced.
+
+        """
+        deltas = {self.status: 1}
+        for status in replaced:
+            deltas[status] = deltas.get(status, 0) - 1
+
+        # the case/env pair is completed if any tester's latest result is
+        # completed, so only check other testers if this flips completion
+        was_completed = any(s in self.COMPLETED_STATES for s in replaced)
+        now_completed = self.status in self.COMPLETED_STATES
+        if was_completed != now_completed:
+            others = Result.objects.filter(
+                runcaseversion=self.runcaseversion_id,
+                environment=self.environment_id,
+                is_latest=True,
+                status__in=self.COMPLETED_STATES,
+                ).exclude(tester=self.tester_id).exists()
+            if not others:
+                deltas[RunResultSummary.COMPLETED] = 1 if now_completed else -1
+
+        RunResultSummary.adjust(
+            self.runcaseversion.run_id, self.environment_id, deltas)
+
+
+    def _update_current_status(self, replaced):
+        """
+        Apply this new latest result to the ``RunCaseVersionStatus``.
+
+        A completed (or skipped) result is the newest, so it becomes the
+        current status of its runcaseversion in its environment. A pending one
+        doesn't, but if it replaced one that wasn't pending, the current
+        status may now be some other tester's, or none.
+
+        """
+        pending = self.PENDING_STATES
+        if self.status not in pending:
+            RunCaseVersionStatus.record(
+                self.runcaseversion_id, self.environment_id, self.status)
+        elif any(s not in pending for s in replaced):
+            RunCaseVersionStatus.refresh([self.runcaseversion_id])
 
 
 
@@ -682,24 +1126,606 @@ class StepResult(MTModel):
 
 
 
-def result_summary(results):
+def record_results(results, user, batch_size=500):
     """
-    Given a queryset of results, return a dict summarizing their states.
+    Record a list of submitted results in bulk; return list of new Results.
+
+    Each item of ``results`` is a dictionary with ``run_id``, ``case``,
+    ``environment`` and ``status`` keys, and for some statuses ``comment``,
+    ``stepnumber`` and ``bug`` (see ``ResultResource``). The outcome is the
+    same as calling the ``RunCaseVersion.result_*`` method for each item in
+    order, but each batch of ``batch_size`` items is resolved, validated and
+    created with a fixed number of queries.
+
+    Raises ``ValidationError`` if any item is invalid; nothing from that
+    batch is recorded, but earlier batches are, so callers should wrap the
+    call in a transaction.
 
     """
-    states = Result.COMPLETED_STATES
+    created = []
+    for i in range(0, len(results), batch_size):
+        created.extend(_record_result_batch(results[i:i + batch_size], user))
+    return created
+
+
+
+def _record_result_batch(items, user):
+    """Validate and record one batch of submitted results."""
+    STATUS = Result.STATUS
+    entries = []
+    for data in items:
+        try:
+            key = (data["run_id"], data["case"], data["environment"])
+            status = data["status"]
+        except KeyError as e:
+            raise ValidationError(
+                "bad result object data missing key: {0}".format(e))
+        try:
+            key = tuple(int(k) for k in key)
+        except (TypeError, ValueError) as e:
+            raise ValidationError(
+                "bad result object data, ids must be integers: {0}".format(e))
+        if status not in RunCaseVersion.RESULT_STATUSES:
+            raise ValidationError(
+                "bad result object data, unknown status: {0}".format(status))
+        stepnumber = None
+        if status == STATUS.failed and data.get("stepnumber") is not None:
+            try:
+                stepnumber = int(data["stepnumber"])
+            except (TypeError, ValueError) as e:
+                raise ValidationError(
+                    "bad result object data, stepnumber must be an "
+                    "integer: {0}".format(e))
+        entries.append((key, status, stepnumber, data))
+
+    run_ids = set(k[0] for k, _, _, _ in entries)
+    case_ids = set(k[1] for k, _, _, _ in entries)
+    env_ids = set(k[2] for k, _, _, _ in entries)
+
+    missing_envs = env_ids.difference(
+        Environment.objects.filter(pk__in=env_ids).values_list(
+            "id", flat=True))
+    if missing_envs:
+        raise ValidationError(
+            "Specified environment does not exist: {0}".format(
+                min(missing_envs)))
+
+    # candidate rcvs by (run, case), oldest first, and their environments
+    candidates = {}
+    rcv_info = {}
+    for rcv_id, run_id, case_id, cv_id in RunCaseVersion.objects.filter(
+            run__in=run_ids, caseversion__case__in=case_ids).order_by(
+            "id").values_list(
+            "id", "run_id", "caseversion__case_id", "caseversion_id"):
+        candidates.setdefault((run_id, case_id), []).append(rcv_id)
+        rcv_info[rcv_id] = (run_id, cv_id)
+    rcv_envs = {}
+    for rcv_id, env_id in RunCaseVersion.environments.through.objects.filter(
+            runcaseversion__in=list(rcv_info)).order_by(
+            "environment").values_list("runcaseversion_id", "environment_id"):
+        rcv_envs.setdefault(rcv_id, []).append(env_id)
+
+    resolved = []
+    for (run_id, case_id, env_id), status, stepnumber, data in entries:
+        for rcv_id in candidates.get((run_id, case_id), []):
+            if env_id in rcv_envs.get(rcv_id, []):
+                break
+        else:
+            raise ValidationError(
+                "RunCaseVersion not found for run: {0}, case: {1}, "
+                "environment: {2}".format(run_id, case_id, env_id))
+        resolved.append((rcv_id, env_id, status, stepnumber, data))
+
+    # steps referenced by failed results, by (caseversion, number)
+    steps = {}
+    numbers = set(
+        stepnumber for _, _, _, stepnumber, _ in resolved
+        if stepnumber is not None)
+    if numbers:
+        for step_id, cv_id, number in CaseStep.objects.filter(
+                caseversion__in=set(cv for _, cv in rcv_info.values()),
+                number__in=numbers).order_by("-id").values_list(
+                "id", "caseversion_id", "number"):
+            steps[(cv_id, number)] = step_id
+
+    # build the new results; skipping applies to all envs of the rcv
+    now = utcnow()
+    new = []
+    failed_steps = []
+    for rcv_id, env_id, status, stepnumber, data in resolved:
+        if status == STATUS.skipped:
+            envs = rcv_envs[rcv_id]
+        else:
+            envs = [env_id]
+        comment = ""
+        if status in RunCaseVersion.COMMENT_STATUSES:
+            comment = data.get("comment", "")
+        for env in envs:
+            result = Result(
+                runcaseversion_id=rcv_id,
+                environment_id=env,
+                tester=user,
+                status=status,
+                comment=comment,
+                is_latest=False,
+                created_on=now,
+                created_by=user,
+                modified_on=now,
+                modified_by=user,
+                )
+            new.append(result)
+        if status == STATUS.failed:
+            step_id = steps.get(
+                (rcv_info[rcv_id][1], stepnumber))
+            failed_steps.append((result, step_id, data.get("bug", "")))
+
+    # within the batch, only the last result for a case/env is the latest
+    latest = {}
+    for result in new:
+        latest[(result.runcaseversion_id, result.environment_id)] = result
+    for result in latest.values():
+        result.is_latest = True
+
+    # lock the rcvs so concurrent submissions for them are serialized until
+    # the new results have been read back
+    list(
+        RunCaseVersion.objects.select_for_update().filter(
+            pk__in=set(k[0] for k in latest)).values_list("id", flat=True))
+
+    # unset the tester's previous latest results for the same case/envs
+    replaced = {}
+    for result_id, rcv_id, env_id, status in Result.objects.filter(
+            tester=user,
+            is_latest=True,
+            runcaseversion__in=set(k[0] for k in latest),
+            environment__in=set(k[1] for k in latest),
+            ).values_list("id", "runcaseversion_id", "environment_id", "status"):
+        if (rcv_id, env_id) in latest:
+            replaced.setdefault((rcv_id, env_id), []).append(
+                (result_id, status))
+    if replaced:
+        Result.objects.filter(
+            pk__in=[r[0] for rs in replaced.values() for r in rs]).update(
+            is_latest=False)
+
+    after_id = None
+    if any(f[1] is not None for f in failed_steps):
+        after_id = Result.everything.aggregate(id=Max("id"))["id"] or 0
+
+    Result.objects.bulk_create(new)
+
+    if failed_steps:
+        _record_failed_steps(failed_steps, new, after_id, user)
+
+    _update_result_summaries(latest, replaced, rcv_info, user)
+    RunCaseVersionStatus.refresh(set(k[0] for k in latest))
+
+    return new
+
+
+
+def _record_failed_steps(failed_steps, new, after_id, user):
+    """
+    Create step results (and touch rcvs) for newly recorded failed results.
+
+    ``failed_steps`` is a list of (result, step_id, bug_url) for the failed
+    results among ``new``, the just bulk-created results. Bulk insert doesn't
+    give us the new result ids, so the tester's results with ids above
+    ``after_id`` are fetched back for each case/env with a failed step, in id
+    order, while the rcvs are still locked. Raises ``RuntimeError`` if they
+    don't match up one-to-one with ``new``.
+
+    """
+    rcv_ids = set(f[0].runcaseversion_id for f in failed_steps)
+    with_step = [f for f in failed_steps if f[1] is not None]
+    if with_step:
+        keys = set(
+            (f[0].runcaseversion_id, f[0].environment_id) for f in with_step)
+        pending = {}
+        for result in new:
+            key = (result.runcaseversion_id, result.environment_id)
+            if key in keys:
+                pending.setdefault(key, []).append(result)
+        created = {}
+        for result_id, rcv_id, env_id in Result.objects.filter(
+                id__gt=after_id,
+                tester=user,
+                runcaseversion__in=set(k[0] for k in keys),
+                environment__in=set(k[1] for k in keys),
+                ).order_by("id").values_list(
+                "id", "runcaseversion_id", "environment_id"):
+            if (rcv_id, env_id) in keys:
+                created.setdefault((rcv_id, env_id), []).append(result_id)
+        for key, results in pending.items():
+            ids = created.get(key, [])
+            if len(ids) != len(results):
+                raise RuntimeError(
+                    "Expected {0} new results for {1}, found {2}; "
+                    "concurrent submission?".format(
+                        len(results), key, len(ids)))
+            for result, result_id in zip(results, ids):
+                result.id = result_id
+        now = utcnow()
+        StepResult.objects.bulk_create(
+            [
+                StepResult(
+                    result_id=result.id,
+                    step_id=step_id,
+                    status=StepResult.STATUS.failed,
+                    bug_url=bug,
+                    created_on=now,
+                    created_by=user,
+                    modified_on=now,
+                    modified_by=user,
+                    )
+                for result, step_id, bug in with_step
+                ]
+            )
+    RunCaseVersion.objects.filter(pk__in=rcv_ids).update(user=user)
+
+
 
-    result_ids = results.filter(is_latest=True).values_list("id", flat=True)
+def _update_result_summaries(latest, replaced, rcv_info, user):
+    """
+    Apply a batch of new latest results to the ``RunResultSummary`` counts.
 
-    if not result_ids:
-        return dict((s, 0) for s in states)
+    ``latest`` maps (rcv_id, env_id) to the new latest Result, ``replaced``
+    maps (rcv_id, env_id) to the (id, status) of the tester's results it
+    replaced, and ``rcv_info`` maps rcv_id to (run_id, caseversion_id).
 
-    cols = ["COUNT(CASE WHEN status=%s THEN 1 ELSE NULL END)"] * len(states)
-    sql = "SELECT {0} FROM {1} WHERE id IN ({2})".format(
-        ",".join(cols), Result._meta.db_table, ",".join(map(str, result_ids))
+    """
+    states = Result.COMPLETED_STATES
+    others = set(
+        Result.objects.filter(
+            is_latest=True,
+            status__in=states,
+            runcaseversion__in=set(k[0] for k in latest),
+            environment__in=set(k[1] for k in latest),
+            ).exclude(tester=user).values_list(
+            "runcaseversion_id", "environment_id")
         )
 
-    cursor = connection.cursor()
-    cursor.execute(sql, states)
+    deltas = {}
+    for (rcv_id, env_id), result in latest.items():
+        d = deltas.setdefault((rcv_info[rcv_id][0], env_id), {})
+        d[result.status] = d.get(result.status, 0) + 1
+        previous = [s for _, s in replaced.get((rcv_id, env_id), [])]
+        for status in previous:
+            d[status] = d.get(status, 0) - 1
+        completed_by_others = (rcv_id, env_id) in others
+        was_completed = completed_by_others or any(
+            s in states for s in previous)
+        now_completed = completed_by_others or result.status in states
+        if was_completed != now_completed:
+            d[RunResultSummary.COMPLETED] = d.get(
+                RunResultSummary.COMPLETED, 0) + (1 if now_completed else -1)
+
+    for (run_id, env_id), d in deltas.items():
+        RunResultSummary.adjust(run_id, env_id, d)
+
+
+
+class RunResultSummary(models.Model):
+    """
+    Denormalized count of latest results for a run, environment and status.
+
+    Besides one row per result status, each run/environment has a ``TOTAL``
+    row (number of runcaseversion/environment combos in the run) and a
+    ``COMPLETED`` row (number of those combos with a completed latest result),
+    so that run completion and result summaries don't have to aggregate over
+    all results.
+
+    Counts are adjusted as results are recorded, and rebuilt for a run when it
+    is locked, when runcaseversion environments are changed, and when results
+    or runcaseversions are soft-deleted or undeleted. Not an ``MTModel``: this
+    is derived data, and can always be rebuilt from scratch with ``rebuild``.
+
+    """
+    TOTAL = "_total"
+    COMPLETED = "_completed"
+
+    run = models.ForeignKey(Run, related_name="result_summaries")
+    environment = models.ForeignKey(Environment, related_name="+")
+    status = models.CharField(max_length=50)
+    count = models.IntegerField(default=0)
+
+
+    class Meta:
+        unique_together = [("run", "environment", "status")]
+
+
+    def __unicode__(self):
+        """Return unicode representation."""
+        return u"%s in %s: %s %s" % (
+            self.run_id, self.environment_id, self.count, self.status)
+
+
+    @classmethod
+    def counts(cls, run, environment=None):
+        """Return dict of status to count for ``run`` (and ``environment``)."""
+        summaries = cls.objects.filter(run=run)
+        if environment is not None:
+            summaries = summaries.filter(environment=environment)
+        return dict(
+            summaries.order_by().values_list("status").annotate(
+                total=Sum("count"))
+            )
+
+
+    @classmethod
+    def adjust(cls, run_id, environment_id, deltas):
+        """Add ``deltas`` (dict of status to delta) to run/env counts."""
+        for status, delta in deltas.items():
+            if not delta:
+                continue
+            summaries = cls.objects.filter(
+                run=run_id, environment=environment_id, status=status)
+            if summaries.update(count=models.F("count") + delta):
+                continue
+            sid = transaction.savepoint()
+            try:
+                cls.objects.create(
+                    run_id=run_id,
+                    environment_id=environment_id,
+                    status=status,
+                    count=delta,
+                    )
+            except IntegrityError:
+                # someone else created the row meanwhile
+                transaction.savepoint_rollback(sid)
+                summaries.update(count=models.F("count") + delta)
+            else:
+                transaction.savepoint_commit(sid)
+
+
+    @classmethod
+    def rebuild(cls, run_ids=None):
+        """Recompute counts for given runs (all runs if ``run_ids`` is None)."""
+        if run_ids is not None:
+            run_ids = list(run_ids)
+            if not run_ids:
+                return
+        sql, params = cls._live_sql(run_ids)
+        qn = connection.ops.quote_name
+        cursor = connection.cursor()
+        if run_ids is None:
+            cursor.execute("DELETE FROM {0}".format(cls._meta.db_table))
+        else:
+            cursor.execute(
+                "DELETE FROM {0} WHERE run_id IN ({1})".format(
+                    cls._meta.db_table, _id_list(run_ids))
+                )
+        cursor.execute(
+            "INSERT INTO {0} (run_id, environment_id, status, {1}) {2}".format(
+                cls._meta.db_table, qn("count"), sql),
+            params
+            )
+        transaction.set_dirty()
+
+
+    @classmethod
+    def live(cls, run_ids=None):
+        """
+        Return counts aggregated from the results themselves.
+
+        Return value is a dictionary mapping (run_id, environment_id, status)
+        to count, for the given runs (all runs if ``run_ids`` is None).
+
+        """
+        if run_ids is not None:
+            run_ids = list(run_ids)
+            if not run_ids:
+                return {}
+        sql, params = cls._live_sql(run_ids)
+        cursor = connection.cursor()
+        cursor.execute(sql, params)
+        return dict(
+            ((run_id, env_id, status), count)
+            for run_id, env_id, status, count in cursor.fetchall()
+            )
+
+
+    @classmethod
+    def _live_sql(cls, run_ids):
+        """Return (sql, params) aggregating counts for given runs."""
+        runs = ""
+        if run_ids is not None:
+            runs = "AND rcv.run_id IN ({0})".format(_id_list(run_ids))
+        states = Result.COMPLETED_STATES
+        sql = """SELECT rcv.run_id, r.environment_id, r.status, COUNT(*)
+            FROM {result} r
+                INNER JOIN {rcv} rcv ON rcv.id = r.runcaseversion_id
+            WHERE r.is_latest = %s AND r.deleted_on IS NULL
+                AND rcv.deleted_on IS NULL {runs}
+            GROUP BY rcv.run_id, r.environment_id, r.status
+        UNION ALL
+            SELECT rcv.run_id, rcve.environment_id, %s, COUNT(*)
+            FROM {rcv_env} rcve
+                INNER JOIN {rcv} rcv ON rcv.id = rcve.runcaseversion_id
+            WHERE rcv.deleted_on IS NULL {runs}
+            GROUP BY rcv.run_id, rcve.environment_id
+        UNION ALL
+            SELECT done.run_id, done.environment_id, %s, COUNT(*)
+            FROM (
+                SELECT DISTINCT rcv.run_id, r.runcaseversion_id,
+                    r.environment_id
+                FROM {result} r
+                    INNER JOIN {rcv} rcv ON rcv.id = r.runcaseversion_id
+                WHERE r.is_latest = %s AND r.deleted_on IS NULL
+                    AND rcv.deleted_on IS NULL AND r.status IN ({states})
+                    {runs}
+                ) done
+            GROUP BY done.run_id, done.environment_id
+            """.format(
+            result=Result._meta.db_table,
+            rcv=RunCaseVersion._meta.db_table,
+            rcv_env=RunCaseVersion.environments.through._meta.db_table,
+            runs=runs,
+            states=",".join(["%s"] * len(states)),
+            )
+        params = [True, cls.TOTAL, cls.COMPLETED, True] + states
+        return sql, params
+
+
+
+class RunCaseVersionStatus(models.Model):
+    """
+    Denormalized current status of a runcaseversion in an environment.
+
+    The current status is that of the newest latest result (of any tester)
+    for the runcaseversion in the environment that isn't pending (assigned or
+    started); if there is no such result there is no row. Lets the runtests
+    list sort, and the runcaseversion results list filter, by current status
+    with an index lookup rather than a subquery or join over all results.
+
+    Kept up to date as results are recorded, and refreshed when results are
+    soft-deleted or undeleted. Not an ``MTModel``: like ``RunResultSummary``,
+    this is derived data, and can always be rebuilt with ``rebuild``.
+
+    """
+    runcaseversion = models.ForeignKey(
+        RunCaseVersion, related_name="current_statuses")
+    environment = models.ForeignKey(Environment, related_name="+")
+    status = models.CharField(max_length=50, db_index=True)
+
+
+    class Meta:
+        unique_together = [("runcaseversion", "environment")]
+
+
+    def __unicode__(self):
+        """Return unicode representation."""
+        return u"%s in %s: %s" % (
+            self.runcaseversion_id, self.environment_id, self.status)
+
+
+    @classmethod
+    def record(cls, runcaseversion_id, environment_id, status):
+        """Set current status of a runcaseversion in an environment."""
+        statuses = cls.objects.filter(
+            runcaseversion=runcaseversion_id, environment=environment_id)
+        if statuses.update(status=status):
+            return
+        sid = transaction.savepoint()
+        try:
+            cls.objects.create(
+                runcaseversion_id=runcaseversion_id,
+                environment_id=environment_id,
+                status=status,
+                )
+        except IntegrityError:
+            # someone else created the row meanwhile
+            transaction.savepoint_rollback(sid)
+            statuses.update(status=status)
+        else:
+            transaction.savepoint_commit(sid)
+
+
+    @classmethod
+    def refresh(cls, rcv_ids):
+        """Recompute current statuses of given runcaseversions."""
+        rcv_ids = list(rcv_ids)
+        if rcv_ids:
+            cls._replace("rcv.id IN ({0})".format(_id_list(rcv_ids)))
+
+
+    @classmethod
+    def rebuild(cls, run_ids=None):
+        """Recompute current statuses for given runs (default all runs)."""
+        if run_ids is None:
+            cls._replace()
+            return
+        run_ids = list(run_ids)
+        if run_ids:
+            cls._replace("rcv.run_id IN ({0})".format(_id_list(run_ids)))
+
+
+    @classmethod
+    def live(cls, run_ids=None):
+        """
+        Return current statuses determined from the results themselves.
+
+        Return value is a dictionary mapping (runcaseversion_id,
+        environment_id) to status, for the given runs (all if None).
+
+        """
+        where = None
+        if run_ids is not None:
+            run_ids = list(run_ids)
+            if not run_ids:
+                return {}
+            where = "rcv.run_id IN ({0})".format(_id_list(run_ids))
+        sql, params = cls._live_sql(where)
+        cursor = connection.cursor()
+        cursor.execute(sql, params)
+        return dict(
+            ((rcv_id, env_id), status)
+            for rcv_id, env_id, status in cursor.fetchall()
+            )
+
+
+    @classmethod
+    def _replace(cls, where=None):
+        """Replace stored statuses of runcaseversions matching ``where``."""
+        sql, params = cls._live_sql(where)
+        cursor = connection.cursor()
+        if where is None:
+            cursor.execute("DELETE FROM {0}".format(cls._meta.db_table))
+        else:
+            cursor.execute(
+                "DELETE FROM {0} WHERE runcaseversion_id IN "
+                "(SELECT rcv.id FROM {1} rcv WHERE {2})".format(
+                    cls._meta.db_table, RunCaseVersion._meta.db_table, where)
+                )
+        cursor.execute(
+            "INSERT INTO {0} (runcaseversion_id, environment_id, status) "
+            "{1}".format(cls._meta.db_table, sql),
+            params
+            )
+        transaction.set_dirty()
+
+
+    @classmethod
+    def _live_sql(cls, where=None):
+        """
+        Return (sql, params) selecting current statuses.
+
+        ``where`` is an optional condition on the runcaseversions (as
+        ``rcv``) whose statuses are selected.
+
+        """
+        pending = Result.PENDING_STATES
+        sql = """SELECT r.runcaseversion_id, r.environment_id, r.status
+            FROM {result} r
+                INNER JOIN (
+                    SELECT MAX(lr.id) AS id
+                    FROM {result} lr
+                        INNER JOIN {rcv} rcv ON rcv.id = lr.runcaseversion_id
+                    WHERE lr.is_latest = %s AND lr.deleted_on IS NULL
+                        AND lr.status NOT IN ({pending}) {where}
+                    GROUP BY lr.runcaseversion_id, lr.environment_id
+                    ) cur ON cur.id = r.id
+            """.format(
+            result=Result._meta.db_table,
+            rcv=RunCaseVersion._meta.db_table,
+            pending=",".join(["%s"] * len(pending)),
+            where="AND {0}".format(where) if where else "",
+            )
+        return sql, [True] + pending
+
+
+
+def result_summary(results):
+    """
+    Given a queryset of results, return a dict summarizing their states.
+
+    """
+    states = Result.COMPLETED_STATES
+
+    counts = dict(
+        results.filter(
+            is_latest=True, status__in=states).order_by().values_list(
+            "status").annotate(count=Count("id"))
+        )
 
-    return dict(zip(states, cursor.fetchone()))
+    return dict((s, counts.get(s, 0)) for s in states)
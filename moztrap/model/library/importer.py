@@ -3,8 +3,10 @@
 import json
 
 from django.db import transaction
+from django.db.models import Max
 
 from ..core.auth import User
+from ..mtmodel import bump_choices_generation, utcnow
 from ..tags.models import Tag
 from .models import Case, CaseVersion, CaseStep, Suite, SuiteCase
 
@@ -56,7 +58,8 @@ class Importer(object):
     """
 
     @transaction.commit_on_success
-    def import_data(self, productversion, case_data, force_dupes=False):
+    def import_data(self, productversion, case_data, force_dupes=False,
+                    bulk=False):
         """
         Import the top-level dictionary of cases and suites.
 
@@ -69,6 +72,8 @@ class Importer(object):
         * case_data -- a dictionary of cases and/or suites to be imported
         * force_dupes -- if True, will import cases with duplicate names.  If
           False, they will be skipped.
+        * bulk -- if True, import cases with bulk inserts (see
+          ``CaseImporter.bulk_import_cases``).
 
         """
 
@@ -86,7 +91,11 @@ class Importer(object):
         # gracefully if no cases.
         if "cases" in case_data:
             case_importer = CaseImporter(productversion, suite_importer)
-            result.append(case_importer.import_cases(
+            if bulk:
+                import_cases = case_importer.bulk_import_cases
+            else:
+                import_cases = case_importer.import_cases
+            result.append(import_cases(
                 case_data["cases"],
                 force_dupes=force_dupes))
 
@@ -97,6 +106,54 @@ class Importer(object):
         return result
 
 
+    @transaction.commit_on_success
+    def import_stream(self, productversion, items, force_dupes=False,
+                      bulk=False, chunk_size=1000, progress=None):
+        """
+        Import cases and suites from an iterable of (section, item) pairs.
+
+        Like ``import_data``, but for data too large to hold in memory at
+        once: ``items`` yields ("suites", suite dict) and ("cases", case dict)
+        pairs, as ``jsonstream.iter_sections`` does for an import file, and
+        cases are imported ``chunk_size`` at a time. Other sections are
+        ignored.
+
+        If ``progress`` is given, it is called with the ``ImportResult`` so
+        far after each chunk of cases.
+
+        """
+        result = ImportResult()
+
+        suite_importer = SuiteImporter(productversion.product)
+        case_importer = CaseImporter(productversion, suite_importer)
+        if bulk:
+            import_cases = case_importer.bulk_import_cases
+        else:
+            import_cases = case_importer.import_cases
+
+        cases = []
+        for section, item in items:
+            if section == "suites":
+                suite_importer.add_dicts([item])
+            elif section == "cases":
+                cases.append(item)
+                if len(cases) >= chunk_size:
+                    result.append(import_cases(cases, force_dupes=force_dupes))
+                    cases = []
+                    if progress is not None:
+                        progress(result)
+
+        if cases:
+            result.append(import_cases(cases, force_dupes=force_dupes))
+            if progress is not None:
+                progress(result)
+
+        # now create the remaining suites and add cases to them
+        result.append(suite_importer.import_suites())
+
+        return result
+
+
 
 class CaseImporter(object):
     """Imports cases and links to or creates associated tags, suites."""
@@ -205,16 +262,18 @@ class CaseImporter(object):
             case = Case.objects.create(
                 product=self.productversion.product,
                 idprefix=new_case.get("idprefix", ""),
+                user=user,
                 )
 
             # create the case version which holds the details
-            caseversion = CaseVersion.objects.create(
+            caseversion = CaseVersion(
                 productversion=self.productversion,
                 case=case,
                 name=new_case["name"],
                 description=new_case.get("description", ""),
-                user=user,
                 )
+            # a new case has no other versions to sync the name to
+            caseversion.save(user=user, skip_sync_name=True)
 
             # add the steps to this case version
             if "steps" in new_case:
@@ -256,6 +315,203 @@ class CaseImporter(object):
         return result
 
 
+    def bulk_import_cases(self, case_dict_list, force_dupes=False,
+                          chunk_size=1000):
+        """
+        Import the test cases in the data, using bulk inserts.
+
+        Takes the same data, skips and warns for the same reasons, and
+        returns the same result as ``import_cases``. But all cases are
+        validated up front (with a single query for existing case names),
+        and then created ``chunk_size`` at a time: cases, case versions,
+        steps and environments each with a bulk insert per chunk. Tags and
+        suites are added once all cases are created.
+
+        """
+
+        result = ImportResult()
+
+        # names are compared case-insensitively, like the database does
+        existing_names = set()
+        if not force_dupes:
+            existing_names.update(
+                name.lower() for name in CaseVersion.objects.filter(
+                    productversion=self.productversion).values_list(
+                    "name", flat=True)
+                )
+
+        self.user_cache.prefetch(
+            new_case["created_by"] for new_case in case_dict_list
+            if "created_by" in new_case
+            )
+
+        pending = []
+        for new_case in case_dict_list:
+
+            if not "name" in new_case:
+                result.warn(
+                    ImportResult.SKIP_CASE_NO_NAME,
+                    new_case,
+                    )
+                continue
+
+            # Don't re-import if we have the same case name and Product Version
+            if new_case["name"].lower() in existing_names:
+                result.warn(
+                    ImportResult.SKIP_CASE_NAME_CONFLICT,
+                    new_case,
+                    )
+                continue
+
+            user = None
+            if "created_by" in new_case:
+                try:
+                    email = new_case["created_by"]
+                    user = self.user_cache.get_user(email)
+
+                except User.DoesNotExist:
+                    result.warn(
+                        ImportResult.WARN_USER_NOT_FOUND,
+                        email,
+                        )
+
+            if any("instruction" not in new_step
+                   for new_step in new_case.get("steps", [])):
+                result.warn(
+                    ImportResult.SKIP_STEP_NO_INSTRUCTION,
+                    new_case,
+                    )
+                continue
+
+            if not force_dupes:
+                existing_names.add(new_case["name"].lower())
+            pending.append((new_case, user))
+
+            if len(pending) >= chunk_size:
+                self.bulk_create_cases(pending, result)
+                pending = []
+
+        if pending:
+            self.bulk_create_cases(pending, result)
+
+        # now create the tags and add case versions to them
+        self.tag_importer.import_tags()
+
+        # now create the suites and add cases to them
+        result.append(self.suite_importer.import_suites())
+
+        return result
+
+
+    def bulk_create_cases(self, pending, result):
+        """
+        Create validated cases with bulk inserts.
+
+        Keyword arguments:
+
+        * pending -- list of (case data, user) tuples for cases that passed
+          validation
+        * result -- the ImportResult to count imported cases and add
+          warnings to
+
+        Bulk inserts don't return the new ids, so the new cases are fetched
+        back by product, creation timestamp and id range; each new case has
+        exactly one version, which is thus its latest.
+
+        """
+        product = self.productversion.product
+        now = utcnow()
+
+        last_id = Case.everything.aggregate(last_id=Max("id"))["last_id"] or 0
+        Case.objects.bulk_create(
+            [
+                Case(
+                    product=product,
+                    idprefix=new_case.get("idprefix", ""),
+                    created_on=now,
+                    created_by=user,
+                    modified_on=now,
+                    modified_by=user,
+                    )
+                for new_case, user in pending
+                ]
+            )
+        cases = list(
+            Case.everything.filter(
+                id__gt=last_id, product=product, created_on=now).order_by(
+                "id")
+            )
+        if len(cases) != len(pending):
+            raise RuntimeError(
+                "Expected {0} new cases, found {1}; concurrent import?".format(
+                    len(pending), len(cases)))
+
+        CaseVersion.objects.bulk_create(
+            [
+                CaseVersion(
+                    productversion=self.productversion,
+                    case=case,
+                    name=new_case["name"],
+                    description=new_case.get("description", ""),
+                    latest=True,
+                    created_on=now,
+                    created_by=user,
+                    modified_on=now,
+                    modified_by=user,
+                    )
+                for case, (new_case, user) in zip(cases, pending)
+                ]
+            )
+        caseversions = dict(
+            (cv.case_id, cv) for cv in CaseVersion.everything.filter(
+                case__in=cases)
+            )
+
+        steps = []
+        environments = []
+        through = CaseVersion.environments.through
+        env_ids = list(
+            self.productversion.environments.values_list("id", flat=True))
+        for case, (new_case, user) in zip(cases, pending):
+            caseversion = caseversions[case.id]
+            caseversion.case = case
+
+            if new_case.get("steps"):
+                for step_num, new_step in enumerate(new_case["steps"]):
+                    steps.append(
+                        CaseStep(
+                            caseversion=caseversion,
+                            number=step_num + 1,
+                            instruction=new_step["instruction"],
+                            expected=new_step.get("expected", ""),
+                            created_on=now,
+                            modified_on=now,
+                            )
+                        )
+            elif "steps" not in new_case:
+                result.warn(
+                    ImportResult.WARN_NO_STEPS,
+                    caseversion,
+                    )
+
+            environments.extend(
+                through(caseversion_id=caseversion.id, environment_id=env_id)
+                for env_id in env_ids
+                )
+
+            if "tags" in new_case:
+                self.tag_importer.add_names(caseversion, new_case["tags"])
+
+            if "suites" in new_case:
+                self.suite_importer.add_names(case, new_case["suites"])
+
+        CaseStep.objects.bulk_create(steps)
+        through.objects.bulk_create(environments)
+        bump_choices_generation(through)
+
+        result.num_cases += len(pending)
+
+
     def import_steps(self, caseversion, step_data):
         """
         Add the steps to this case version.
@@ -297,6 +553,20 @@ class UserCache(object):
         self.cache = {}
 
 
+    def prefetch(self, emails):
+        """
+        Cache the users for all the given emails with a single query.
+
+        Emails without a matching user aren't cached, so ``get_user`` still
+        raises ``DoesNotExist`` (once) for them.
+
+        """
+        emails = set(emails).difference(self.cache)
+        if emails:
+            for user in User.objects.filter(email__in=emails):
+                self.cache.setdefault(user.email, user)
+
+
     def get_user(self, email):
         """
         Return the user object that matches the email in the case, if any.
@@ -428,6 +698,8 @@ class SuiteImporter(object):
         self.product = product
         self.map = {}
         self.result = ImportResult()
+        # names of suites created by this importer
+        self.created = set()
 
 
     def add_names(self, case, suite_names):
@@ -503,16 +775,29 @@ class SuiteImporter(object):
 
             if created:
                 self.result.num_suites += 1
+                self.created.add(suite_name)
+            elif (suite_name in self.created and
+                    suite_data.get("description") and
+                    suite.description != suite_data["description"]):
+                # suite dict came after cases that created the suite
+                suite.description = suite_data["description"]
+                suite.save()
 
             # now add any cases the suite may have specified
             if "cases" in suite_data:
-                for case in suite_data["cases"]:
-                    SuiteCase.objects.create(case=case, suite=suite)
+                SuiteCase.objects.bulk_create(
+                    [
+                        SuiteCase(case=case, suite=suite)
+                        for case in suite_data["cases"]
+                        ]
+                    )
 
-        # we have imported (or warned on) these items, so reset map.
+        # we have imported (or warned on) these items, so reset map and
+        # result; the result is returned to be appended to the caller's.
         self.map.clear()
+        result, self.result = self.result, ImportResult()
 
-        return self.result
+        return result
 
 
 
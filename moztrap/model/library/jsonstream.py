@@ -0,0 +1,146 @@
+"""
+Incremental parsing of large JSON import files.
+
+"""
+import json
+
+
+
+def iter_sections(fh, chunk_size=64 * 1024):
+    """
+    Yield (key, item) pairs from a file containing a single JSON object.
+
+    For each key of the top-level object whose value is an array (like the
+    "suites" and "cases" of the import format), yields one pair per item of
+    the array, in file order; other values are yielded whole. The file is
+    read ``chunk_size`` bytes at a time and items are decoded one at a time,
+    so memory use is bounded by the size of the largest item rather than the
+    size of the file.
+
+    Raises ``ValueError`` if the file is not valid JSON of that shape.
+
+    """
+    reader = _Reader(fh, chunk_size)
+    reader.expect("{")
+    if reader.peek() == "}":
+        reader.next()
+    else:
+        while True:
+            key = reader.decode()
+            if not isinstance(key, basestring):
+                raise reader.error("Expecting property name")
+            reader.expect(":")
+            if reader.peek() == "[":
+                reader.next()
+                if reader.peek() == "]":
+                    reader.next()
+                else:
+                    while True:
+                        yield key, reader.decode()
+                        char = reader.next()
+                        if char == "]":
+                            break
+                        if char != ",":
+                            raise reader.error(
+                                "Expecting , delimiter", consumed=True)
+            else:
+                yield key, reader.decode()
+            char = reader.next()
+            if char == "}":
+                break
+            if char != ",":
+                raise reader.error(
+                    "Expecting , delimiter", consumed=True)
+    if reader.peek():
+        raise reader.error("Extra data")
+
+
+
+class _Reader(object):
+    """Buffered reader decoding JSON values from a file."""
+    WHITESPACE = " \t\n\r"
+    NUMBER_CHARS = "0123456789+-.eE"
+
+
+    def __init__(self, fh, chunk_size):
+        self.fh = fh
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.offset = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+
+    def fill(self):
+        """Read another chunk into the buffer; return False at end of file."""
+        if self.eof:
+            return False
+        chunk = self.fh.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        if self.pos:
+            self.offset += self.pos
+            self.buf = self.buf[self.pos:]
+            self.pos = 0
+        self.buf += chunk
+        return True
+
+
+    def peek(self):
+        """Return next non-whitespace character, or "" at end of file."""
+        while True:
+            while (self.pos < len(self.buf) and
+                   self.buf[self.pos] in self.WHITESPACE):
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return ""
+
+
+    def next(self):
+        """Consume and return next non-whitespace character."""
+        char = self.peek()
+        self.pos += 1
+        return char
+
+
+    def expect(self, expected):
+        """Consume next non-whitespace character; must be ``expected``."""
+        if self.next() != expected:
+            raise self.error(
+                "Expecting {0}".format(expected), consumed=True)
+
+
+    def decode(self):
+        """Decode and return the next JSON value."""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except ValueError:
+                if self.fill():
+                    continue
+                raise self.error("Could not decode value")
+            # a number running to (nearly) the end of the buffer may continue
+            # in the next chunk: "12" of "123", or "1.5" of "1.5e3" (where the
+            # buffer ends "1.5e").
+            if (not self.buf[end:].lstrip(self.NUMBER_CHARS)) and self.fill():
+                continue
+            self.pos = end
+            return value
+
+
+    def error(self, message, consumed=False):
+        """
+        Return ValueError with given message and current file offset.
+
+        If ``consumed`` is True, the offset is that of the last character
+        consumed (by ``next``) rather than that of the next one.
+
+        """
+        return ValueError(
+            "{0}: char {1}".format(
+                message, self.offset + self.pos - (1 if consumed else 0)))
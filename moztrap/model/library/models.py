@@ -3,11 +3,11 @@ Models for test-case library (cases, suites).
 
 """
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import connection, models, transaction
 from django.db.models import Max
 
 from ..attachments.models import Attachment
-from ..mtmodel import MTModel, DraftStatusModel
+from ..mtmodel import MTModel, DraftStatusModel, utcnow
 from ..core.models import Product, ProductVersion
 from ..environments.models import HasEnvironmentsModel
 from ..tags.models import Tag
@@ -25,10 +25,8 @@ class Case(MTModel):
         return "case #%s" % (self.id,)
 
 
-    def clone(self, *args, **kwargs):
-        """Clone this Case with default cascade behavior: latest versions."""
-        kwargs.setdefault("cascade", ["versions"])
-        return super(Case, self).clone(*args, **kwargs)
+    # clone this Case with default cascade behavior: all versions
+    clone_cascade = ["versions"]
 
 
     def set_latest_version(self, update_instance=None):
@@ -56,6 +54,64 @@ class Case(MTModel):
                     update_instance.latest = False
 
 
+    @classmethod
+    def set_latest_versions(cls, product):
+        """
+        Mark latest version of every case of ``product`` in DB.
+
+        Like ``set_latest_version`` for each case, but in two statements
+        rather than three per case: one marks non-latest the caseversions that
+        no longer are, the other marks latest those that now are. The latest
+        version of a case is the one for the highest-ordered product version
+        (the highest id breaks any tie). Caseversions whose flag is already
+        correct are not touched.
+
+        """
+        qn = connection.ops.quote_name
+        cv_table = CaseVersion._meta.db_table
+        pv_table = ProductVersion._meta.db_table
+        # wrapped in a derived table so MySQL will allow it in a subquery of
+        # an UPDATE of the same table.
+        latest_ids = """SELECT id FROM (
+            SELECT MAX(cv.id) AS id
+            FROM {cv} AS cv
+                INNER JOIN {pv} AS pv ON pv.id = cv.productversion_id
+                INNER JOIN (
+                    SELECT cv2.case_id, MAX(pv2.{order}) AS max_order
+                    FROM {cv} AS cv2
+                        INNER JOIN {pv} AS pv2
+                            ON pv2.id = cv2.productversion_id
+                    WHERE pv2.product_id = %s AND cv2.deleted_on IS NULL
+                    GROUP BY cv2.case_id
+                    ) AS m
+                    ON m.case_id = cv.case_id AND m.max_order = pv.{order}
+            WHERE pv.product_id = %s AND cv.deleted_on IS NULL
+            GROUP BY cv.case_id
+            ) AS latest_ids""".format(
+            cv=cv_table, pv=pv_table, order=qn("order"))
+
+        cursor = connection.cursor()
+        cursor.execute(
+            """UPDATE {cv}
+            SET latest = %s, cc_version = cc_version + 1
+            WHERE latest = %s
+                AND deleted_on IS NULL
+                AND productversion_id IN (
+                    SELECT id FROM {pv} WHERE product_id = %s)
+                AND id NOT IN ({latest_ids})
+            """.format(cv=cv_table, pv=pv_table, latest_ids=latest_ids),
+            [False, True, product.id, product.id, product.id]
+            )
+        cursor.execute(
+            """UPDATE {cv}
+            SET latest = %s, cc_version = cc_version + 1
+            WHERE latest = %s AND id IN ({latest_ids})
+            """.format(cv=cv_table, latest_ids=latest_ids),
+            [True, False, product.id, product.id]
+            )
+        transaction.set_dirty()
+
+
     def all_versions(self):
         """
         Return list of (productversion, caseversion) tuples for this case.
@@ -115,22 +171,125 @@ class CaseVersion(MTModel, DraftStatusModel, HasEnvironmentsModel):
 
 
     def save(self, *args, **kwargs):
-        """Save CaseVersion, updating latest version."""
+        """
+        Save CaseVersion, updating latest version and syncing name.
+
+        Pass ``skip_sync_name=True`` to defer syncing the name to the other
+        versions of the case, e.g. to sync a batch of caseversions at once
+        with ``sync_names``.
+
+        """
         skip_set_latest = kwargs.pop("skip_set_latest", False)
         skip_sync_name = kwargs.pop("skip_sync_name", False)
+        user = kwargs.get("user")
         super(CaseVersion, self).save(*args, **kwargs)
         if not skip_set_latest:
             self.case.set_latest_version(update_instance=self)
 
         # keep the name in sync for all caseversions
         if not skip_sync_name:
-            for cv in self.case.versions.all():
-                if not cv == self:
-                    cv.name = self.name
-                    cv.save(
-                        skip_sync_name=True,
-                        skip_set_latest=True,
-                        )
+            CaseVersion.sync_names([self], user=user)
+
+
+    @classmethod
+    def sync_names(cls, caseversions, user=None, chunk_size=400):
+        """
+        Give the other versions of each case the name of the given version.
+
+        For each chunk of ``chunk_size`` caseversions, one ``UPDATE ... CASE``
+        statement renames the other (non-deleted) versions of their cases,
+        incrementing their ``cc_version``. If more than one of the given
+        caseversions is of the same case, the last one's name wins.
+
+        """
+        names = {}
+        source_ids = {}
+        for cv in caseversions:
+            names[cv.case_id] = cv.name
+            source_ids.setdefault(cv.case_id, []).append(cv.id)
+        if not names:
+            return
+
+        case_ids = names.keys()
+        cursor = connection.cursor()
+        for i in range(0, len(case_ids), chunk_size):
+            chunk = case_ids[i:i + chunk_size]
+            params = []
+            for case_id in chunk:
+                params.extend([case_id, names[case_id]])
+            params.extend([user.id if user else None, utcnow()])
+            cursor.execute(
+                """UPDATE {table}
+                SET name = CASE case_id {cases} END,
+                    modified_by_id = %s,
+                    modified_on = %s,
+                    cc_version = cc_version + 1
+                WHERE case_id IN ({case_ids})
+                    AND id NOT IN ({source_ids})
+                    AND deleted_on IS NULL
+                """.format(
+                    table=cls._meta.db_table,
+                    cases=" ".join(["WHEN %s THEN %s"] * len(chunk)),
+                    case_ids=", ".join(str(int(c)) for c in chunk),
+                    source_ids=", ".join(
+                        str(int(cv_id))
+                        for case_id in chunk
+                        for cv_id in source_ids[case_id]
+                        ),
+                    ),
+                params,
+                )
+        transaction.set_dirty()
+
+
+    @classmethod
+    def clone_forward(cls, source, target, user=None, batch_size=500,
+                      progress=None):
+        """
+        Clone caseversions of productversion ``source`` into ``target``.
+
+        Clones (with their steps, attachments, tags and environments) the
+        versions in ``source`` of every case that has no version in
+        ``target`` yet, keeping their names; returns the number cloned.
+
+        Caseversions are bulk-cloned ``batch_size`` at a time, each batch
+        committed separately, so the number of queries depends on the number
+        of batches rather than of caseversions; if given, ``progress`` is
+        called with (number cloned so far, total) after each batch. Since
+        cases already in ``target`` are skipped, an interrupted run can
+        simply be restarted. The ``latest`` flags of the product's
+        caseversions are recomputed once, at the end.
+
+        Each clone is the only version of its case in ``target``, so the new
+        caseversions are matched up with their sources by case.
+
+        """
+        pending = cls.objects.filter(productversion=source).exclude(
+            case__in=cls.objects.filter(
+                productversion=target).values("case")).order_by("id")
+        total = pending.count()
+        done = 0
+        last = 0
+        while True:
+            batch = list(pending.filter(id__gt=last)[:batch_size])
+            if not batch:
+                break
+            last = batch[-1].id
+            with transaction.commit_on_success():
+                cls.bulk_clone(
+                    batch,
+                    overrides={"productversion": target, "latest": False},
+                    user=user,
+                    key=("productversion", "case"),
+                    )
+            done += len(batch)
+            if progress is not None:
+                progress(done, total)
+
+        if done:
+            with transaction.commit_on_success():
+                Case.set_latest_versions(target.product)
+        return done
 
 
 
@@ -175,6 +334,9 @@ class CaseVersion(MTModel, DraftStatusModel, HasEnvironmentsModel):
                 )
 
 
+    clone_cascade = ["steps", "attachments", "tags", "environments"]
+
+
     def clone(self, *args, **kwargs):
         """
         Clone this CaseVersion, cascading steps, attachments, tags.  Cloned
@@ -186,8 +348,6 @@ class CaseVersion(MTModel, DraftStatusModel, HasEnvironmentsModel):
         cloned and the cloned CaseVersion will be assigned to that new case.
 
         """
-        kwargs.setdefault(
-            "cascade", ["steps", "attachments", "tags", "environments"])
         overrides = kwargs.setdefault("overrides", {})
         overrides.setdefault("name", u"Cloned: {0}".format(self.name))
         if "productversion" not in overrides and "case" not in overrides:
@@ -322,9 +482,11 @@ class Suite(MTModel, DraftStatusModel):
         return self.name
 
 
+    clone_cascade = ["suitecases"]
+
+
     def clone(self, *args, **kwargs):
         """Clone this Suite with default cascade behavior."""
-        kwargs.setdefault("cascade", ["suitecases"])
         overrides = kwargs.setdefault("overrides", {})
         overrides["status"] = self.STATUS.draft
         overrides.setdefault("name", "Cloned: {0}".format(self.name))
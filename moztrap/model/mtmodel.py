@@ -5,12 +5,19 @@ Soft-deletion (including cascade) and tracking of user and timestamp for model
 creation, modification, and soft-deletion.
 
 """
+from collections import OrderedDict
+from contextlib import contextmanager
 import datetime
+import random
+import threading
+import time
 
 from django.db import models, router
-from django.db.models.deletion import Collector
+from django.db.models.fields.related import (
+    ForeignRelatedObjectsDescriptor, ReverseManyRelatedObjectsDescriptor)
 from django.db.models.query import QuerySet
 from django.db.models.signals import class_prepared
+from django.dispatch import Signal
 from django.core.cache import cache
 
 from model_utils import Choices
@@ -21,55 +28,416 @@ class ConcurrencyError(Exception):
 
 
 
+# Sent by a soft-delete (or undelete) cascade after each chunk of rows of a
+# model class has been updated; ``pks`` is the list of primary keys of the
+# rows in that chunk that were updated. The whole cascade runs within a
+# ``deferring`` block, so receivers can ``defer`` work on the affected rows'
+# parents to be done once at the end of it.
+post_soft_delete = Signal(providing_args=["pks", "user"])
+post_undelete = Signal(providing_args=["pks", "user"])
+
+
+
 def utcnow():
     return datetime.datetime.utcnow()
 
 
 
-class SoftDeleteCollector(Collector):
+# Models whose instances are listed as choices (of list filters); see
+# ``choices_generation``.
+choices_models = set()
+
+# Generation counters are re-created on a cache miss (see
+# ``choices_generation``), so they can safely expire.
+CHOICES_GENERATION_TIMEOUT = 60 * 60 * 24 * 30
+
+
+
+def track_choices(*models):
+    """Maintain the choices generation of the given model classes."""
+    choices_models.update(models)
+
+
+
+def choices_generation(model):
     """
-    A variant of Django's default delete-cascade collector that implements soft
-    delete.
+    Return current choices generation of ``model`` (shared via the cache).
+
+    Anything cached based on the set of instances of a tracked model (see
+    ``track_choices``) can include this in its cache key: it changes whenever
+    instances of the model are saved, updated or (un)deleted, so any cache
+    key based on an old generation is simply never looked up again.
 
     """
-    def collect(self, objs, *args, **kwargs):
-        """
-        Collect ``objs`` and dependent objects.
+    key = _choices_generation_key(model)
+    generation = cache.get(key)
+    if generation is None:
+        # start from the clock, so a counter that was evicted never comes back
+        # at a generation that has already been used.
+        generation = int(time.time() * 1000000)
+        if not cache.add(key, generation, CHOICES_GENERATION_TIMEOUT):
+            generation = cache.get(key, generation)
+    return generation
 
-        We override in order to store "root" objects for undelete.
 
-        """
-        if kwargs.get("source", None) is None:
-            self.root_objs = objs
-        super(SoftDeleteCollector, self).collect(objs, *args, **kwargs)
 
+def bump_choices_generation(model):
+    """Start a new choices generation for ``model``, if it is tracked."""
+    if model not in choices_models:
+        return
+    try:
+        cache.incr(_choices_generation_key(model))
+    except ValueError:
+        # no counter; the next ``choices_generation`` starts a new one.
+        pass
 
-    def delete(self, user=None):
-        """
-        Soft-delete all collected instances.
 
-        """
-        now = utcnow()
-        for model, instances in self.data.iteritems():
-            pk_list = [obj.pk for obj in instances]
-            model._base_manager.filter(
-                pk__in=pk_list, deleted_on__isnull=True).update(
-                deleted_by=user, deleted_on=now)
 
+# Calls collected by ``defer`` within the outermost ``deferring`` block.
+_deferred = threading.local()
 
-    def undelete(self, user=None):
+
+
+@contextmanager
+def deferring():
+    """
+    Collect ``defer`` calls made within the block, and make them on leaving it.
+
+    Each deferred function is called once, with the union of all the ids it
+    was deferred with, when the outermost block is left; nested blocks join
+    it. Nothing is called if the block raises.
+
+    """
+    if getattr(_deferred, "pending", None) is not None:
+        yield
+        return
+    _deferred.pending = pending = OrderedDict()
+    try:
+        yield
+    finally:
+        _deferred.pending = None
+    for func, ids in pending.items():
+        func(ids)
+
+
+
+def defer(func, ids):
+    """Call ``func(ids)``, or add ``ids`` to its call at end of ``deferring``."""
+    pending = getattr(_deferred, "pending", None)
+    if pending is None:
+        func(ids)
+    else:
+        pending.setdefault(func, set()).update(ids)
+
+
+
+def _choices_generation_key(model):
+    return "choices-generation-{0}".format(model._meta)
+
+
+
+class SoftDeleteCollector(object):
+    """
+    Soft-deletes (or undeletes) objects along with their delete cascade.
+
+    Follows the same cascade as Django's deletion ``Collector`` (reverse
+    foreign keys with ``on_delete=CASCADE`` from other ``MTModel`` classes),
+    but never loads instances: primary keys of matching rows are selected
+    ``chunk_size`` at a time, updated directly, and the cascade followed from
+    each chunk before moving on to the next, so memory use and the size of
+    every statement are bounded however large the cascade is.
+
+    Only rows that are actually (un)deleted are cascaded from: a delete skips
+    rows that are already deleted, and an undelete restores only rows that
+    were deleted along with (at the same time as) the root objects.
+
+    ``delete`` and ``undelete`` return a dictionary mapping each model class
+    to the number of its rows that were updated.
+
+    """
+    def __init__(self, using, chunk_size=1000):
+        self.using = using
+        self.chunk_size = chunk_size
+        self.counts = {}
+
+
+    def delete(self, objs, user=None):
+        """
+        Soft-delete ``objs`` (a queryset or list of instances) and cascade.
+
+        """
+        roots = self._root_queryset(objs)
+        if roots is None:
+            return self.counts
+        condition = {"deleted_on__isnull": True}
+        values = {"deleted_by": user, "deleted_on": utcnow()}
+        with deferring():
+            self._cascade(
+                roots.filter(**condition),
+                condition, values, post_soft_delete, user)
+        return self.counts
+
+
+    def undelete(self, objs, user=None):
         """
-        Undelete all collected instances that were deleted.
+        Undelete ``objs`` (a queryset or list of instances) and cascade.
 
         """
         # timestamps on which root obj(s) were deleted; only cascade items also
         # deleted in one of these same cascade batches should be undeleted.
-        deletion_times = set([o.deleted_on for o in self.root_objs])
-        for model, instances in self.data.iteritems():
-            pk_list = [obj.pk for obj in instances]
-            model._base_manager.filter(
-                pk__in=pk_list, deleted_on__in=deletion_times).update(
-                deleted_by=None, deleted_on=None)
+        roots = self._root_queryset(objs)
+        if roots is None:
+            return self.counts
+        if isinstance(objs, QuerySet):
+            deletion_times = set(
+                roots.filter(deleted_on__isnull=False).order_by().values_list(
+                    "deleted_on", flat=True).distinct())
+        else:
+            deletion_times = set(
+                o.deleted_on for o in objs if o.deleted_on is not None)
+        if not deletion_times:
+            return self.counts
+        condition = {"deleted_on__in": deletion_times}
+        values = {"deleted_by": None, "deleted_on": None}
+        with deferring():
+            self._cascade(
+                roots.filter(**condition),
+                condition, values, post_undelete, user)
+        return self.counts
+
+
+    def _root_queryset(self, objs):
+        """Return queryset of given queryset or list of instances, or None."""
+        if isinstance(objs, QuerySet):
+            return objs.using(self.using)
+        if not objs:
+            return None
+        return objs[0].__class__._base_manager.using(self.using).filter(
+            pk__in=[o.pk for o in objs])
+
+
+    def _cascade(self, queryset, condition, values, signal, user):
+        """
+        Update rows of ``queryset`` to ``values`` and cascade, chunk by chunk.
+
+        ``queryset`` must be limited to rows matching ``condition``, which the
+        update moves them out of; rows of related models matching it are
+        updated in turn.
+
+        """
+        model = queryset.model
+        last = None
+        while True:
+            chunk = queryset.order_by("pk")
+            if last is not None:
+                chunk = chunk.filter(pk__gt=last)
+            pks = list(chunk.values_list("pk", flat=True)[:self.chunk_size])
+            if not pks:
+                break
+            last = pks[-1]
+            updated = model._base_manager.using(self.using).filter(
+                pk__in=pks, **condition).update(**values)
+            self.counts[model] = self.counts.get(model, 0) + updated
+            if updated:
+                bump_choices_generation(model)
+            signal.send(sender=model, pks=pks, user=user)
+            for related in cascade_relations(model):
+                self._cascade(
+                    related.model._base_manager.using(self.using).filter(
+                        **{"{0}__in".format(related.field.name): pks}).filter(
+                        **condition),
+                    condition,
+                    values,
+                    signal,
+                    user,
+                    )
+
+
+
+def cascade_relations(model):
+    """Return related objects of ``model`` a soft-delete cascades to."""
+    return [
+        related for related
+        in model._meta.get_all_related_objects(include_hidden=True)
+        if related.field.rel.on_delete is models.CASCADE and
+        issubclass(related.model, MTModel)
+        ]
+
+
+
+def _all(qs):
+    """Cascade-clone filter cloning all related objects."""
+    return qs
+
+
+
+def _cascade_dict(cascade):
+    """Return ``clone`` cascade argument as dict of name to filter function."""
+    if cascade is None:
+        return {}
+    try:
+        cascade.iteritems
+    except AttributeError:
+        return dict((i, _all) for i in cascade)
+    return cascade
+
+
+
+def _clone_m2m(field, pairs, filter_func):
+    """
+    Give each clone of (source, clone) ``pairs`` the m2m relations of source.
+
+    Reads the relations of all sources in one query, then replaces those of
+    the clones with them: one bulk insert (and at most one delete, for
+    relations a clone already got on save).
+
+    """
+    through = field.rel.through
+    from_name = field.m2m_field_name()
+    to_name = field.m2m_reverse_field_name()
+    clone_ids = dict((source.pk, clone.pk) for source, clone in pairs)
+
+    # related managers hide deleted objects
+    related = field.rel.to.objects.filter(
+        **{"{0}__in".format(field.related_query_name()): clone_ids.keys()})
+    if filter_func is not _all:
+        related = related.filter(
+            pk__in=[o.pk for o in filter_func(related)])
+    wanted = set(
+        (clone_ids[source_id], to_id) for source_id, to_id
+        in through.objects.filter(
+            **{
+                "{0}__in".format(from_name): clone_ids.keys(),
+                "{0}__in".format(to_name): related,
+                }
+            ).values_list(from_name, to_name)
+        )
+
+    existing = set(
+        through.objects.filter(
+            **{"{0}__in".format(from_name): clone_ids.values()}
+            ).values_list(from_name, to_name)
+        )
+    unwanted = existing.difference(wanted)
+    if unwanted:
+        for clone_id in set(c for c, _ in unwanted):
+            through.objects.filter(
+                **{
+                    from_name: clone_id,
+                    "{0}__in".format(to_name): [
+                        t for c, t in unwanted if c == clone_id],
+                    }
+                ).delete()
+    through.objects.bulk_create(
+        [
+            through(
+                **{
+                    "{0}_id".format(from_name): clone_id,
+                    "{0}_id".format(to_name): to_id,
+                    }
+                )
+            for clone_id, to_id in sorted(wanted.difference(existing))
+            ]
+        )
+    bump_choices_generation(through)
+
+
+
+def _insert_marked(model, clones, after_id):
+    """
+    Bulk-insert ``clones``; return their new ids, in order.
+
+    The rows are inserted with a random negative ``cc_version`` (real ones
+    are never negative), found again by it above ``after_id`` in id order
+    (the order they were inserted in), and then given ``cc_version`` 0.
+
+    """
+    marker = -random.randint(1, 2 ** 31 - 1)
+    for clone in clones:
+        clone.cc_version = marker
+    model.everything.bulk_create(clones)
+    marked = model._base_manager.filter(id__gt=after_id, cc_version=marker)
+    new_ids = list(marked.order_by("id").values_list("id", flat=True))
+    marked.update(cc_version=0)
+    for clone in clones:
+        clone.cc_version = 0
+    return new_ids
+
+
+
+def _insert_keyed(model, clones, after_id, key):
+    """
+    Bulk-insert ``clones``; return their new ids, matched up by ``key``.
+
+    The id of a clone is None if no new row (above ``after_id``) has its
+    values of the ``key`` fields, or if more than one does.
+
+    """
+    attnames = [model._meta.get_field(name).attname for name in key]
+    keys = [tuple(getattr(c, a) for a in attnames) for c in clones]
+    model.everything.bulk_create(clones)
+    rows = model.everything.filter(id__gt=after_id, **dict(
+            ("{0}__in".format(a), set(k[i] for k in keys))
+            for i, a in enumerate(attnames)
+            )).values_list("id", *attnames)
+    found = {}
+    for row in rows:
+        found.setdefault(tuple(row[1:]), []).append(row[0])
+    return [
+        found[k][0] if len(found.get(k, [])) == 1 else None for k in keys]
+
+
+
+def _clone_reverse_fk(related, pairs, filter_func, user):
+    """
+    Clone reverse-FK related objects of sources in (source, clone) ``pairs``.
+
+    The related objects of all sources are read in one query and, unless
+    their model has its own ``clone`` (which is then called for each, in
+    case it does more than copy fields), bulk-cloned with their model's
+    ``clone_cascade``, pointing to the new clones.
+
+    """
+    model = related.model
+    field = related.field
+    clones = dict((source.pk, clone) for source, clone in pairs)
+    objs = filter_func(
+        model.objects.filter(
+            **{"{0}__in".format(field.name): clones.keys()}))
+    if model.clone.__func__ is MTModel.clone.__func__:
+        model._bulk_clone(
+            list(objs),
+            _cascade_dict(model.clone_cascade),
+            lambda obj: {field.name: clones[getattr(obj, field.attname)]},
+            user,
+            )
+    else:
+        for obj in objs:
+            obj.clone(
+                overrides={field.name: clones[getattr(obj, field.attname)]},
+                user=user,
+                )
+
+
+
+def _clone_related_manager(name, source, clone, filter_func):
+    """
+    Cascade-clone relation ``name`` via the related managers of one pair.
+
+    For accessors that aren't m2m or reverse-FK fields themselves, but return
+    a related manager (like ``TeamModel.team``).
+
+    """
+    mgr = getattr(source, name)
+    if mgr.__class__.__name__ != "ManyRelatedManager":
+        raise ValueError(
+            "Cannot cascade-clone '{0}'; "
+            "not a many-to-many or reverse foreignkey.".format(name))
+    clone_mgr = getattr(clone, name)
+    existing = set(clone_mgr.all())
+    new = set(filter_func(mgr.all()))
+    clone_mgr.add(*new.difference(existing))
+    clone_mgr.remove(*existing.difference(new))
 
 
 
@@ -88,6 +456,12 @@ class MTQuerySet(QuerySet):
         return super(MTQuerySet, self).create(*args, **kwargs)
 
 
+    def bulk_create(self, objs, *args, **kwargs):
+        """Insert all of ``objs`` with one (or few) queries."""
+        bump_choices_generation(self.model)
+        return super(MTQuerySet, self).bulk_create(objs, *args, **kwargs)
+
+
     def update(self, *args, **kwargs):
         """
         Update all objects in this queryset with modifications in ``kwargs``.
@@ -98,6 +472,7 @@ class MTQuerySet(QuerySet):
             kwargs["modified_on"] = utcnow()
         # increment the concurrency control version for all updated objects
         kwargs["cc_version"] = models.F("cc_version") + 1
+        bump_choices_generation(self.model)
         return super(MTQuerySet, self).update(*args, **kwargs)
 
 
@@ -107,10 +482,9 @@ class MTQuerySet(QuerySet):
 
         """
         if permanent:
+            bump_choices_generation(self.model)
             return super(MTQuerySet, self).delete()
-        collector = SoftDeleteCollector(using=self.db)
-        collector.collect(self)
-        collector.delete(user)
+        return SoftDeleteCollector(using=self.db).delete(self, user)
 
 
     def undelete(self, user=None):
@@ -118,9 +492,7 @@ class MTQuerySet(QuerySet):
         Undelete all objects in this queryset.
 
         """
-        collector = SoftDeleteCollector(using=self.db)
-        collector.collect(self)
-        collector.undelete(user)
+        return SoftDeleteCollector(using=self.db).undelete(self, user)
 
 
 
@@ -172,6 +544,9 @@ class MTModel(models.Model):
     # for optimistic concurrency control
     cc_version = models.IntegerField(default=0)
 
+    # relations cascade-cloned by default by ``clone`` and ``bulk_clone``
+    clone_cascade = []
+
 
 
     # default manager returns all objects, so admin can see all
@@ -179,10 +554,6 @@ class MTModel(models.Model):
     # ...but "objects", for use in most code, returns only not-deleted
     objects = MTManager(show_deleted=False)
 
-    @classmethod
-    def delete_modelfilter_choices_cache(cls, model):
-        cache_key = 'modelfilter-choices-%s' % (model._meta,)
-        cache.delete(cache_key)
 
     def save(self, *args, **kwargs):
         """
@@ -192,7 +563,7 @@ class MTModel(models.Model):
         out-of-date version is being saved.
 
         """
-        self.delete_modelfilter_choices_cache(self)
+        bump_choices_generation(self.__class__)
 
         if not kwargs.pop("notrack", False):
             user = kwargs.pop("user", None)
@@ -238,16 +609,16 @@ class MTModel(models.Model):
 
         If ``cascade`` is a dictionary, keys are m2m/reverse-FK accessor names,
         and values are a callable that takes the queryset of all related
-        objects and returns those that should be cloned.
+        objects and returns those that should be cloned. If not given, it
+        defaults to the model's ``clone_cascade``.
+
+        The instance itself is saved as usual; its cascade is cloned in bulk
+        (see ``bulk_clone``).
 
         """
         if cascade is None:
-            cascade = {}
-        else:
-            try:
-                cascade.iteritems
-            except AttributeError:
-                cascade = dict((i, lambda qs: qs) for i in cascade)
+            cascade = self.clone_cascade
+        cascade = _cascade_dict(cascade)
 
         if overrides is None:
             overrides = {}
@@ -266,34 +637,124 @@ class MTModel(models.Model):
 
         clone.save(force_insert=True)
 
-        for name, filter_func in cascade.items():
-            mgr = getattr(self, name)
-            if mgr.__class__.__name__ == "ManyRelatedManager":  # M2M
-                clone_mgr = getattr(clone, name)
-                existing = set(clone_mgr.all())
-                new = set(filter_func(mgr.all()))
-                clone_mgr.add(*new.difference(existing))
-                clone_mgr.remove(*existing.difference(new))
-            elif mgr.__class__.__name__ == "RelatedManager":  # reverse FK
-                reverse_name = getattr(self.__class__, name).related.field.name
-                for obj in filter_func(mgr.all()):
-                    obj.clone(overrides={reverse_name: clone})
-            else:
-                raise ValueError(
-                    "Cannot cascade-clone '{0}'; "
-                    "not a many-to-many or reverse foreignkey.".format(name))
+        self._clone_cascade([(self, clone)], cascade, user)
 
         return clone
 
 
+    @classmethod
+    def bulk_clone(cls, objs, cascade=None, overrides=None, user=None,
+                   key=None):
+        """
+        Clone instances ``objs`` of this model; return list of the clones.
+
+        Like calling ``clone`` on each of them (``cascade`` and ``overrides``
+        have the same meaning; ``cascade`` defaults to ``clone_cascade``),
+        but the clones are inserted with a single ``bulk_create``, as are the
+        clones of each relation in the cascade, at every level, with foreign
+        keys remapped to the new parents in memory. So the number of queries
+        depends on the shape of the cascade, not its size.
+
+        ``key``, if given, is a tuple of names of fields whose values (after
+        overrides) identify each clone among all instances of the model; the
+        ids of the clones are then read back by it. Otherwise they are read
+        back by a marker (see ``_bulk_clone``).
+
+        Since clones are bulk-created, their ``save`` method is not called.
+
+        """
+        if cascade is None:
+            cascade = cls.clone_cascade
+        overrides = overrides or {}
+        return cls._bulk_clone(
+            list(objs),
+            _cascade_dict(cascade),
+            lambda obj: overrides,
+            user,
+            key=key,
+            )
+
+
+    @classmethod
+    def _bulk_clone(cls, objs, cascade, get_overrides, user, key=None):
+        """
+        Bulk-clone ``objs``; ``get_overrides`` returns overrides for each.
+
+        Bulk insert doesn't give us the new ids, so they are read back: by
+        ``key`` (see ``bulk_clone``) if given, otherwise by a random negative
+        ``cc_version`` that the clones are inserted with and that is reset
+        right after, so rows inserted concurrently are never mistaken for
+        clones. Raises ``RuntimeError`` if the clones can't all be found.
+
+        """
+        if not objs:
+            return []
+        now = utcnow()
+        clones = []
+        for obj in objs:
+            overrides = dict(get_overrides(obj))
+            overrides["created_on"] = now
+            overrides["created_by"] = user
+            overrides["modified_on"] = now
+            overrides["modified_by"] = user
+            clone = cls()
+            for field in cls._meta.fields:
+                if field.primary_key:
+                    continue
+                if field.name in overrides:
+                    setattr(clone, field.name, overrides[field.name])
+                else:
+                    setattr(clone, field.attname, getattr(obj, field.attname))
+            clones.append(clone)
+
+        after_id = cls.everything.aggregate(
+            id=models.Max("id"))["id"] or 0
+        if key is None:
+            new_ids = _insert_marked(cls, clones, after_id)
+        else:
+            new_ids = _insert_keyed(cls, clones, after_id, key)
+        if len(new_ids) != len(clones) or None in new_ids:
+            raise RuntimeError(
+                "Expected {0} new {1}, found {2}; concurrent clone?".format(
+                    len(clones),
+                    cls._meta.verbose_name_plural,
+                    len([i for i in new_ids if i is not None]),
+                    )
+                )
+        for clone, new_id in zip(clones, new_ids):
+            clone.id = new_id
+
+        cls._clone_cascade(zip(objs, clones), cascade, user)
+
+        return clones
+
+
+    @classmethod
+    def _clone_cascade(cls, pairs, cascade, user):
+        """
+        Cascade-clone relations named in ``cascade`` for (source, clone) pairs.
+
+        """
+        for name, filter_func in cascade.items():
+            descriptor = getattr(cls, name, None)
+            if isinstance(descriptor, ReverseManyRelatedObjectsDescriptor):
+                _clone_m2m(descriptor.field, pairs, filter_func)
+            elif isinstance(descriptor, ForeignRelatedObjectsDescriptor):
+                _clone_reverse_fk(descriptor.related, pairs, filter_func, user)
+            else:
+                for source, clone in pairs:
+                    _clone_related_manager(name, source, clone, filter_func)
+
+
     def delete(self, user=None, permanent=False):
         """
         (Soft) delete this instance, unless permanent=True.
 
         """
         if permanent:
+            bump_choices_generation(self.__class__)
             return super(MTModel, self).delete()
-        self._collector.delete(user)
+        return self._collector.delete([self], user)
 
 
     def undelete(self, user=None):
@@ -301,16 +762,14 @@ class MTModel(models.Model):
         Undelete this instance.
 
         """
-        self._collector.undelete(user)
+        return self._collector.undelete([self], user)
 
 
     @property
     def _collector(self):
-        """Returns populated delete-cascade collector."""
+        """Returns delete-cascade collector."""
         db = router.db_for_write(self.__class__, instance=self)
-        collector = SoftDeleteCollector(using=db)
-        collector.collect([self])
-        return collector
+        return SoftDeleteCollector(using=db)
 
 
     class Meta:
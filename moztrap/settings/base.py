@@ -219,6 +219,15 @@ FORBIDDEN_PASSWORDS = [
 
 ALLOW_ANONYMOUS_ACCESS = False
 
+# Results lists over tables of at least this many rows (by the database's own
+# estimate) show an approximate total instead of counting, when unfiltered.
+# Set to None to always count.
+LIST_TOTAL_ESTIMATE_THRESHOLD = 100000
+
+# The most environments a profile generated from a selection of elements (one
+# environment per combination of one element from each category) may have.
+MAX_PROFILE_ENVIRONMENTS = 10000
+
 INSTALLED_APPS += ["icanhaz"]
 ICANHAZ_DIRS = [join(BASE_PATH, "jstemplates")]
 
@@ -17,7 +17,8 @@ class ProductFilterSet(filters.FilterSet):
         filters.ModelFilter(
             "creator",
             lookup="created_by",
-            queryset=model.User.objects.all().order_by("username")),
+            queryset=model.User.objects.all().order_by("username"),
+            search="username"),
         ]
 
 
@@ -34,7 +35,8 @@ class ProductVersionFilterSet(filters.FilterSet):
         filters.ModelFilter(
             "creator",
             lookup="created_by",
-            queryset=model.User.objects.all().order_by("username")),
+            queryset=model.User.objects.all().order_by("username"),
+            search="username"),
         filters.ModelFilter(
             "environment element",
             lookup="environments__elements",
@@ -56,7 +58,8 @@ class RunFilterSet(filters.FilterSet):
         filters.ModelFilter(
             "productversion",
             queryset=model.ProductVersion.objects.all().order_by(
-                "product__name", "version").select_related()),
+                "product__name", "version").select_related(),
+            search=("product__name", "version")),
         filters.KeywordFilter("name"),
         filters.KeywordFilter("description"),
         filters.ModelFilter(
@@ -70,6 +73,7 @@ class RunFilterSet(filters.FilterSet):
             "creator",
             lookup="created_by",
             queryset=model.User.objects.all().order_by("username"),
+            search="username",
             ),
         filters.ModelFilter(
             "environment element",
@@ -87,7 +91,8 @@ class RunFilterSet(filters.FilterSet):
         filters.ModelFilter(
             "members of series",
             lookup="series",
-            queryset=model.Run.objects.filter(is_series=True).order_by("name")
+            queryset=model.Run.objects.filter(is_series=True).order_by("name"),
+            search="name"
             ),
         filters.KeywordExactFilter("build"),
         ]
@@ -104,8 +109,7 @@ class RunCaseVersionFilterSet(filters.FilterSet):
         filters.ChoicesFilter(
             "result status",
             key="resultstatus",
-            lookup="results__status",
-            extra_filters={"results__is_latest": True},
+            lookup="current_statuses__status",
             choices=sorted(Choices(*model.Result.COMPLETED_STATES)),
             ),
         filters.KeywordExactFilter(
@@ -122,6 +126,7 @@ class RunCaseVersionFilterSet(filters.FilterSet):
             "tag",
             lookup="caseversion__tags",
             queryset=model.Tag.objects.all().order_by("name"),
+            search="name",
             switchable=True
             ),
         filters.ModelFilter(
@@ -132,13 +137,15 @@ class RunCaseVersionFilterSet(filters.FilterSet):
         filters.ModelFilter(
             "run",
             queryset=model.Run.objects.all().order_by("name"),
+            search="name",
             ),
         filters.ModelFilter(
             "product version",
             lookup="run__productversion",
             key="productversion",
             queryset=model.ProductVersion.objects.all().order_by(
-                "product__name", "version")),
+                "product__name", "version"),
+            search=("product__name", "version")),
         filters.KeywordFilter(
             "instruction", lookup="caseversion__steps__instruction"),
         filters.KeywordFilter(
@@ -148,7 +155,8 @@ class RunCaseVersionFilterSet(filters.FilterSet):
         filters.ModelFilter(
             "creator",
             lookup="caseversion__created_by",
-            queryset=model.User.objects.all().order_by("username")),
+            queryset=model.User.objects.all().order_by("username"),
+            search="username"),
         filters.ModelFilter(
             "environment element",
             lookup="environments__elements",
@@ -164,6 +172,7 @@ class RunCaseVersionFilterSet(filters.FilterSet):
             "tester",
             lookup="results__tester",
             queryset=model.User.objects.all().order_by("username"),
+            search="username",
             ),
         ]
 
@@ -186,6 +195,7 @@ class RunTestsRunCaseVersionFilterSet(filters.FilterSet):
             "tag",
             lookup="caseversion__tags",
             queryset=model.Tag.objects.all().order_by("name"),
+            search="name",
             switchable=True),
         filters.KeywordFilter(
             "instruction", lookup="caseversion__steps__instruction"),
@@ -196,7 +206,8 @@ class RunTestsRunCaseVersionFilterSet(filters.FilterSet):
         filters.ModelFilter(
             "creator",
             lookup="caseversion__created_by",
-            queryset=model.User.objects.all().order_by("username")),
+            queryset=model.User.objects.all().order_by("username"),
+            search="username"),
         filters.ModelFilter(
             "suite",
             lookup="caseversion__case__suites",
@@ -213,6 +224,7 @@ class ResultFilterSet(filters.FilterSet):
         filters.ModelFilter(
             "tester",
             queryset=model.User.objects.all().order_by("username"),
+            search="username",
             ),
         filters.KeywordFilter("comment"),
         filters.ModelFilter(
@@ -239,11 +251,13 @@ class SuiteFilterSet(filters.FilterSet):
             key="productversion",
             queryset=model.ProductVersion.objects.all().order_by(
                 "product__name", "version"),
+            search=("product__name", "version"),
             ),
         filters.ModelFilter(
             "run",
             lookup="runs",
             queryset=model.Run.objects.all().order_by("name"),
+            search="name",
             switchable=True
             ),
         filters.KeywordFilter("name"),
@@ -253,7 +267,8 @@ class SuiteFilterSet(filters.FilterSet):
         filters.ModelFilter(
             "creator",
             lookup="created_by",
-            queryset=model.User.objects.all().order_by("username")),
+            queryset=model.User.objects.all().order_by("username"),
+            search="username"),
         ]
 
 
@@ -279,6 +294,7 @@ class CaseVersionFilterSet(filters.FilterSet):
             "tag",
             lookup="tags",
             queryset=model.Tag.objects.all().order_by("name"),
+            search="name",
             switchable=True
             ),
         filters.ModelFilter(
@@ -290,7 +306,8 @@ class CaseVersionFilterSet(filters.FilterSet):
             lookup="productversion",
             key="productversion",
             queryset=model.ProductVersion.objects.all().order_by(
-                "product__name", "version").select_related()),
+                "product__name", "version").select_related(),
+            search=("product__name", "version")),
         filters.KeywordFilter("instruction", lookup="steps__instruction"),
         filters.KeywordFilter(
             "expected result",
@@ -299,7 +316,8 @@ class CaseVersionFilterSet(filters.FilterSet):
         filters.ModelFilter(
             "creator",
             lookup="created_by",
-            queryset=model.User.objects.all().order_by("username")),
+            queryset=model.User.objects.all().order_by("username"),
+            search="username"),
         filters.ModelFilter(
             "environment element",
             lookup="environments__elements",
@@ -330,11 +348,13 @@ class TagFilterSet(filters.FilterSet):
             queryset=model.ProductVersion.objects.select_related(
                 "product").order_by(
                     "product__name", "version"),
+            search=("product__name", "version"),
             ),
         filters.ModelFilter(
             "creator",
             lookup="created_by",
             queryset=model.User.objects.all().order_by("username"),
+            search="username",
             ),
         ]
 
@@ -353,6 +373,7 @@ class ProfileFilterSet(filters.FilterSet):
             "creator",
             lookup="created_by",
             queryset=model.User.objects.all().order_by("username"),
+            search="username",
             ),
         ]
 
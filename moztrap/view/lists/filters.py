@@ -5,6 +5,7 @@ Utilities for filtering querysets in a view.
 
 from collections import namedtuple
 from functools import wraps
+import hashlib
 import json
 import urlparse
 import operator
@@ -14,6 +15,8 @@ from django.utils.datastructures import MultiValueDict
 from django.db.models import Q
 from django.core.cache import cache
 
+from ...model.mtmodel import choices_generation, track_choices
+
 
 
 def filter_url(path_or_view, obj):
@@ -429,39 +432,124 @@ class ModelFilter(BaseChoicesFilter):
     alternative ``coerce`` function should be provided at instantiation.
 
     """
+    # number of options returned per page of ``search``
+    search_page_size = 20
 
 
     def __init__(self, *args, **kwargs):
         """
-        Looks for ``queryset`` and ``label`` keyword arguments.
+        Looks for ``queryset``, ``label`` and ``search`` keyword arguments.
 
         ``queryset`` should contain the model instances that are the options
         available for this filter; ``label`` is an optional one-argument
         callable that returns the display label for each object, given the
         object.
 
+        ``search``, if given, is the name of a (preferably indexed) field of
+        the model, or a tuple of them whose values, separated by spaces, make
+        up the label; the filter is then in search mode, for option sets too
+        large to list in full: only the selected options are displayed, and
+        others are found by prefix-matching those fields (see ``search``).
+
         """
         self.queryset = kwargs.pop("queryset")
         self.label_func = kwargs.pop("label", lambda o: unicode(o))
+        self.search_field = kwargs.pop("search", None)
         self._opts = None
+        self._cache_key = None
         kwargs.setdefault("coerce", int)
         super(ModelFilter, self).__init__(*args, **kwargs)
+        if self.search_field is not None:
+            self.cls = "search"
+        track_choices(self.queryset.model)
 
 
     def options(self, values):
         """Given list of selected values, return options to display."""
+        if self.search_field is not None:
+            return self._selected(values)
         return self._opts
 
 
+    def values(self, data):
+        """Given data dict, return list of selected values."""
+        if self.search_field is None:
+            return super(ModelFilter, self).values(data)
+        values = [
+            v for v in super(BaseChoicesFilter, self).values(data)
+            if v is not None
+            ]
+        valid = set(k for k, v in self._selected(values))
+        return [v for v in values if v in valid]
+
+
+    def _selected(self, values):
+        """
+        Return (value, label) tuples of the options among ``values``.
+
+        Cached like the choices of a filter not in search mode.
+
+        """
+        if not values:
+            return []
+        model = self.queryset.model
+        cache_key = "{0}-{1}-selected-{2}".format(
+            self.cache_key,
+            choices_generation(model),
+            hashlib.md5(
+                ",".join(str(v) for v in sorted(set(values)))).hexdigest(),
+            )
+        opts = cache.get(cache_key)
+        if opts is None:
+            opts = [
+                (obj.pk, self.label_func(obj))
+                for obj in self.queryset.filter(pk__in=values)
+                ]
+            cache.set(cache_key, opts, 60 * 60)
+        return opts
+
+
+    def search(self, text, page=1):
+        """
+        Return (options, more) for options whose search field starts with text.
+
+        ``options`` is a list of (value, label) tuples, the given ``page`` of
+        those matching, in order of the search field (case-insensitively
+        prefix-matched, so an index on it can be used); ``more`` is True if
+        there are further pages.
+
+        """
+        size = self.search_page_size
+        start = (max(page, 1) - 1) * size
+        fields = self.search_field
+        if not isinstance(fields, tuple):
+            fields = (fields,)
+        matches = reduce(
+            operator.or_,
+            [Q(**{"{0}__istartswith".format(f): text}) for f in fields[1:]],
+            _label_prefix_q(fields, text),
+            )
+        objs = list(
+            self.queryset.filter(matches).order_by(
+                *(fields + ("pk",)))[start:start + size + 1]
+            )
+        return (
+            [(obj.pk, self.label_func(obj)) for obj in objs[:size]],
+            len(objs) > size,
+            )
+
+
     def get_choices(self):
         """Get the options for this filter."""
         # always clone to get new data; filter instances are persistent
 
         # Because these options rarely change we can confidently cache
-        # them as lists of tuples.
-        # This cache key gets invalidated on the various signals set
-        # up in moztrap.model.__init__.
-        cache_key = 'modelfilter-choices-%s' % (self.queryset.model._meta,)
+        # them as lists of tuples, keyed by the model's choices generation
+        # (see moztrap.model.mtmodel.choices_generation), which any change to
+        # its instances moves on from.
+        model = self.queryset.model
+        cache_key = "{0}-{1}".format(
+            self.cache_key, choices_generation(model))
         opts = cache.get(cache_key)
         if opts is None:
             opts = [
@@ -472,6 +560,46 @@ class ModelFilter(BaseChoicesFilter):
         return self._opts
 
 
+    @property
+    def cache_key(self):
+        """
+        Cache key prefix for this filter's choices.
+
+        Distinct for filters of the same model with different querysets (e.g.
+        only series runs, or differently ordered).
+
+        """
+        if self._cache_key is None:
+            self._cache_key = "modelfilter-choices-{0}-{1}-{2}".format(
+                self.queryset.model._meta,
+                self.key,
+                hashlib.md5(
+                    unicode(self.queryset.query).encode("utf-8")).hexdigest(),
+                )
+        return self._cache_key
+
+
+
+def _label_prefix_q(fields, text):
+    """
+    Return Q matching objects whose ``fields``, space-separated, start with text.
+
+    The text is split at each space into a value of the first field (matched
+    exactly, as a later field follows it) and the start of the rest.
+
+    """
+    first, rest = fields[0], fields[1:]
+    q = Q(**{"{0}__istartswith".format(first): text})
+    if rest:
+        for i, char in enumerate(text):
+            if char == " ":
+                q |= (
+                    Q(**{"{0}__iexact".format(first): text[:i]}) &
+                    _label_prefix_q(rest, text[i + 1:])
+                    )
+    return q
+
+
 
 class KeywordExactFilter(Filter):
     """Allows user to input arbitrary filter values; no pre-set options list."""
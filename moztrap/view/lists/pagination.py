@@ -2,9 +2,21 @@
 List pagination utilities.
 
 """
+import base64
+import hashlib
+import json
 import math
+import re
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Q, get_models
+from django.db.models.fields import FieldDoesNotExist
 from django.db.utils import DatabaseError
 from django.core.exceptions import SuspiciousOperation
+
+from ...model.mtmodel import choices_generation, choices_models
 from ..utils.querystring import update_querystring
 
 
@@ -12,6 +24,14 @@ from ..utils.querystring import update_querystring
 PAGESIZES = [10, 20, 50, 100]
 DEFAULT_PAGESIZE = 20
 
+# querystring keys for the keyset cursors of KeysetPager
+AFTER_PARAM = "pageafter"
+BEFORE_PARAM = "pagebefore"
+
+# seconds to cache list totals; changes to any (choices-tracked) model the
+# list query touches start new cache keys right away
+TOTAL_CACHE_TIMEOUT = 60
+
 
 
 def from_request(request):
@@ -40,6 +60,27 @@ def from_request(request):
 
 
 
+def cursors_from_request(request):
+    """
+    Given a request, return tuple (after, before) of keyset page cursors.
+
+    Either or both may be None.
+
+    """
+    return (
+        request.GET.get(AFTER_PARAM) or None,
+        request.GET.get(BEFORE_PARAM) or None,
+        )
+
+
+
+def cursor_url(url, after=None, before=None):
+    """Return ``url`` with keyset page cursors replaced."""
+    return update_querystring(
+        url, **{AFTER_PARAM: after, BEFORE_PARAM: before})
+
+
+
 def pagesize_url(url, pagesize):
     return update_querystring(url, pagesize=pagesize, pagenumber=1)
 
@@ -50,13 +91,121 @@ def pagenumber_url(url, pagenumber):
 
 
 
+def list_total(queryset, estimate=False):
+    """
+    Return tuple (total, estimated) for ``queryset``.
+
+    The exact count is cached briefly (see ``cached_count``). With
+    ``estimate``, an unfiltered queryset (see ``is_unfiltered``) over a table
+    the query planner reckons has at least
+    ``settings.LIST_TOTAL_ESTIMATE_THRESHOLD`` rows isn't counted at all; the
+    planner's estimate is returned instead, with ``estimated`` True.
+
+    """
+    threshold = getattr(settings, "LIST_TOTAL_ESTIMATE_THRESHOLD", None)
+    if estimate and threshold and is_unfiltered(queryset):
+        guess = estimated_count(queryset)
+        if guess is not None and guess >= threshold:
+            return guess, True
+    return cached_count(queryset), False
+
+
+
+def cached_count(queryset):
+    """
+    Return ``queryset.count()``, cached for ``TOTAL_CACHE_TIMEOUT`` seconds.
+
+    The cache key covers the queryset's SQL (thus all its filters, including
+    any restricting it to what the requesting user may see, but not its
+    ordering) and the current choices generation of every tracked model
+    whose table the query touches, so saving, updating or deleting any of
+    those is seen immediately.
+
+    """
+    query = queryset.order_by().values("pk").query
+    sql = unicode(query)
+    models = _table_models()
+    generations = [
+        choices_generation(models[join.table_name])
+        for alias, join in sorted(query.alias_map.items())
+        if models.get(join.table_name) in choices_models
+        ]
+    cache_key = "list-total-{0}-{1}-{2}".format(
+        queryset.model._meta,
+        hashlib.md5(sql.encode("utf-8")).hexdigest(),
+        "-".join(str(g) for g in generations),
+        )
+    total = cache.get(cache_key)
+    if total is None:
+        # @@@ Django 1.5 should not require the .values part and could be
+        # changed to just:
+        #     total = queryset.count()
+        # Bug 18248
+        try:
+            total = queryset.count()
+        except DatabaseError:
+            total = queryset.values("id").count()
+        cache.set(cache_key, total, TOTAL_CACHE_TIMEOUT)
+    return total
+
+
+
+def is_unfiltered(queryset):
+    """True if ``queryset`` has no conditions beyond ``objects.all()``'s."""
+    base = queryset.model.objects.all()
+    return unicode(queryset.order_by().values("pk").query) == unicode(
+        base.order_by().values("pk").query)
+
+
+
+def estimated_count(queryset):
+    """
+    Return the query planner's estimate of rows in ``queryset``, or None.
+
+    Only MySQL and PostgreSQL ``EXPLAIN`` output is understood.
+
+    """
+    connection = connections[queryset.db]
+    sql, params = queryset.order_by().values("pk").query.sql_with_params()
+    cursor = connection.cursor()
+    try:
+        cursor.execute("EXPLAIN " + sql, params)
+        rows = cursor.fetchall()
+        columns = [c[0] for c in cursor.description]
+    except DatabaseError:
+        return None
+    if not rows:
+        return None
+    if connection.vendor == "mysql" and "rows" in columns:
+        return rows[0][columns.index("rows")]
+    if connection.vendor == "postgresql":
+        match = re.search(r"rows=(\d+)", rows[0][0])
+        if match:
+            return int(match.group(1))
+    return None
+
+
+
+def _table_models():
+    """Return dictionary mapping database table names to model classes."""
+    return dict(
+        (m._meta.db_table, m) for m in get_models(include_auto_created=True))
+
+
+
 class Pager(object):
     """Handles pagination given queryset, page size, and page number."""
-    def __init__(self, queryset, pagesize, pagenumber):
-        """Initialize a ``Pager`` with queryset, page size, and page number."""
+    def __init__(self, queryset, pagesize, pagenumber, total=None):
+        """
+        Initialize a ``Pager`` with queryset, page size, and page number.
+
+        If ``total`` is given (e.g. a cached count), the queryset isn't
+        counted.
+
+        """
         self._queryset = queryset
         self._sliced_qs = None
-        self._cached_total = None
+        self._cached_total = total
         self.pagesize = pagesize
         self.pagenumber = pagenumber
 
@@ -130,7 +279,7 @@ class Pager(object):
         """
         if self._sliced_qs is None:
             if not self.high:
-                self._sliced_qs = self._queryset.empty()
+                self._sliced_qs = self._queryset.none()
             else:
                 self._sliced_qs = self._queryset[self.low - 1:self.high]
         return self._sliced_qs
@@ -178,6 +327,273 @@ class Pager(object):
 
 
 
+class KeysetPager(object):
+    """
+    Paginates a sorted queryset by its sort key rather than by page number.
+
+    Instead of slicing at an offset (which the database has to count its way
+    to), each page is fetched with a condition on the sort key of the row
+    just before (``after``) or just after (``before``) it, given as opaque
+    cursor strings. Only prev/next navigation is possible, and no count of
+    the queryset is needed; a ``total`` (e.g. a cached or estimated one) can
+    be given for display, with ``estimated`` set if it isn't exact.
+
+    The queryset's ordering (as set by the ``sort`` decorator, or else the
+    model's default ordering) must be on fields reachable through forward
+    relations only; the primary key is always added as a final tie-breaker.
+
+    """
+    keyset = True
+
+
+    def __init__(self, queryset, pagesize,
+                 after=None, before=None, total=None, estimated=False):
+        """Initialize with queryset, page size, and optional cursors/total."""
+        self._queryset = queryset
+        self._page = None
+        self.pagesize = pagesize
+        self.total = total
+        self.estimated = estimated
+
+        self.order_by = sort_keys(queryset)
+        self.fields = [t.lstrip("-") for t in self.order_by]
+        self.after = self._decode(after) if after else None
+        self.before = self._decode(before) if before else None
+        if self.after is not None:
+            self.before = None
+
+
+    def sizes(self):
+        """
+        Returns an ordered list of pagesize links to display.
+
+        Includes all default page sizes, plus the current page size.
+
+        """
+        return sorted(set(PAGESIZES + [self.pagesize]))
+
+
+    @property
+    def objects(self):
+        """The list of objects on the current page."""
+        return self._fetch()["objects"]
+
+
+    @property
+    def count(self):
+        """The number of objects on the current page."""
+        return len(self.objects)
+
+
+    @property
+    def prev(self):
+        """Cursor for the previous page; None if no previous page."""
+        return self._fetch()["prev"]
+
+
+    @property
+    def next(self):
+        """Cursor for the next page; None if there is no next page."""
+        return self._fetch()["next"]
+
+
+    @property
+    def first(self):
+        """True if this is known to be the first page."""
+        return self.after is None and self.before is None
+
+
+    def _fetch(self):
+        """Fetch (and cache) the current page and its neighbor cursors."""
+        if self._page is not None:
+            return self._page
+
+        qs = self._queryset
+        order_by = self.order_by
+        backwards = self.before is not None
+        if backwards:
+            order_by = [reverse_term(t) for t in order_by]
+            qs = self._seek(qs, order_by, self.before)
+        elif self.after is not None:
+            qs = self._seek(qs, order_by, self.after)
+
+        objects = list(qs.order_by(*order_by)[:self.pagesize + 1])
+        more = len(objects) > self.pagesize
+        objects = objects[:self.pagesize]
+        if backwards:
+            objects.reverse()
+
+        if backwards:
+            has_prev, has_next = more, True
+        else:
+            has_prev, has_next = self.after is not None, more
+
+        self._page = {"objects": objects, "prev": None, "next": None}
+        if objects and (has_prev or has_next):
+            first, last = objects[0].pk, objects[-1].pk
+            keys = self._keys([first, last])
+            if has_prev:
+                self._page["prev"] = keys.get(first)
+            if has_next:
+                self._page["next"] = keys.get(last)
+        return self._page
+
+
+    def _keys(self, pks):
+        """Return dict mapping given ``pks`` to encoded cursors."""
+        if not pks:
+            return {}
+        rows = self._queryset.filter(pk__in=pks).values_list(
+            "pk", *self.fields)
+        return dict((row[0], self._encode(row[1:])) for row in rows)
+
+
+    def _seek(self, qs, order_by, values):
+        """Filter ``qs`` to rows past sort key ``values`` in ``order_by``."""
+        cond = None
+        equal = Q()
+        for term, value in zip(order_by, values):
+            field = term.lstrip("-")
+            past = seek_condition(field, value, term.startswith("-"))
+            if past is not None:
+                cond = (cond | (equal & past)) if cond else (equal & past)
+            if value is None:
+                equal &= Q(**{"{0}__isnull".format(field): True})
+            else:
+                equal &= Q(**{field: value})
+        if cond is None:
+            return qs.none()
+        return qs.filter(cond)
+
+
+    def _encode(self, values):
+        """Encode sort key ``values`` as a cursor string."""
+        data = json.dumps([self.order_by, list(values)], default=unicode)
+        return base64.urlsafe_b64encode(data).rstrip("=")
+
+
+    def _decode(self, cursor):
+        """
+        Decode cursor string to a list of sort key values.
+
+        Returns None for a malformed cursor, or one from a different sort.
+
+        """
+        try:
+            cursor = str(cursor)
+            order_by, values = json.loads(
+                base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        except (TypeError, ValueError, UnicodeError):
+            return None
+        if order_by != self.order_by or len(values) != len(order_by):
+            return None
+        return values
+
+
+
+def seek_condition(field, value, descending):
+    """
+    Return Q for rows strictly past ``value`` of ``field`` in sort order.
+
+    Follows MySQL's (and SQLite's) placement of NULLs: first in ascending
+    order, last in descending order. Returns None if nothing can be past.
+
+    """
+    if descending:
+        if value is None:
+            return None
+        return (Q(**{"{0}__lt".format(field): value}) |
+                Q(**{"{0}__isnull".format(field): True}))
+    if value is None:
+        return Q(**{"{0}__isnull".format(field): False})
+    return Q(**{"{0}__gt".format(field): value})
+
+
+
+def reverse_term(term):
+    """Return the given ``order_by`` term with its direction reversed."""
+    return term[1:] if term.startswith("-") else "-" + term
+
+
+
+def sort_keys(queryset):
+    """
+    Return list of the concrete ``order_by`` terms ``queryset`` sorts by.
+
+    Ordering on a relation is expanded to the related model's default
+    ordering (or its primary key) as the database would see it, and the
+    primary key is added as final tie-breaker if not already there. Raises
+    ``ValueError`` for orderings a keyset can't be built on (random, extra
+    select or multi-valued relations).
+
+    """
+    query = queryset.query
+    model = queryset.model
+    if query.order_by:
+        terms = list(query.order_by)
+    elif query.default_ordering:
+        terms = list(model._meta.ordering)
+    else:
+        terms = []
+
+    keys = []
+    for term in terms:
+        keys.extend(_expand_term(model, term))
+    if not keys or keys[-1].lstrip("-") != "pk":
+        keys.append("-pk" if keys and keys[-1].startswith("-") else "pk")
+    return keys
+
+
+
+def _expand_term(model, term, seen=None):
+    """Expand one ``order_by`` term on ``model`` into concrete field terms."""
+    if not isinstance(term, basestring) or "?" in term or "." in term:
+        raise ValueError("Can't paginate by key on {0!r}.".format(term))
+    descending = term.startswith("-")
+    path = term.lstrip("-")
+
+    field = None
+    current = model
+    for name in path.split("__"):
+        if field is not None:
+            if field.rel is None:
+                raise ValueError(
+                    "Can't paginate by key on {0!r}.".format(term))
+            current = field.rel.to
+        if name == "pk":
+            field = current._meta.pk
+            continue
+        try:
+            field, _, direct, m2m = current._meta.get_field_by_name(name)
+        except FieldDoesNotExist:
+            raise ValueError("Can't paginate by key on {0!r}.".format(term))
+        if not direct or m2m:
+            raise ValueError(
+                "Can't paginate by key on multi-valued {0!r}.".format(term))
+    if field.rel is None:
+        return [term]
+
+    seen = (seen or set()) | set([path])
+    related = field.rel.to._meta.ordering
+    if not related:
+        return ["{0}{1}__pk".format("-" if descending else "", path)]
+    keys = []
+    for rterm in related:
+        rdesc = rterm.startswith("-")
+        rpath = "{0}__{1}".format(path, rterm.lstrip("-"))
+        if rpath in seen:
+            continue
+        keys.extend(
+            _expand_term(
+                model,
+                ("-" if rdesc != descending else "") + rpath,
+                seen,
+                )
+            )
+    return keys
+
+
+
 def positive_integer(val, default):
     """Attempt to coerce ``val`` to a positive integer, with fallback."""
     try:
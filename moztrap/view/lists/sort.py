@@ -7,6 +7,7 @@ from functools import wraps
 from django.core.exceptions import FieldError
 
 from ..utils.querystring import update_querystring
+from .pagination import AFTER_PARAM, BEFORE_PARAM
 
 
 
@@ -67,8 +68,13 @@ class Sort(object):
         direction = DEFAULT
         if field == self.field:
             direction = DIRECTIONS.difference([self.direction]).pop()
+        # keyset page cursors belong to the old sort; start from the top
         return update_querystring(
-            self.url_path, sortfield=field, sortdirection=direction)
+            self.url_path,
+            sortfield=field,
+            sortdirection=direction,
+            **{AFTER_PARAM: None, BEFORE_PARAM: None}
+            )
 
 
     def dir(self, field):
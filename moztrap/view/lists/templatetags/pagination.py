@@ -5,7 +5,7 @@ Template tags for pagination.
 from django.template import Library
 
 from classytags.core import Tag, Options
-from classytags.arguments import Argument
+from classytags.arguments import Argument, Flag
 
 from .. import pagination
 
@@ -16,20 +16,52 @@ register = Library()
 
 
 class Paginate(Tag):
-    """Paginate the given queryset, placing a Pager in the template context."""
+    """
+    Paginate the given queryset, placing a Pager in the template context.
+
+    With the trailing ``keyset`` flag, places a ``KeysetPager`` instead,
+    which pages by sort key cursors in the querystring; its total may be
+    estimated for large unfiltered lists. If the queryset's ordering can't
+    be paged by key, falls back to a ``Pager``.
+
+    Totals are cached briefly either way (see ``pagination.list_total``).
+
+    """
     name = "paginate"
     options = Options(
         Argument("queryset"),
         "as",
         Argument("varname", resolve=False),
+        Flag("keyset", true_values=["keyset"], default=False),
         )
 
 
-    def render_tag(self, context, queryset, varname):
+    def render_tag(self, context, queryset, varname, keyset):
         """Place Pager for given ``queryset`` in context as ``varname``."""
         request = context["request"]
         pagesize, pagenum = pagination.from_request(request)
-        context[varname] = pagination.Pager(queryset, pagesize, pagenum)
+        if keyset:
+            try:
+                pagination.sort_keys(queryset)
+            except ValueError:
+                # the sort field comes from the querystring, and may be one
+                # no keyset can be built on (a multi-valued relation, say)
+                keyset = False
+        if keyset:
+            after, before = pagination.cursors_from_request(request)
+            total, estimated = pagination.list_total(queryset, estimate=True)
+            context[varname] = pagination.KeysetPager(
+                queryset,
+                pagesize,
+                after=after,
+                before=before,
+                total=total,
+                estimated=estimated,
+                )
+        else:
+            total, _ = pagination.list_total(queryset)
+            context[varname] = pagination.Pager(
+                queryset, pagesize, pagenum, total=total)
         return u""
 
 
@@ -44,6 +76,27 @@ def pagenumber_url(request, pagenumber):
 
 
 
+@register.filter
+def pageafter_url(request, cursor):
+    """Return current full URL with keyset cursor set to after ``cursor``."""
+    return pagination.cursor_url(request.get_full_path(), after=cursor)
+
+
+
+@register.filter
+def pagebefore_url(request, cursor):
+    """Return current full URL with keyset cursor set to before ``cursor``."""
+    return pagination.cursor_url(request.get_full_path(), before=cursor)
+
+
+
+@register.filter
+def pagefirst_url(request):
+    """Return current full URL with keyset cursors removed."""
+    return pagination.cursor_url(request.get_full_path())
+
+
+
 @register.filter
 def pagesize_url(request, pagesize):
     """Return current full URL with pagesize replaced."""
@@ -322,7 +322,6 @@ class AddBulkCaseForm(BaseAddCaseForm, BaseCaseForm):
 
             version_kwargs["case"] = case
             version_kwargs["status"] = self.cleaned_data["status"]
-            version_kwargs["user"] = self.user
 
             if suite:
                 order += 1
@@ -336,8 +335,10 @@ class AddBulkCaseForm(BaseAddCaseForm, BaseCaseForm):
             for productversion in productversions:
                 this_version_kwargs = version_kwargs.copy()
                 this_version_kwargs["productversion"] = productversion
-                caseversion = model.CaseVersion.objects.create(
-                    **this_version_kwargs)
+                caseversion = model.CaseVersion(**this_version_kwargs)
+                # all versions of a new case get the same name; no need to
+                # sync it to the others as each is saved.
+                caseversion.save(user=self.user, skip_sync_name=True)
                 for i, step_kwargs in enumerate(steps_data, 1):
                     model.CaseStep.objects.create(
                         user=self.user,
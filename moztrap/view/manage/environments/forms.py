@@ -2,6 +2,8 @@
 Manage forms for environments.
 
 """
+from django.conf import settings
+
 import floppyforms.__future__ as forms
 
 from .... import model
@@ -64,12 +66,28 @@ class AddProfileForm(ProfileForm):
         error_messages={"required": "Please select at least one element."})
 
 
+    def clean_elements(self):
+        """Elements must not combine into too many environments."""
+        elements = self.cleaned_data["elements"]
+        count = model.Profile.count_combinations(*elements)
+        if count > settings.MAX_PROFILE_ENVIRONMENTS:
+            raise forms.ValidationError(
+                "These elements would generate {0} environments; "
+                "the maximum is {1}.".format(
+                    count, settings.MAX_PROFILE_ENVIRONMENTS)
+                )
+        return elements
+
+
     def save(self, user=None):
         """Create and return the new profile."""
         return model.Profile.generate(
             self.cleaned_data["name"],
             *self.cleaned_data["elements"],
-            **{"user": user or self.user}
+            **{
+                "user": user or self.user,
+                "max_environments": settings.MAX_PROFILE_ENVIRONMENTS,
+                }
             )
 
 
@@ -57,10 +57,9 @@ class EditProductVersionForm(BaseProductVersionForm):
 
         fill_from = self.cleaned_data.get("fill_from")
         if fill_from:
-            # get the cases we already have in this version
-            existing = pv.caseversions.all().values_list("case_id", flat=True)
-            for cv in fill_from.caseversions.exclude(case_id__in=existing):
-                cv.clone(overrides={"productversion": pv, "name": cv.name})
+            # only clones the cases we don't already have in this version
+            model.CaseVersion.clone_forward(
+                fill_from, pv, user=user or self.user)
 
         return pv
 
@@ -91,7 +90,7 @@ class AddProductVersionForm(BaseProductVersionForm):
         clone_from = self.cleaned_data.get("clone_from")
         if clone_from:
             pv.environments.add(*clone_from.environments.all())
-            for cv in clone_from.caseversions.all():
-                cv.clone(overrides={"productversion": pv, "name": cv.name})
+            model.CaseVersion.clone_forward(
+                clone_from, pv, user=user or self.user)
 
         return pv
@@ -13,64 +13,39 @@ from ... import model
 class EnvironmentSelectionForm(forms.Form):
     """Form for selecting an environment."""
     def __init__(self, *args, **kwargs):
-        """Accepts ``environments`` queryset and ``current`` env id."""
+        """
+        Accepts ``environments`` queryset and ``current`` env id.
+
+        Rather than ``environments``, can be given the ``matrix``
+        (``model.EnvironmentMatrix``) of the environments, such as the cached
+        ``environment_matrix`` of a run.
+
+        """
         environments = kwargs.pop("environments", [])
+        matrix = kwargs.pop("matrix", None)
         current = kwargs.pop("current", None)
 
         super(EnvironmentSelectionForm, self).__init__(*args, **kwargs)
 
-        # list of categories, ordered by name
-        self.categories = []
-
-        # maps category to set of elements
-        self.elements_by_category = {}
-
-        # maps environment ID to list of element IDs, ordered by category
-        self.elementids_by_envid = {}
-
-        # elements in current environment
-        current_elements = []
-
-        env_element_through_model = model.Environment.elements.through
-        env_element_relationships = env_element_through_model.objects.filter(
-            environment__in=environments).select_related()
-
-        # first construct the ordered list of categories (and current elements)
-        cat_set = set()
-        for ee in env_element_relationships:
-            cat_set.add(ee.element.category)
-            if ee.environment.id == current:
-                current_elements.append(ee.element)
-        self.categories = sorted(cat_set, key=lambda c: c.name)
-
-        num_categories = len(self.categories)
-
-        # populate elements by category and environment
-        for ee in env_element_relationships:
-            byenv = self.elementids_by_envid.setdefault(
-                ee.environment.id, [None] * num_categories)
-            category_index = self.categories.index(ee.element.category)
-            byenv[category_index] = ee.element.id
-
-            bycat = self.elements_by_category.setdefault(
-                ee.element.category, set())
-            bycat.add(ee.element)
+        if matrix is None:
+            matrix = model.EnvironmentMatrix.build(environments)
+        self.matrix = matrix
 
         # construct choice-field for each env type
-        for category in self.categories:
-            self.fields["category_{0}".format(category.id)] = forms.ChoiceField(
-                choices=[("", "---------")] + [
-                    (e.id, e.name) for e in sorted(
-                        self.elements_by_category[category],
-                        key=lambda e: e.name)
-                    ],
-                label=category.name,
-                required=False)
+        for (category_id, name), elements in zip(
+                matrix.categories, matrix.elements):
+            self.fields["category_{0}".format(category_id)] = (
+                forms.ChoiceField(
+                    choices=[("", "---------")] + list(elements),
+                    label=name,
+                    required=False)
+                )
 
         # set initial data based on current user environment
-        for element in current_elements:
-            field_name = "category_{0}".format(element.category.id)
-            self.initial[field_name] = element.id
+        for (category_id, name), element_id in zip(
+                matrix.categories, matrix.row(current) or []):
+            if element_id is not None:
+                self.initial["category_{0}".format(category_id)] = element_id
 
 
     def clean(self):
@@ -80,10 +55,7 @@ class EnvironmentSelectionForm(forms.Form):
         selected_element_ids = set(
             [int(eid) for k, eid in self.cleaned_data.iteritems()
                 if k.find("category_") == 0 and eid])
-        matches = [
-            envid for envid, element_ids in self.elementids_by_envid.items()
-            if set([e for e in element_ids if e]).issubset(selected_element_ids)
-            ]
+        matches = self.matrix.matches(selected_element_ids)
         if not matches:
             raise forms.ValidationError(
                 "The selected environment is not valid for this test run. "
@@ -101,7 +73,7 @@ class EnvironmentSelectionForm(forms.Form):
 
     def valid_environments_json(self):
         """Return lists of element IDs representing valid envs, as JSON."""
-        return json.dumps(self.elementids_by_envid.values())
+        return json.dumps(self.matrix.rows)
 
 
 class EnvironmentBuildSelectionForm(EnvironmentSelectionForm):
@@ -1,4 +1,6 @@
 """Template tags/filters for running tests."""
+from collections import defaultdict
+
 from django import template
 
 from classytags.core import Tag, Options
@@ -11,6 +13,165 @@ from .... import model
 register = template.Library()
 
 
+# context variable under which the ``result_index`` tag places its index; the
+# per-runcaseversion tags below look up their values in it when it's present,
+# rather than querying for each runcaseversion.
+RESULT_INDEX = "result_index"
+
+
+
+class ResultIndex(object):
+    """
+    Results, step results, suites and bugs for a page of runcaseversions.
+
+    Loads everything the runtests list shows for the given runcaseversions
+    in a constant number of queries, however many runcaseversions there are:
+    the latest results of all testers in ``environment`` (one query), step
+    results of ``user``'s results (one), the suites of ``run`` each case is
+    in (two), and bug URLs of the caseversions (one).
+
+    """
+    def __init__(self, runcaseversions, user, environment, run):
+        self.user = user
+        self.environment = environment
+        runcaseversions = list(runcaseversions)
+        self.rcv_ids = set(rcv.id for rcv in runcaseversions)
+        self.caseversion_ids = set(
+            rcv.caseversion_id for rcv in runcaseversions)
+        # ids of the user's results, whose step results are loaded
+        self.result_ids = set()
+
+        self.results = {}
+        self.other_results = {}
+        self.stepresults = {}
+        self.result_bug_urls = defaultdict(set)
+        self.caseversion_bug_urls = defaultdict(set)
+        self.suites = defaultdict(list)
+
+        if not runcaseversions:
+            return
+
+        self._load_results()
+        self._load_stepresults()
+        self._load_suites(
+            run, set(rcv.caseversion.case_id for rcv in runcaseversions))
+        self._load_caseversion_bug_urls()
+
+
+    def _load_results(self):
+        """Load latest results of all testers for the runcaseversions."""
+        other_statuses = set(
+            model.Result.COMPLETED_STATES + [model.Result.STATUS.skipped])
+        results = model.Result.objects.filter(
+            runcaseversion__in=self.rcv_ids,
+            environment=self.environment,
+            is_latest=True,
+            ).select_related("tester").order_by("-modified_on")
+        for result in results:
+            rcv_id = result.runcaseversion_id
+            if result.tester_id == self.user.id:
+                if rcv_id in self.results:
+                    # there should only be one latest; the most recent wins,
+                    # and becomes the only latest.
+                    self.results[rcv_id].set_latest()
+                    self.results[rcv_id].save()
+                else:
+                    self.results[rcv_id] = result
+            elif (rcv_id not in self.other_results and
+                    result.status in other_statuses):
+                self.other_results[rcv_id] = result
+
+
+    def _load_stepresults(self):
+        """Load step results (and their bug URLs) of the user's results."""
+        self.result_ids = set(r.id for r in self.results.values())
+        if not self.result_ids:
+            return
+        for stepresult in model.StepResult.objects.filter(
+                result__in=self.result_ids):
+            self.stepresults[
+                (stepresult.result_id, stepresult.step_id)] = stepresult
+            if stepresult.bug_url:
+                self.result_bug_urls[stepresult.result_id].add(
+                    stepresult.bug_url)
+
+
+    def _load_suites(self, run, case_ids):
+        """Load suites of ``run`` that contain each case."""
+        suites = list(
+            model.Suite.objects.filter(cases__in=case_ids, runs=run).distinct())
+        if not suites:
+            return
+        suite_cases = defaultdict(set)
+        for case_id, suite_id in model.SuiteCase.objects.filter(
+                suite__in=[suite.id for suite in suites],
+                case__in=case_ids,
+                ).values_list("case", "suite"):
+            suite_cases[suite_id].add(case_id)
+        # keep each case's suites in their default order
+        for suite in suites:
+            for case_id in suite_cases[suite.id]:
+                self.suites[case_id].append(suite)
+
+
+    def _load_caseversion_bug_urls(self):
+        """Load bug URLs of the caseversions' step results, in any run."""
+        bug_urls = model.StepResult.objects.filter(
+            result__runcaseversion__caseversion__in=self.caseversion_ids
+            ).exclude(
+            bug_url="").values_list(
+            "result__runcaseversion__caseversion", "bug_url").distinct()
+        for caseversion_id, bug_url in bug_urls:
+            self.caseversion_bug_urls[caseversion_id].add(bug_url)
+
+
+    def covers(self, runcaseversion, user, environment):
+        """True if this index has the results of given rcv, user and env."""
+        return (
+            runcaseversion.id in self.rcv_ids and
+            user.id == self.user.id and
+            environment.id == self.environment.id
+            )
+
+
+
+class ResultIndexTag(Tag):
+    """
+    Places ``ResultIndex`` for a page of runcaseversions in context.
+
+    Always placed in context under the name ``result_index``, where the other
+    tags in this library find it.
+
+    """
+    name = "result_index"
+    options = Options(
+        Argument("runcaseversions"),
+        Argument("user"),
+        Argument("environment"),
+        Argument("run"),
+        )
+
+
+    def render_tag(self, context, runcaseversions, user, environment, run):
+        """Construct ResultIndex and place it in context."""
+        context[RESULT_INDEX] = ResultIndex(
+            runcaseversions, user, environment, run)
+        return u""
+
+
+register.tag(ResultIndexTag)
+
+
+
+def _index_for(context, runcaseversion, user, environment):
+    """Return result index from context if it covers given rcv/user/env."""
+    index = context.get(RESULT_INDEX)
+    if index is not None and index.covers(runcaseversion, user, environment):
+        return index
+    return None
+
+
+
 class ResultFor(Tag):
     """
     Places Result for this runcaseversion/user/env in context.
@@ -37,6 +198,14 @@ class ResultFor(Tag):
             runcaseversion=runcaseversion,
             is_latest=True,
             )
+        index = _index_for(context, runcaseversion, user, environment)
+        if index is not None:
+            result = index.results.get(runcaseversion.id)
+            if result is None:
+                result = model.Result(**result_kwargs)
+            context[varname] = result
+            return u""
+
         try:
             result = model.Result.objects.get(**result_kwargs)
         except model.Result.DoesNotExist:
@@ -74,6 +243,10 @@ class OtherResultFor(Tag):
 
     def render_tag(self, context, runcaseversion, user, environment, varname):
         """Get/construct Result and place it in context under ``varname``"""
+        index = _index_for(context, runcaseversion, user, environment)
+        if index is not None:
+            context[varname] = index.other_results.get(runcaseversion.id)
+            return u""
 
         # check for any completed result states from other users for this
         # same case/env combo.
@@ -132,6 +305,17 @@ class StepResultFor(Tag):
             result=result,
             step=casestep,
             )
+        index = context.get(RESULT_INDEX)
+        if index is not None and (
+                result.id in index.result_ids or (
+                    result.id is None and
+                    result.runcaseversion_id in index.rcv_ids)):
+            stepresult = index.stepresults.get((result.id, casestep.id))
+            if stepresult is None:
+                stepresult = model.StepResult(**stepresult_kwargs)
+            context[varname] = stepresult
+            return u""
+
         try:
             stepresult = model.StepResult.objects.get(**stepresult_kwargs)
         except model.StepResult.DoesNotExist:
@@ -188,6 +372,12 @@ class SuitesFor(Tag):
 
     def render_tag(self, context, run, runcaseversion, varname):
         """Get/construct Suite list and place it in context under ``varname``"""
+        index = context.get(RESULT_INDEX)
+        if index is not None and runcaseversion.id in index.rcv_ids:
+            context[varname] = index.suites.get(
+                runcaseversion.caseversion.case_id, [])
+            return u""
+
         result = model.Suite.objects.filter(cases=runcaseversion.caseversion.case, runs=run)
 
         context[varname] = result
@@ -195,3 +385,37 @@ class SuitesFor(Tag):
 
 
 register.tag(SuitesFor)
+
+
+
+class BugUrlsFor(Tag):
+    """
+    Places set of bug URLs for a result or caseversion in context.
+
+    """
+    name = "bug_urls_for"
+    options = Options(
+        Argument("obj"),
+        "as",
+        Argument("varname", resolve=False),
+        )
+
+
+    def render_tag(self, context, obj, varname):
+        """Get set of bug URLs and place it in context under ``varname``"""
+        index = context.get(RESULT_INDEX)
+        bug_urls = None
+        if index is not None:
+            if isinstance(obj, model.Result) and obj.id in index.result_ids:
+                bug_urls = index.result_bug_urls.get(obj.id, set())
+            elif (isinstance(obj, model.CaseVersion) and
+                    obj.id in index.caseversion_ids):
+                bug_urls = index.caseversion_bug_urls.get(obj.id, set())
+        if bug_urls is None:
+            bug_urls = obj.bug_urls()
+
+        context[varname] = bug_urls
+        return u""
+
+
+register.tag(BugUrlsFor)
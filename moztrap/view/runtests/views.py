@@ -56,7 +56,7 @@ def set_environment(request, run_id):
 
     form_kwargs = {
         "current": current,
-        "environments": run.environments.all().select_related()
+        "matrix": run.environment_matrix(),
         }
 
     # the run could be an individual, or a series.
@@ -216,19 +216,22 @@ def run(request, run_id, env_id):
             return redirect(request.get_full_path())
 
     envform = EnvironmentSelectionForm(
-        current=environment.id, environments=run.environments.all())
-
-    current_result_select = (
-        "SELECT status from execution_result as r "
-        "WHERE r.runcaseversion_id = execution_runcaseversion.id "
-        "AND r.environment_id = {0} "
-        "AND r.status not in ({1}) "
-        "AND r.is_latest = 1 "
-        "ORDER BY r.created_on DESC LIMIT 1".format(
-            environment.id,
-            ", ".join(
-                ["'{0}'".format(x) for x in model.Result.PENDING_STATES]
-                )))
+        current=environment.id, matrix=run.environment_matrix())
+
+    runcaseversions = run.runcaseversions.select_related(
+        "caseversion__case",
+        ).prefetch_related(
+            "caseversion__tags",
+            "caseversion__attachments",
+            "caseversion__steps",
+            ).filter(environments=environment)
+
+    # the current result of each listed case is fetched for the whole page at
+    # once by the result_index template tag; its denormalized current status
+    # is only needed when sorting on it.
+    if "current_result" in request.GET.get("sortfield", "").split(","):
+        runcaseversions = runcaseversions.extra(
+            select={"current_result": _current_result_select(environment)})
 
     return TemplateResponse(
         request,
@@ -239,16 +242,7 @@ def run(request, run_id, env_id):
             "productversion": run.productversion,
             "run": run,
             "envform": envform,
-            "runcaseversions": run.runcaseversions.select_related(
-                "caseversion__case",
-                ).prefetch_related(
-                    "caseversion__tags",
-                    "caseversion__attachments",
-                    "caseversion__steps",
-                    ).filter(
-                        environments=environment,
-                        ).extra(select={
-                            "current_result": current_result_select}),
+            "runcaseversions": runcaseversions,
             "finder": {
                 # finder decorator populates top column (products), we
                 # prepopulate the other two columns
@@ -260,3 +254,16 @@ def run(request, run_id, env_id):
                 },
             }
         )
+
+
+
+def _current_result_select(environment):
+    """Return SQL selecting the current status of a runcaseversion."""
+    return (
+        "SELECT s.status FROM {0} s "
+        "WHERE s.runcaseversion_id = {1}.id "
+        "AND s.environment_id = {2:d}".format(
+            model.RunCaseVersionStatus._meta.db_table,
+            model.RunCaseVersion._meta.db_table,
+            environment.id,
+            ))
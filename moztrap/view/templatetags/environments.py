@@ -0,0 +1,28 @@
+"""
+Template tags/filters related to environments.
+
+"""
+from django.template import Library
+
+from moztrap import model
+
+
+
+register = Library()
+
+
+
+@register.filter
+def with_element_names(objects, attr=None):
+    """
+    Return ``objects`` as a list, with element names of environments fetched.
+
+    ``objects`` are environments, or, given ``attr``, objects whose ``attr``
+    attribute is an environment. All their ``element_names`` are fetched at
+    once, rather than one environment at a time as they are rendered.
+
+    """
+    objects = list(objects)
+    model.Environment.fetch_element_names(
+        [getattr(o, attr) for o in objects] if attr else objects)
+    return objects
@@ -24,6 +24,11 @@ urlpatterns = patterns(
     "",
     url(r"^$", "moztrap.view.views.home", name="home"),
 
+    # list filter options ----------------------------------------------------
+    url(r"^_filter_options/$",
+        "moztrap.view.views.filter_options",
+        name="filter_options"),
+
     # runtests ---------------------------------------------------------------
     url(r"^runtests/", include("moztrap.view.runtests.urls")),
 
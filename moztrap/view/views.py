@@ -1,8 +1,13 @@
 """
-MozTrap home view.
+MozTrap home view, and options lookup for list filters.
 
 """
+import json
+
+from django.core.urlresolvers import resolve, Resolver404
+from django.http import Http404, HttpResponse
 from django.shortcuts import redirect
+from django.views.decorators.cache import never_cache
 
 from .utils.auth import login_maybe_required
 
@@ -14,3 +19,67 @@ def home(request):
     if request.user.has_perm("execution.execute"):
         return redirect("runtests")
     return redirect("results_runs")
+
+
+
+@never_cache
+@login_maybe_required
+def filter_options(request):
+    """
+    Return matching options of search-mode list filters in JSON format.
+
+    Expects ``path`` (of the list page), ``text`` (the typed prefix), and
+    optionally ``key`` (limit to the filter(s) with this key) and ``page``.
+    Suggestions are in the format used by the filter autocomplete; ``more``
+    is true if any of the filters has further pages of options.
+
+    """
+    try:
+        view_func = resolve(request.GET.get("path", "")).func
+    except Resolver404:
+        raise Http404
+    filterset = getattr(view_func, "filterset", None)
+    if filterset is None:
+        raise Http404
+
+    text = request.GET.get("text", "")
+    keys = request.GET.getlist("key")
+    try:
+        page = int(request.GET.get("page", 1))
+    except ValueError:
+        page = 1
+
+    suggestions = []
+    more = False
+    for flt in filterset:
+        if getattr(flt, "search_field", None) is None or not text:
+            continue
+        if keys and flt.key not in keys:
+            continue
+        options, flt_more = flt.search(text, page)
+        more = more or flt_more
+        for value, label in options:
+            # the label needn't start with the search field, but highlight the
+            # typed text if it's in there
+            start = label.lower().find(text.lower())
+            if start == -1:
+                start = len(label)
+            suggestions.append({
+                    "preText": label[:start],
+                    "typedText": label[start:start + len(text)],
+                    "postText": label[start + len(text):],
+                    "id": value,
+                    "name": label,
+                    "type": flt.key,
+                    "displayType": flt.name,
+                    })
+
+    return HttpResponse(
+        json.dumps(
+            {
+                "suggestions": suggestions,
+                "more": more,
+                }
+            ),
+        content_type="application/json",
+        )
@@ -35,7 +35,10 @@ var MT = (function (MT, $) {
             initialFocus: true,
             inputsNeverRemoved: true,
             prefix: 'filter',
-            debounce: true
+            debounce: true,
+            searchInputList: '.visual .filter-group.search',
+            searchUrl: $('#filter .filter-group.search').length ? $('#filter').data('search-url') : null,
+            searchData: {path: window.location.pathname}
         });
         $('#clientfilter').customAutocomplete({
             textbox: '#text-filter',
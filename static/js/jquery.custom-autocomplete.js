@@ -28,6 +28,7 @@
             suggestionList = context.find(options.suggestionList),
             inputList = context.find(options.inputList),
             newInputList = context.find(options.newInputList),
+            searchInputList = context.find(options.searchInputList),
             origInputs = inputList.html(),
             origNewInputs = newInputList.html(),
             inputs = inputList.add(newInputList).find(options.inputs),
@@ -41,6 +42,7 @@
             typedText,
             ajaxCalls = 0,
             ajaxResponses = 0,
+            searchResults = [],
 
             // Removes (faked) placeholder text from textbox
             removeFakePlaceholder = function () {
@@ -105,6 +107,28 @@
                 });
             },
 
+            // Look up options of search-mode groups matching typed text, and add them to suggestions
+            searchSuggestions = function () {
+                var text = typedText,
+                    data = $.extend({}, options.searchData, {text: text}),
+                    serializedData = $.param(data),
+                    done = function (response) {
+                        // Ignore responses for text that has since changed
+                        if (text === typedText) {
+                            searchResults = response.suggestions;
+                            updateSuggestions();
+                        }
+                    };
+                if (cache[serializedData]) {
+                    done(cache[serializedData]);
+                } else {
+                    $.get(options.searchUrl, data, function (response) {
+                        cache[serializedData] = response;
+                        done(response);
+                    });
+                }
+            },
+
             // Create list of autocomplete suggestions from Ajax response or existing list of inputs
             updateSuggestions = function (data, cached) {
                 var extraDataName, suggestions;
@@ -141,6 +165,13 @@
                         }
                         data.suggestions.push(thisSuggestion);
                     });
+
+                    // Add options of search-mode groups found via ``searchUrl``, unless already there
+                    $.each(searchResults, function () {
+                        if (!inputs.filter('[data-name="' + this.type + '"][value="' + this.id + '"]').length) {
+                            data.suggestions.push($.extend({}, this));
+                        }
+                    });
                 }
 
                 if (options.allowNew && !cached) {
@@ -251,7 +282,11 @@
                                     });
                                 }
                             } else {
+                                searchResults = [];
                                 updateSuggestions();
+                                if (options.searchUrl) {
+                                    searchSuggestions();
+                                }
                             }
                         } else {
                             suggestionList.empty().hide();
@@ -419,7 +454,7 @@
                     thisInput.prop('checked', true).change();
                 } else {
                     if (options.multipleCategories) {
-                        thisGroup = newInputList.filter(function () {
+                        thisGroup = newInputList.add(searchInputList).filter(function () {
                             return $(this).data('name') === thisTypeName;
                         });
                     } else {
@@ -593,6 +628,10 @@
         formActions: '.form-actions',                   // Select for form-actions (only needed if ``hideFormActions: true``)
         ajax: false,                                    // Set ``true`` if using Ajax to retrieve autocomplete suggestions
         url: null,                                      // Ajax url (only needed if ``ajax: true``)
+        searchInputList: null,                          // Selector for groups of inputs with only selected options present; others
+                                                        //      are looked up at ``searchUrl`` (needs ``multipleCategories: true``)
+        searchUrl: null,                                // Url returning suggestions for ``searchInputList`` groups
+        searchData: {},                                 // Additional data to be sent with ``searchUrl`` requests
         triggerSubmit: function (context) {             // Function to be executed on ENTER in empty textbox
             context.find('.form-actions button[type="submit"]').click();
         },
@@ -0,0 +1,168 @@
+"""
+Performance benchmarks.
+
+Benchmarks build synthetic datasets in the test database and record query
+count, SQL time, Python time, wall time and peak memory for the operation
+under test. They are slow, so they are skipped unless the
+``MOZTRAP_BENCHMARK`` environment variable is set::
+
+    MOZTRAP_BENCHMARK=1 bin/test tests.benchmarks
+
+Measurements are written to stdout; if ``MOZTRAP_BENCHMARK_REPORT`` names a
+file, each measurement is also appended to it as a line of JSON. Compare a
+report with the stored baseline (``baseline.json`` in this package) with::
+
+    python -m tests.benchmarks.compare report.jsonl
+
+Each measurement's query count is also checked against the baseline as it is
+taken; a benchmark fails if it makes more queries than its baseline allows,
+so N+1 regressions are caught whenever benchmarks are run.
+
+Dataset sizes can be overridden with a comma-separated list of integers in
+``MOZTRAP_BENCHMARK_SCALES``.
+
+"""
+import gc
+import json
+import os
+import resource
+import sys
+import time
+from contextlib import contextmanager
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import unittest
+
+
+
+enabled = bool(os.environ.get("MOZTRAP_BENCHMARK"))
+
+benchmark = unittest.skipUnless(
+    enabled, "Set MOZTRAP_BENCHMARK=1 to run benchmarks.")
+
+
+
+def scales(default):
+    """Return dataset sizes to benchmark, from env or ``default``."""
+    configured = os.environ.get("MOZTRAP_BENCHMARK_SCALES")
+    if not configured:
+        return default
+    return [int(s) for s in configured.split(",") if s.strip()]
+
+
+
+BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+# measurements that aren't part of the key identifying a measurement
+MEASURES = set(
+    ["queries", "sql_time", "python_time", "wall_time", "peak_memory"])
+
+
+
+def key(record):
+    """
+    Return key identifying what ``record`` measures, for the baseline.
+
+    The key is the benchmark name plus any dataset info, e.g.
+    "manage.cases cases=100".
+
+    """
+    info = sorted(
+        "{0}={1}".format(k, v) for k, v in record.items()
+        if k != "name" and k not in MEASURES)
+    return " ".join([record["name"]] + info)
+
+
+
+def load_baseline(path=BASELINE):
+    """Return baseline dictionary mapping keys to measurement dicts."""
+    if not os.path.exists(path):
+        return {}
+    with open(path) as fh:
+        return json.load(fh)
+
+
+
+@contextmanager
+def measure(name, **info):
+    """
+    Measure queries, timings and peak memory of the wrapped block.
+
+    ``name`` identifies the benchmark; any additional keyword arguments
+    (e.g. the dataset size) are recorded alongside the measurement. Yields
+    the measurement dictionary, which is filled in when the block exits.
+
+    ``peak_memory`` is how far (in kilobytes) the resident set size of the
+    process peaked above its size at the start of the block (after a garbage
+    collection); it is 0 if the block only reused memory the process already
+    held. Where the peak can't be reset (it can on Linux), it is the growth
+    of the process's lifetime peak over the block instead, which misses any
+    peak lower than an earlier one.
+
+    Raises ``AssertionError`` if the block made more queries than the
+    baseline for this measurement.
+
+    """
+    record = {"name": name}
+    record.update(info)
+    gc.collect()
+    start_rss = _resident_kb("VmRSS") if _reset_peak_rss() else None
+    start_maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.time()
+    with CaptureQueriesContext(connection) as queries:
+        yield record
+    record["wall_time"] = time.time() - start
+    record["queries"] = len(queries)
+    record["sql_time"] = sum(
+        float(q.get("time") or 0) for q in queries.captured_queries)
+    record["python_time"] = max(record["wall_time"] - record["sql_time"], 0)
+    peak = _resident_kb("VmHWM") if start_rss is not None else None
+    if peak is not None:
+        record["peak_memory"] = max(peak - start_rss, 0)
+    else:
+        record["peak_memory"] = resource.getrusage(
+            resource.RUSAGE_SELF).ru_maxrss - start_maxrss
+    report(record)
+
+    expected = load_baseline().get(key(record))
+    if expected is not None and record["queries"] > expected["queries"]:
+        raise AssertionError(
+            "{0}: {1} queries, baseline is {2}.".format(
+                key(record), record["queries"], expected["queries"])
+            )
+
+
+
+def _reset_peak_rss():
+    """Reset the peak resident set size of the process; return success."""
+    try:
+        with open("/proc/self/clear_refs", "w") as fh:
+            fh.write("5")
+    except (IOError, OSError):
+        return False
+    return True
+
+
+
+def _resident_kb(field):
+    """Return a size (in kB) from /proc/self/status, e.g. "VmHWM", or None."""
+    try:
+        with open("/proc/self/status") as fh:
+            for line in fh:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except (IOError, OSError, ValueError):
+        pass
+    return None
+
+
+
+def report(record):
+    """Write a measurement to stdout and the configured report file."""
+    line = json.dumps(record, sort_keys=True)
+    sys.stdout.write("\n{0}\n".format(line))
+    path = os.environ.get("MOZTRAP_BENCHMARK_REPORT")
+    if path:
+        with open(path, "a") as fh:
+            fh.write(line + "\n")
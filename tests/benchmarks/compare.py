@@ -0,0 +1,140 @@
+"""
+Compare a benchmark report with the stored baseline.
+
+Usage::
+
+    bin/compare-benchmarks [options] report.jsonl
+
+Prints each measurement of the report beside its baseline. Exits with status
+1 if any measurement makes more queries than its baseline, or (with
+``--time-tolerance``) is that much slower. With ``--update``, the baseline is
+rewritten from the report instead.
+
+"""
+from optparse import OptionParser
+import json
+import sys
+
+from . import BASELINE, MEASURES, key, load_baseline
+
+
+
+def read_report(path):
+    """Return dictionary mapping keys to measurements in report file."""
+    records = {}
+    with open(path) as fh:
+        for line in fh:
+            if line.strip():
+                record = json.loads(line)
+                records[key(record)] = record
+    return records
+
+
+
+def compare(records, baseline, time_tolerance=None):
+    """
+    Compare report ``records`` with ``baseline``; return list of problems.
+
+    Query counts over the baseline's are always problems; a ``wall_time``
+    more than ``time_tolerance`` (a fraction, e.g. 0.5 for 50%) over the
+    baseline's is a problem if a tolerance is given.
+
+    """
+    problems = []
+    for k in sorted(records):
+        record = records[k]
+        expected = baseline.get(k)
+        if expected is None:
+            continue
+        if record["queries"] > expected["queries"]:
+            problems.append(
+                "{0}: {1} queries, baseline {2}".format(
+                    k, record["queries"], expected["queries"]))
+        if (time_tolerance is not None and expected.get("wall_time") and
+                record["wall_time"] >
+                expected["wall_time"] * (1 + time_tolerance)):
+            problems.append(
+                "{0}: {1:.3f}s, baseline {2:.3f}s".format(
+                    k, record["wall_time"], expected["wall_time"]))
+    return problems
+
+
+
+def format_table(records, baseline):
+    """Return lines of a table of report records beside the baseline."""
+    lines = [
+        "{0:<50} {1:>15} {2:>19} {3:>9} {4:>9}".format(
+            "benchmark", "queries", "wall time (s)", "sql (s)", "mem (kB)")
+        ]
+    for k in sorted(records):
+        record = records[k]
+        expected = baseline.get(k, {})
+        lines.append(
+            "{0:<50} {1:>15} {2:>19} {3:>9.3f} {4:>9}".format(
+                k,
+                "{0} ({1})".format(
+                    record["queries"], expected.get("queries", "-")),
+                "{0:.3f} ({1})".format(
+                    record["wall_time"],
+                    "{0:.3f}".format(expected["wall_time"])
+                    if "wall_time" in expected else "-"),
+                record.get("sql_time", 0),
+                record.get("peak_memory", "-"),
+                )
+            )
+    return lines
+
+
+
+def main(argv):
+    parser = OptionParser(
+        usage="%prog [options] report.jsonl",
+        description="Compare a benchmark report with the stored baseline.")
+    parser.add_option(
+        "-b", "--baseline", default=BASELINE,
+        help="Baseline file (default: %default).")
+    parser.add_option(
+        "-t", "--time-tolerance", type="float", default=None,
+        help="Also fail if wall time exceeds the baseline's by this fraction.")
+    parser.add_option(
+        "-u", "--update", action="store_true", default=False,
+        help="Rewrite the baseline with the report's measurements.")
+    options, args = parser.parse_args(argv)
+    if len(args) != 1:
+        parser.error("A report file is required.")
+
+    records = read_report(args[0])
+    baseline = load_baseline(options.baseline)
+
+    if options.update:
+        baseline.update(
+            (
+                k,
+                dict(
+                    (m, round(v, 4) if isinstance(v, float) else v)
+                    for m, v in r.items() if m in MEASURES
+                    )
+                )
+            for k, r in records.items()
+            )
+        with open(options.baseline, "w") as fh:
+            json.dump(
+                baseline, fh, indent=2, separators=(",", ": "), sort_keys=True)
+            fh.write("\n")
+        print "Updated {0} baseline measurement(s) in {1}.".format(
+            len(records), options.baseline)
+        return 0
+
+    print "\n".join(format_table(records, baseline))
+    problems = compare(records, baseline, options.time_tolerance)
+    if problems:
+        print
+        print "Regressions:"
+        print "\n".join(problems)
+        return 1
+    return 0
+
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,71 @@
+"""
+Tests for comparing benchmark reports with the baseline.
+
+"""
+from tests import case
+
+from . import key
+from .compare import compare
+
+
+
+class KeyTest(case.TestCase):
+    """Tests for ``key``."""
+    def test_key(self):
+        """Key is name plus sorted dataset info, without measurements."""
+        record = {
+            "name": "manage.cases",
+            "cases": 100,
+            "envs": 4,
+            "queries": 5,
+            "wall_time": 0.1,
+            }
+
+        self.assertEqual(key(record), "manage.cases cases=100 envs=4")
+
+
+
+class CompareTest(case.TestCase):
+    """Tests for ``compare``."""
+    def records(self, queries, wall_time=1.0):
+        """Return report records with a single measurement."""
+        return {"view cases=10": {"queries": queries, "wall_time": wall_time}}
+
+
+    def test_same(self):
+        """No problems if the measurement matches the baseline."""
+        self.assertEqual(compare(self.records(5), self.records(5)), [])
+
+
+    def test_more_queries(self):
+        """More queries than the baseline is a problem."""
+        self.assertEqual(
+            compare(self.records(6), self.records(5)),
+            ["view cases=10: 6 queries, baseline 5"],
+            )
+
+
+    def test_fewer_queries(self):
+        """Fewer queries than the baseline is fine."""
+        self.assertEqual(compare(self.records(4), self.records(5)), [])
+
+
+    def test_not_in_baseline(self):
+        """Measurements not in the baseline are ignored."""
+        self.assertEqual(compare(self.records(5), {}), [])
+
+
+    def test_slower_ignored(self):
+        """Wall time is ignored without a tolerance."""
+        self.assertEqual(
+            compare(self.records(5, 3.0), self.records(5, 1.0)), [])
+
+
+    def test_slower_with_tolerance(self):
+        """Wall time over the baseline by more than tolerance is a problem."""
+        self.assertEqual(
+            compare(self.records(5, 1.6), self.records(5, 1.0), 0.5),
+            ["view cases=10: 1.600s, baseline 1.000s"],
+            )
+        self.assertEqual(
+            compare(self.records(5, 1.4), self.records(5, 1.0), 0.5), [])
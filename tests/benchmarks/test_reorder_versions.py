@@ -0,0 +1,74 @@
+"""
+Benchmarks for reordering product versions (and latest caseversions).
+
+"""
+from tests import case
+
+from . import benchmark, measure, scales
+
+
+
+@benchmark
+class ReorderVersionsBenchmark(case.DBTestCase):
+    """Add a version to products of increasing size, recording queries."""
+    def setUp(self):
+        """Set up a product with two versions."""
+        self.pv1 = self.F.ProductVersionFactory.create(version="1")
+        self.product = self.pv1.product
+        self.pv2 = self.F.ProductVersionFactory.create(
+            product=self.product, version="2")
+
+
+    def create_cases(self, num):
+        """Bulk-create ``num`` cases, each with a version in both versions."""
+        Case = self.model.Case
+        CaseVersion = self.model.CaseVersion
+
+        Case.objects.bulk_create(
+            [Case(product=self.product) for i in range(num)])
+        case_ids = list(
+            Case.objects.filter(
+                product=self.product).values_list("id", flat=True))
+
+        CaseVersion.objects.bulk_create(
+            [
+                CaseVersion(
+                    case_id=case_id,
+                    productversion=pv,
+                    name="case {0}".format(case_id),
+                    latest=(pv == self.pv2),
+                    )
+                for case_id in case_ids
+                for pv in [self.pv1, self.pv2]
+                ]
+            )
+
+
+    def test_reorder(self):
+        """Add a new version, then move the first version to the end."""
+        for num in scales([100, 10000, 100000]):
+            self.create_cases(num)
+
+            with measure("product.add_version", cases=num) as record:
+                pv = self.F.ProductVersionFactory.create(
+                    product=self.product, version="3")
+            self.assertLess(record["queries"], 10)
+
+            # every case's latest version moves from pv2 to pv1
+            pv1 = self.refresh(self.pv1)
+            pv1.version = "4"
+            with measure("product.reorder_versions", cases=num) as record:
+                pv1.save()
+            self.assertLess(record["queries"], 10)
+
+            self.assertEqual(
+                self.model.CaseVersion.objects.filter(
+                    latest=True, productversion=self.pv1).count(),
+                num)
+
+            # reset for the next scale
+            pv.delete(permanent=True)
+            pv1 = self.refresh(pv1)
+            pv1.version = "1"
+            pv1.save()
+            self.model.Case.everything.all().delete(permanent=True)
@@ -0,0 +1,85 @@
+"""
+Benchmarks for locking in runcaseversions on run activation.
+
+"""
+from tests import case
+
+from . import benchmark, measure, scales
+
+
+
+@benchmark
+class RunLockBenchmark(case.DBTestCase):
+    """Activate runs of increasing size, recording queries and wall time."""
+    def setUp(self):
+        """Set up envs, product, product version, suite and run."""
+        self.envs = self.F.EnvironmentFactory.create_full_set(
+            {"OS": ["Linux", "Windows"], "Browser": ["Firefox", "Chrome"]})
+        self.pv = self.F.ProductVersionFactory.create(environments=self.envs)
+        self.suite = self.F.SuiteFactory.create(
+            product=self.pv.product, status="active")
+        self.run = self.F.RunFactory.create(productversion=self.pv)
+        self.F.RunSuiteFactory.create(run=self.run, suite=self.suite)
+
+
+    def create_cases(self, num):
+        """Bulk-create ``num`` active caseversions in the run's suite."""
+        Case = self.model.Case
+        CaseVersion = self.model.CaseVersion
+        product = self.pv.product
+
+        Case.objects.bulk_create(
+            [Case(product=product) for i in range(num)])
+        case_ids = list(
+            Case.objects.filter(product=product).values_list("id", flat=True))
+
+        CaseVersion.objects.bulk_create(
+            [
+                CaseVersion(
+                    case_id=case_id,
+                    productversion=self.pv,
+                    name="case {0}".format(case_id),
+                    status="active",
+                    latest=True,
+                    )
+                for case_id in case_ids
+                ]
+            )
+        cv_ids = CaseVersion.objects.filter(
+            productversion=self.pv).values_list("id", flat=True)
+
+        through = CaseVersion.environments.through
+        through.objects.bulk_create(
+            [
+                through(caseversion_id=cv_id, environment_id=env.id)
+                for cv_id in cv_ids
+                for env in self.envs
+                ]
+            )
+
+        self.model.SuiteCase.objects.bulk_create(
+            [
+                self.model.SuiteCase(
+                    suite=self.suite, case_id=case_id, order=i)
+                for i, case_id in enumerate(case_ids)
+                ]
+            )
+
+
+    def test_activate(self):
+        """Activate a draft run, then refresh it with nothing changed."""
+        for num in scales([1000, 10000, 50000]):
+            self.create_cases(num)
+
+            with measure("run.activate", cases=num):
+                self.run.activate()
+
+            with measure("run.refresh.unchanged", cases=num):
+                self.run.refresh()
+
+            self.assertEqual(self.run.runcaseversions.count(), num)
+
+            # reset for the next scale
+            self.run.runcaseversions.all().delete(permanent=True)
+            self.run.draft()
+            self.model.Case.everything.all().delete(permanent=True)
@@ -0,0 +1,137 @@
+"""
+Benchmarks for the main list, execution and API views.
+
+"""
+from django.core.urlresolvers import reverse
+
+from tests import case
+from moztrap.model import API_VERSION
+
+from . import benchmark, measure, scales
+
+
+
+@benchmark
+class ViewsBenchmark(case.view.WebTest):
+    """Request views over datasets of increasing size, recording queries."""
+    def setUp(self):
+        """Set up a superuser and environments."""
+        self.user = self.F.UserFactory.create(is_superuser=True)
+        self.envs = self.F.EnvironmentFactory.create_full_set(
+            {"OS": ["Linux", "Windows"], "Browser": ["Firefox", "Chrome"]})
+
+
+    def build(self, num):
+        """
+        Create a product with ``num`` cases, in a suite, run and results.
+
+        The cases all have a tag and the environments; the run is activated,
+        and half of its runcaseversions have a result.
+
+        """
+        pv = self.F.ProductVersionFactory.create(environments=self.envs)
+        product = pv.product
+        suite = self.F.SuiteFactory.create(product=product, status="active")
+        tag = self.F.TagFactory.create(product=product)
+        for i in range(num):
+            cv = self.F.CaseVersionFactory.create(
+                productversion=pv,
+                name="case {0}".format(i),
+                status="active",
+                environments=self.envs,
+                )
+            cv.tags.add(tag)
+            self.F.SuiteCaseFactory.create(suite=suite, case=cv.case, order=i)
+
+        run = self.F.RunFactory.create(
+            productversion=pv, environments=self.envs)
+        self.F.RunSuiteFactory.create(run=run, suite=suite)
+        run.activate()
+        for rcv in run.runcaseversions.all()[::2]:
+            self.F.ResultFactory.create(
+                runcaseversion=rcv,
+                environment=self.envs[0],
+                tester=self.user,
+                status="passed",
+                )
+        return run
+
+
+    def api_url(self, resource_name):
+        """Return list URL for the named API resource."""
+        return reverse(
+            "api_dispatch_list",
+            kwargs={"resource_name": resource_name, "api_name": API_VERSION},
+            )
+
+
+    def requests(self, run):
+        """Return list of (benchmark name, url, params) to request."""
+        product_id = run.productversion.product_id
+        return [
+            ("manage.cases", reverse("manage_cases"), {}),
+            ("manage.runs", reverse("manage_runs"), {}),
+            ("results.runs", reverse("results_runs"), {}),
+            (
+                "results.runcaseversions",
+                reverse("results_runcaseversions"),
+                {"filter-run": run.id},
+                ),
+            (
+                "runtests.run",
+                reverse(
+                    "runtests_run",
+                    kwargs={"run_id": run.id, "env_id": self.envs[0].id}),
+                {},
+                ),
+            (
+                "api.speedy.caseselection",
+                reverse("caseselection"),
+                {"productversion__product": product_id, "limit": 20},
+                ),
+            (
+                "api.caseversion",
+                self.api_url("caseversion"),
+                {"format": "json", "productversion__product": product_id},
+                ),
+            (
+                "api.caseselection",
+                self.api_url("caseselection"),
+                {"format": "json", "productversion__product": product_id},
+                ),
+            (
+                "api.suite",
+                self.api_url("suite"),
+                {"format": "json", "product": product_id},
+                ),
+            (
+                "api.run",
+                self.api_url("run"),
+                {"format": "json", "productversion__product": product_id},
+                ),
+            (
+                "api.runcaseversion",
+                self.api_url("runcaseversion"),
+                {"format": "json", "run": run.id},
+                ),
+            (
+                "api.result",
+                self.api_url("result"),
+                {"format": "json", "runcaseversion__run": run.id},
+                ),
+            ]
+
+
+    def test_views(self):
+        """Request each view for each dataset size."""
+        for num in scales([10, 100, 1000]):
+            run = self.build(num)
+
+            for name, url, params in self.requests(run):
+                # warm up caches (e.g. of filter choices) first
+                self.app.get(url, params=params, user=self.user)
+                with measure(name, cases=num):
+                    self.app.get(url, params=params, user=self.user)
+
+            # reset for the next scale
+            self.model.Product.everything.all().delete(permanent=True)
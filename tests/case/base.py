@@ -3,6 +3,7 @@ Utility base TestCase classes for MozTrap.
 
 """
 from django import test as django_test
+from django.core.cache import cache
 from django.utils import unittest
 
 import mock
@@ -11,6 +12,19 @@ import mock
 
 class DBMixin(object):
     """Mixin for MozTrap test case classes that need the database."""
+    def _pre_setup(self):
+        """
+        Start each test with an empty cache.
+
+        Generation counters in the cache outlive the database rollback at the
+        end of each test, so otherwise caches keyed by them could be shared
+        between tests that see different data.
+
+        """
+        cache.clear()
+        super(DBMixin, self)._pre_setup()
+
+
     @property
     def model(self):
         """The data model."""
@@ -0,0 +1,129 @@
+"""
+Tests for management command to report and merge duplicate environments.
+
+"""
+from cStringIO import StringIO
+
+from django.core.management import call_command
+
+from mock import patch
+
+from tests import case
+
+
+
+class DedupeEnvironmentsTest(case.DBTestCase):
+    """Tests for dedupe_environments management command."""
+
+    def call_command(self, *args, **kwargs):
+        """Runs the management command and returns stdout output."""
+        with patch("sys.stdout", StringIO()) as stdout:
+            call_command("dedupe_environments", *args, **kwargs)
+
+        stdout.seek(0)
+        return stdout.read()
+
+
+    def setUp(self):
+        """Create three environments with the same elements, and another."""
+        super(DedupeEnvironmentsTest, self).setUp()
+        os = self.F.ElementFactory.create(name="OS X")
+        lang = self.F.ElementFactory.create(name="English")
+        profile = self.F.ProfileFactory.create()
+        self.envs = []
+        for i in range(3):
+            env = self.F.EnvironmentFactory.create(profile=profile)
+            env.elements.add(os, lang)
+            self.envs.append(env)
+        self.other = self.F.EnvironmentFactory.create(profile=profile)
+        self.other.elements.add(os)
+
+
+    def test_report(self):
+        """Without --merge, duplicates are only reported."""
+        output = self.call_command()
+
+        keeper, dup1, dup2 = self.envs
+        self.assertIn(
+            "Environment {0} ({1}) is duplicated by {2}, {3}".format(
+                keeper.id, keeper, dup1.id, dup2.id),
+            output,
+            )
+        self.assertIn("Found 1 duplicated element set(s).", output)
+        self.assertEqual(
+            self.model.Environment.objects.filter(
+                pk__in=[e.id for e in self.envs]).count(),
+            3,
+            )
+
+
+    def test_merge(self):
+        """Objects are repointed at the lowest-id environment."""
+        keeper, dup1, dup2 = self.envs
+        pv = self.F.ProductVersionFactory.create(
+            environments=[keeper, dup1])
+        run = self.F.RunFactory.create(
+            productversion=pv, environments=[dup1, dup2, self.other])
+
+        output = self.call_command(merge=True)
+
+        self.assertIn("Merged 2 duplicate environment(s) of 1 set(s).", output)
+        self.assertEqual(set(pv.environments.all()), set([keeper]))
+        self.assertEqual(
+            set(run.environments.all()), set([keeper, self.other]))
+        self.assertEqual(
+            list(self.model.Environment.objects.filter(
+                    pk__in=[dup1.id, dup2.id])),
+            [],
+            )
+
+
+    def test_merge_summaries(self):
+        """Result summaries of runs whose rcv environments merged are rebuilt."""
+        keeper, dup1, dup2 = self.envs
+        pv = self.F.ProductVersionFactory.create(
+            environments=[keeper, dup1, self.other])
+        run = self.F.RunFactory.create(productversion=pv)
+        self.F.RunCaseVersionFactory.create(
+            run=run, caseversion__productversion=pv)
+        self.F.RunCaseVersionFactory.create(
+            run=run, caseversion__productversion=pv,
+            caseversion__environments=[dup1])
+
+        self.call_command(merge=True)
+
+        S = self.model.RunResultSummary
+        stored = dict(
+            ((r, e, s), c) for r, e, s, c
+            in S.objects.filter(count__gt=0).values_list(
+                "run", "environment", "status", "count")
+            )
+        self.assertEqual(stored, S.live([run.id]))
+        self.assertEqual(S.counts(run, keeper)["_total"], 2)
+
+
+    def test_keeps_with_results(self):
+        """A duplicate that has results is not merged."""
+        keeper, dup1, dup2 = self.envs
+        self.F.ResultFactory.create(environment=dup1)
+
+        output = self.call_command(merge=True)
+
+        self.assertIn(
+            "Environment {0} has results; not merged.".format(dup1.id), output)
+        self.assertTrue(
+            self.model.Environment.objects.filter(pk=dup1.id).exists())
+        self.assertFalse(
+            self.model.Environment.objects.filter(pk=dup2.id).exists())
+
+
+    def test_keeps_other_profile(self):
+        """A duplicate in another profile stays there."""
+        keeper, dup1, dup2 = self.envs
+        other_profile = self.F.ProfileFactory.create()
+        dup2.profile = other_profile
+        dup2.save()
+
+        self.call_command(merge=True)
+
+        self.assertEqual(list(other_profile.environments.all()), [dup2])
@@ -0,0 +1,89 @@
+"""
+Tests for management command to clone cases into another product version.
+
+"""
+from cStringIO import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+from mock import patch
+
+from tests import case
+
+
+
+class FillProductVersionTest(case.DBTestCase):
+    """Tests for fill_productversion management command."""
+
+    def call_command(self, *args, **kwargs):
+        """Runs the management command and returns stdout output."""
+        with patch("sys.stdout", StringIO()) as stdout:
+            call_command("fill_productversion", *args, **kwargs)
+
+        stdout.seek(0)
+        return stdout.read()
+
+
+    def setUp(self):
+        """A product version with two caseversions, and a new one."""
+        self.source = self.F.ProductVersionFactory.create(version="1.0")
+        for i in range(2):
+            self.F.CaseVersionFactory.create(productversion=self.source)
+        self.target = self.F.ProductVersionFactory.create(
+            product=self.source.product, version="2.0")
+
+
+    def test_fill(self):
+        """Clones caseversions, reporting progress per batch."""
+        u = self.F.UserFactory.create(username="someone")
+
+        output = self.call_command(
+            str(self.source.id), str(self.target.id),
+            username="someone", batch_size=1)
+
+        self.assertEqual(self.target.caseversions.count(), 2)
+        self.assertEqual(
+            set(self.target.caseversions.values_list(
+                "created_by", flat=True)),
+            set([u.id]),
+            )
+        self.assertIn("Cloned 1 of 2 caseversion(s)", output)
+        self.assertIn("Cloned 2 of 2 caseversion(s)", output)
+        self.assertIn("Cloned 2 caseversion(s) from", output)
+
+
+    def test_rerun(self):
+        """Running again clones nothing more."""
+        self.call_command(str(self.source.id), str(self.target.id))
+
+        output = self.call_command(str(self.source.id), str(self.target.id))
+
+        self.assertEqual(self.target.caseversions.count(), 2)
+        self.assertIn("Cloned 0 caseversion(s) from", output)
+
+
+    def test_bad_args(self):
+        """Wrong number of arguments is an error."""
+        with self.assertRaises(CommandError):
+            self.call_command(str(self.source.id))
+
+
+    def test_bad_productversion(self):
+        """A nonexistent product version is an error."""
+        with self.assertRaises(CommandError):
+            self.call_command(str(self.source.id), "0")
+
+
+    def test_other_product(self):
+        """Product versions of different products are an error."""
+        other = self.F.ProductVersionFactory.create()
+        with self.assertRaises(CommandError):
+            self.call_command(str(self.source.id), str(other.id))
+
+
+    def test_bad_user(self):
+        """A nonexistent user is an error."""
+        with self.assertRaises(CommandError):
+            self.call_command(
+                str(self.source.id), str(self.target.id), username="nobody")
@@ -217,3 +217,103 @@ class ImportCasesTest(case.DBTestCase):
 
         self.assertEqual(output, ("No files found to import.\n", ""))
         self.assertEqual(self.model.CaseVersion.objects.count(), 0)
+
+
+    def test_stream(self):
+        """Streaming import reports progress and creates objects."""
+        self.F.ProductVersionFactory.create(product__name="Foo", version="1.0")
+
+        data = {
+            "suites": [{"name": "FooSuite", "description": "foo"}],
+            "cases": [
+                {
+                    "name": "Foo",
+                    "suites": ["FooSuite"],
+                    "steps": [{"instruction": "do this"}],
+                    }
+                ],
+            }
+
+        with self.tempfile(json.dumps(data)) as path:
+            stdout, stderr = self.call_command(
+                "Foo", "1.0", path, stream=True)
+
+        lines = stdout.splitlines()
+        self.assertTrue(lines[0].startswith(
+            "{0}: 1 cases so far, ".format(path)), lines[0])
+        self.assertTrue(lines[1].startswith(
+            "{0}: 1 cases, 1 suites in ".format(path)), lines[1])
+        self.assertTrue(lines[2].startswith("Total: 1 cases in "), lines[2])
+        self.assertEqual(lines[3:], ["Imported 1 cases", "Imported 1 suites"])
+        self.assertEqual(stderr, "")
+        cv = self.model.CaseVersion.objects.get()
+        self.assertEqual(cv.name, "Foo")
+        self.assertEqual(cv.case.suites.get().description, "foo")
+
+
+    def test_stream_bad_json(self):
+        """Error if streamed file contains malformed JSON."""
+        self.F.ProductVersionFactory.create(product__name="Foo", version="1.0")
+
+        with self.tempfile('{"cases": [{"name": "Foo"') as path:
+            with self.assertRaises(CommandError) as cm:
+                self.call_command("Foo", "1.0", path, stream=True)
+
+        self.assertIn("Could not parse JSON", str(cm.exception))
+        self.assertEqual(self.model.CaseVersion.objects.count(), 0)
+
+
+    def test_workers_single_file(self):
+        """With only one file to import, no worker processes are used."""
+        self.F.ProductVersionFactory.create(product__name="Foo", version="1.0")
+
+        data = {
+            "cases": [{"name": "Foo", "steps": [{"instruction": "do this"}]}]}
+
+        with self.tempfile(json.dumps(data)) as path:
+            with patch(
+                    "moztrap.model.core.management.commands.import.Pool"
+                    ) as mock_pool:
+                stdout, stderr = self.call_command(
+                    "Foo", "1.0", path, workers=4)
+
+        self.assertFalse(mock_pool.called)
+        self.assertTrue(stdout.endswith(
+            "Imported 1 cases\nImported 0 suites\n"))
+        self.assertEqual(self.model.CaseVersion.objects.get().name, "Foo")
+
+
+
+class ImportFileWorkerTest(case.DBTestCase):
+    """Tests for function importing one file in a worker process."""
+
+    @property
+    def func(self):
+        """The function under test."""
+        # "import" is a keyword, so can't be imported with import statement
+        from importlib import import_module
+        return import_module(
+            "moztrap.model.core.management.commands.import"
+            )._import_file_worker
+
+
+    def test_import(self):
+        """Imports the file; returns path, import result and time taken."""
+        pv = self.F.ProductVersionFactory.create()
+        data = {
+            "cases": [{"name": "Foo", "steps": [{"instruction": "do this"}]}]}
+        (fd, path) = mkstemp()
+        with os.fdopen(fd, "w") as fh:
+            fh.write(json.dumps(data))
+
+        try:
+            imported_path, result, seconds = self.func(
+                (pv.id, path, {"stream": True}))
+        finally:
+            os.remove(path)
+
+        self.assertEqual(imported_path, path)
+        self.assertEqual(result.num_cases, 1)
+        self.assertGreaterEqual(seconds, 0)
+        self.assertEqual(
+            self.model.CaseVersion.objects.get().productversion, pv)
@@ -0,0 +1,147 @@
+"""
+Tests for management command to import results.
+
+"""
+from contextlib import contextmanager
+from cStringIO import StringIO
+import json
+import os
+from tempfile import mkstemp
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+from mock import patch
+
+from tests import case
+
+
+
+
+class ImportResultsTest(case.DBTestCase):
+    """Tests for import_results management command."""
+
+    def call_command(self, *args, **kwargs):
+        """
+        Runs the management command and returns (stdout, stderr) output.
+
+        If the command raises ``CommandError``, its message is appended to
+        the stderr output.
+
+        """
+        with patch("sys.stdout", StringIO()) as stdout:
+            with patch("sys.stderr", StringIO()) as stderr:
+                try:
+                    call_command("import_results", *args, **kwargs)
+                except CommandError as e:
+                    stderr.write(str(e))
+
+        stdout.seek(0)
+        stderr.seek(0)
+        return (stdout.read(), stderr.read())
+
+
+    @contextmanager
+    def tempfile(self, records):
+        """Write given records as NDJSON to a temporary file, yield path."""
+        (fd, path) = mkstemp()
+        fh = os.fdopen(fd, "w")
+        for record in records:
+            if isinstance(record, dict):
+                record = json.dumps(record)
+            fh.write(record + "\n")
+        fh.close()
+
+        try:
+            yield path
+        finally:
+            os.remove(path)
+
+
+    def setUp(self):
+        """A run with a case in two environments, and a tester."""
+        self.envs = self.F.EnvironmentFactory.create_full_set(
+            {"OS": ["OS X", "Linux"]})
+        pv = self.F.ProductVersionFactory.create(environments=self.envs)
+        self.run = self.F.RunFactory.create(productversion=pv)
+        self.rcv = self.F.RunCaseVersionFactory.create(
+            run=self.run, caseversion__productversion=pv)
+        self.user = self.F.UserFactory.create(username="tester")
+
+
+    def record(self, env, status, **kwargs):
+        """Return a result record for the case in given env."""
+        kwargs.update(
+            run_id=self.run.id,
+            case=self.rcv.caseversion.case_id,
+            environment=env.id,
+            status=status,
+            )
+        return kwargs
+
+
+    def test_import(self):
+        """Records are imported in order, in batches."""
+        records = [
+            self.record(self.envs[0], "passed"),
+            "",
+            self.record(self.envs[1], "blocked", comment="nope"),
+            self.record(self.envs[0], "failed", comment="broken"),
+            ]
+        with self.tempfile(records) as path:
+            output = self.call_command("tester", path, batch_size=2)
+
+        self.assertEqual(
+            output, ("Imported 3 record(s), 0 error(s).\n", ""))
+        self.assertEqual(
+            set(
+                self.rcv.results.filter(is_latest=True).values_list(
+                    "environment", "status", "comment", "tester")),
+            set([
+                    (self.envs[0].id, "failed", "broken", self.user.id),
+                    (self.envs[1].id, "blocked", "nope", self.user.id),
+                    ])
+            )
+
+
+    def test_errors(self):
+        """Invalid records are reported and skipped, the rest imported."""
+        records = [
+            self.record(self.envs[0], "passed"),
+            "{not json",
+            self.record(self.envs[1], "unknown"),
+            {"run_id": self.run.id},
+            self.record(self.envs[1], "passed"),
+            ]
+        with self.tempfile(records) as path:
+            stdout, stderr = self.call_command("tester", path)
+
+        self.assertEqual(stdout, "Imported 2 record(s), 3 error(s).\n")
+        self.assertIn("Line 2: Could not parse JSON", stderr)
+        self.assertIn("Line 3: bad result object data, unknown status", stderr)
+        self.assertIn(
+            "Line 4: bad result object data missing key: 'case'", stderr)
+        self.assertIn("3 record(s) could not be imported.", stderr)
+        self.assertEqual(self.rcv.results.count(), 2)
+
+
+    def test_no_user(self):
+        """A nonexistent user is an error."""
+        with self.tempfile([]) as path:
+            stdout, stderr = self.call_command("nobody", path)
+
+        self.assertIn('User "nobody" does not exist', stderr)
+
+
+    def test_no_file(self):
+        """A nonexistent file is an error."""
+        stdout, stderr = self.call_command("tester", "does_not_exist")
+
+        self.assertIn('Could not open "does_not_exist"', stderr)
+
+
+    def test_usage(self):
+        """Both username and filename are required."""
+        with patch("sys.stdout", StringIO()):
+            self.assertRaises(
+                CommandError, call_command, "import_results", "tester")
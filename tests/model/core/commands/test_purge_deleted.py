@@ -0,0 +1,132 @@
+"""
+Tests for management command to purge long soft-deleted rows.
+
+"""
+from cStringIO import StringIO
+import datetime
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+from mock import patch
+
+from tests import case
+
+
+
+class PurgeDeletedTest(case.DBTestCase):
+    """Tests for purge_deleted management command."""
+
+    def call_command(self, *args, **kwargs):
+        """Runs the management command and returns stdout output."""
+        with patch("sys.stdout", StringIO()) as stdout:
+            call_command("purge_deleted", *args, **kwargs)
+
+        stdout.seek(0)
+        return stdout.read()
+
+
+    def delete(self, obj, days_ago):
+        """Soft-delete ``obj`` (and its cascade) given number of days ago."""
+        with patch("moztrap.model.mtmodel.utcnow") as mock_utcnow:
+            mock_utcnow.return_value = (
+                datetime.datetime.utcnow() - datetime.timedelta(days=days_ago))
+            obj.delete()
+
+
+    def exists(self, obj):
+        return obj.__class__.everything.filter(pk=obj.pk).exists()
+
+
+    def test_purges_old(self):
+        """Rows deleted before the retention window are removed."""
+        sr = self.F.StepResultFactory.create()
+        self.delete(sr.result, 100)
+
+        output = self.call_command(days=90)
+
+        self.assertFalse(self.exists(sr))
+        self.assertFalse(self.exists(sr.result))
+        self.assertIn("StepResult: 1 row(s) purged", output)
+        self.assertIn("Result: 1 row(s) purged", output)
+        self.assertIn("Purged 2 row(s)", output)
+
+
+    def test_keeps_recent_and_live(self):
+        """Rows deleted recently, or not at all, are kept."""
+        recent = self.F.ResultFactory.create()
+        live = self.F.ResultFactory.create()
+        self.delete(recent, 10)
+
+        self.call_command(days=90)
+
+        self.assertTrue(self.exists(recent))
+        self.assertTrue(self.exists(live))
+
+
+    def test_keeps_referenced(self):
+        """A due row still referenced by rows that aren't due is kept."""
+        r = self.F.ResultFactory.create()
+        self.delete(r.runcaseversion, 100)
+        r.__class__.everything.filter(pk=r.pk).update(deleted_on=None)
+
+        self.call_command(days=90)
+
+        self.assertTrue(self.exists(r))
+        self.assertTrue(self.exists(r.runcaseversion))
+
+
+    def test_batches(self):
+        """Rows are removed in batches of the given size."""
+        results = [self.F.ResultFactory.create() for i in range(3)]
+        for r in results:
+            self.delete(r, 100)
+
+        with patch("moztrap.model.core.management.commands.purge_deleted.time"
+                   ) as mock_time:
+            output = self.call_command(days=90, batch_size=2, sleep=0.5)
+
+        self.assertIn("Result: 3 row(s) purged", output)
+        self.assertEqual(mock_time.sleep.call_count, 2)
+        self.assertFalse(any(self.exists(r) for r in results))
+
+
+    def test_dry_run(self):
+        """With --dry-run, due rows are reported and nothing is removed."""
+        r = self.F.ResultFactory.create()
+        self.delete(r, 100)
+
+        output = self.call_command(days=90, dry_run=True)
+
+        self.assertTrue(self.exists(r))
+        self.assertIn("Result: up to 1 row(s) would be purged", output)
+        self.assertIn("Would purge up to 1 row(s)", output)
+
+
+    def test_bad_days(self):
+        """Negative retention is an error."""
+        with self.assertRaises(CommandError):
+            self.call_command(days=-1)
+
+
+
+class PurgeOrderTest(case.TestCase):
+    """Tests for purge_order."""
+    def test_dependents_first(self):
+        """Models come after the models that cascade to them."""
+        from moztrap.model.core.management.commands.purge_deleted import (
+            purge_order)
+        from moztrap import model
+
+        order = purge_order()
+
+        self.assertLess(
+            order.index(model.StepResult), order.index(model.Result))
+        self.assertLess(
+            order.index(model.Result), order.index(model.RunCaseVersion))
+        self.assertLess(
+            order.index(model.RunCaseVersion), order.index(model.Run))
+        self.assertLess(
+            order.index(model.CaseVersion), order.index(model.Case))
+        self.assertLess(
+            order.index(model.ProductVersion), order.index(model.Product))
@@ -0,0 +1,104 @@
+"""
+Tests for management command to rebuild run result summaries.
+
+"""
+from cStringIO import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+from mock import patch
+
+from tests import case
+
+
+
+class RebuildResultSummariesTest(case.DBTestCase):
+    """Tests for rebuild_result_summaries management command."""
+
+    def call_command(self, *args, **kwargs):
+        """Runs the management command and returns stdout output."""
+        with patch("sys.stdout", StringIO()) as stdout:
+            call_command("rebuild_result_summaries", *args, **kwargs)
+
+        stdout.seek(0)
+        return stdout.read()
+
+
+    def setUp(self):
+        """A run with one passed result."""
+        self.result = self.F.ResultFactory(status="passed")
+        self.rcv = self.result.runcaseversion
+        self.rcv.environments.add(self.result.environment)
+        self.run = self.rcv.run
+
+
+    def test_rebuild(self):
+        """Rebuilds summaries from results and reports them matching."""
+        output = self.call_command()
+
+        self.assertIn("Rebuilt result summaries for 1 run(s)", output)
+        self.assertIn("Result summaries of 1 run(s) match results.", output)
+        self.assertEqual(
+            self.model.RunResultSummary.counts(self.run),
+            {"_total": 1, "_completed": 1, "passed": 1},
+            )
+
+
+    def test_check(self):
+        """With --check, mismatches are reported and nothing is changed."""
+        with self.assertRaises(CommandError):
+            self.call_command(check=True)
+
+        self.assertEqual(
+            self.model.RunResultSummary.counts(self.run),
+            {"_completed": 1, "passed": 1},
+            )
+
+
+    def test_check_statuses(self):
+        """With --check, mismatched current statuses are reported."""
+        self.model.RunCaseVersionStatus.objects.all().delete()
+
+        with patch("sys.stdout", StringIO()) as stdout:
+            with self.assertRaises(CommandError):
+                call_command("rebuild_result_summaries", check=True)
+
+        stdout.seek(0)
+        self.assertIn(
+            "Runcaseversion {0}, environment {1}: status None, "
+            "results passed".format(
+                self.rcv.id, self.result.environment.id),
+            stdout.read(),
+            )
+
+
+    def test_rebuild_statuses(self):
+        """Rebuilds current statuses from results."""
+        self.model.RunCaseVersionStatus.objects.all().delete()
+
+        self.call_command()
+
+        self.assertEqual(
+            list(
+                self.model.RunCaseVersionStatus.objects.values_list(
+                    "runcaseversion", "status")),
+            [(self.rcv.id, "passed")],
+            )
+
+
+    def test_specific_runs(self):
+        """Only runs given as arguments are rebuilt."""
+        other = self.F.RunFactory()
+
+        output = self.call_command(str(other.id))
+
+        self.assertIn("Rebuilt result summaries for 1 run(s)", output)
+        self.assertNotIn(
+            "_total", self.model.RunResultSummary.counts(self.run))
+
+
+    def test_bad_run_id(self):
+        """Non-integer run ids are an error."""
+        with self.assertRaises(CommandError):
+            self.call_command("foo")
@@ -52,3 +52,52 @@ class ProductTest(case.DBTestCase):
 
         self.assertEqual(self.refresh(v1).order, 1)
         self.assertEqual(self.refresh(v2).order, 2)
+
+
+    def test_reorder_versions_sets_latest_caseversions(self):
+        """reorder_versions marks latest caseversion of each case."""
+        p = self.F.ProductFactory()
+        v1 = self.F.ProductVersionFactory(product=p, version="1")
+        v2 = self.F.ProductVersionFactory(product=p, version="2")
+        cv1a = self.F.CaseVersionFactory(productversion=v1)
+        cv2a = self.F.CaseVersionFactory(productversion=v2, case=cv1a.case)
+        cv1b = self.F.CaseVersionFactory(productversion=v1)
+
+        # renaming the earlier version makes it the latest one
+        v1 = self.refresh(v1)
+        v1.version = "3"
+        v1.save()
+
+        self.assertEqual(self.refresh(v1).order, 2)
+        self.assertEqual(self.refresh(v1).latest, True)
+        self.assertEqual(self.refresh(v2).latest, False)
+        self.assertEqual(self.refresh(cv1a).latest, True)
+        self.assertEqual(self.refresh(cv2a).latest, False)
+        self.assertEqual(self.refresh(cv1b).latest, True)
+
+
+    def test_reorder_versions_query_count(self):
+        """
+        reorder_versions takes the same number of queries for any cases.
+
+        Query 1: the versions; 2: update them; 3: caseversions no longer
+        latest; 4: caseversions now latest.
+
+        """
+        p = self.F.ProductFactory()
+        v1 = self.F.ProductVersionFactory(product=p, version="1")
+        v2 = self.F.ProductVersionFactory(product=p, version="2")
+        for i in range(3):
+            cv = self.F.CaseVersionFactory(productversion=v1)
+            self.F.CaseVersionFactory(productversion=v2, case=cv.case)
+
+        with self.assertNumQueries(4):
+            p.reorder_versions()
+
+
+    def test_reorder_versions_no_versions(self):
+        """reorder_versions of a product with no versions does nothing."""
+        p = self.F.ProductFactory()
+
+        with self.assertNumQueries(1):
+            p.reorder_versions()
@@ -5,6 +5,8 @@ Tests for ProductVersion model.
 from datetime import datetime
 
 from django.core.exceptions import ValidationError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 from mock import patch
 
@@ -273,3 +275,63 @@ class SortByVersionTest(case.DBTestCase):
     def test_pre_release(self):
         """Alpha strings prior to "final" are pre-release versions."""
         self.assertOrder("1.1a", "1.1")
+
+
+
+class AddEnvsTest(case.DBTestCase):
+    """Tests for set-based cascade of environment additions."""
+    def test_cascade(self):
+        """Env added to draft runs and non-narrowed caseversions only."""
+        envs = self.F.EnvironmentFactory.create_full_set(
+            {"OS": ["OS X", "Linux"]})
+        pv = self.F.ProductVersionFactory.create(environments=envs[1:])
+        cvs = [self.F.CaseVersionFactory.create(productversion=pv)
+               for i in range(3)]
+        narrowed = self.F.CaseVersionFactory.create(
+            productversion=pv, envs_narrowed=True)
+        draft = self.F.RunFactory.create(productversion=pv)
+        active = self.F.RunFactory.create(productversion=pv, status="active")
+
+        pv.add_envs(envs[0])
+
+        self.assertEqual(set(pv.environments.all()), set(envs))
+        for cv in cvs:
+            self.assertEqual(set(cv.environments.all()), set(envs))
+        self.assertEqual(set(draft.environments.all()), set(envs))
+        self.assertEqual(set(narrowed.environments.all()), set(envs[1:]))
+        self.assertEqual(set(active.environments.all()), set(envs[1:]))
+
+
+    def test_no_duplicates(self):
+        """Adding an env some objects already have doesn't duplicate it."""
+        envs = self.F.EnvironmentFactory.create_full_set(
+            {"OS": ["OS X", "Linux"]})
+        pv = self.F.ProductVersionFactory.create(environments=envs[1:])
+        cv = self.F.CaseVersionFactory.create(productversion=pv)
+        cv.environments.add(envs[0])
+
+        pv.add_envs(*[e.id for e in envs])
+
+        through = self.model.CaseVersion.environments.through
+        self.assertEqual(
+            through.objects.filter(caseversion=cv).count(), len(envs))
+
+
+    def test_query_count(self):
+        """Number of queries doesn't depend on number of caseversions."""
+        envs = self.F.EnvironmentFactory.create_full_set(
+            {"OS": ["OS X", "Linux"]})
+        pvs = [self.F.ProductVersionFactory.create(environments=envs[1:])
+               for i in range(2)]
+        for i, pv in enumerate(pvs):
+            for j in range(1 + i * 5):
+                self.F.CaseVersionFactory.create(productversion=pv)
+            self.F.RunFactory.create(productversion=pv)
+
+        counts = []
+        for pv in pvs:
+            with CaptureQueriesContext(connection) as ctx:
+                pv.add_envs(envs[0])
+            counts.append(len(ctx.captured_queries))
+
+        self.assertEqual(counts[0], counts[1])
@@ -325,3 +325,33 @@ class EnvironmentResourceTest(ApiCrudCases):
 
         # check that it made the right number of environments
         self._test_filter_list_by(u'profile', self.profile_fixture.id, 27)
+
+
+    def test_filter_by_element_set(self):
+        """element_set finds environments with exactly those elements."""
+        envs = self.F.EnvironmentFactory.create_set(
+            ["OS", "Language"], ["OS X", "English"], ["Linux", "English"])
+        english, linux = envs[1].ordered_elements()
+        run = self.F.RunFactory.create(environments=envs[1:])
+
+        for params, expected in [
+                ({"element_set": [linux.id, english.id]}, [envs[1]]),
+                ({"element_set": ["linux", "English"]}, [envs[1]]),
+                ({"element_set": ["Linux"]}, []),
+                ({"element_set": ["Linux", "English"], "run": run.id},
+                 [envs[1]]),
+                ({"element_set": ["OS X", "English"], "run": run.id}, []),
+                ]:
+            res = self.get_list(params=params)
+            self.assertEqual(
+                [o["id"] for o in res.json["objects"]],
+                [e.id for e in expected],
+                )
+
+
+    def test_filter_by_element_set_bad_run(self):
+        """A run that isn't the id of a run is a bad request."""
+        res = self.get_list(
+            params={"element_set": ["Linux"], "run": "foo"}, status=400)
+
+        self.assertEqual(res.text, "run must be the id of an existing run.")
@@ -98,3 +98,170 @@ class EnvironmentTest(case.DBTestCase):
         env = self.refresh(env)
         self.assertEqual(env.profile, None)
         self.assertEqual(env.modified_by, u)
+
+
+
+class ElementNamesTest(case.DBTestCase):
+    """Tests for cached element names of environments."""
+    def env(self):
+        """Return an environment with an OS and a Language element."""
+        return self.F.EnvironmentFactory.create_full_set(
+            {"OS": ["OS X"], "Language": ["English"]})[0]
+
+
+    def test_element_names(self):
+        """element_names are element names in category name order."""
+        e = self.env()
+
+        self.assertEqual(e.element_names, [u"English", u"OS X"])
+
+
+    def test_cached(self):
+        """Names of a given environment are only queried once."""
+        e = self.env()
+        self.model.Environment.element_names_for([e.id])
+        e = self.refresh(e)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(e.element_names, [u"English", u"OS X"])
+
+
+    def test_bulk(self):
+        """fetch_element_names fetches names of many environments at once."""
+        envs = self.F.EnvironmentFactory.create_set(
+            ["OS", "Language"], ["OS X", "English"], ["Linux", "German"])
+
+        with self.assertNumQueries(1):
+            self.model.Environment.fetch_element_names(envs)
+            names = [e.element_names for e in envs]
+
+        self.assertEqual(names, [[u"English", u"OS X"], [u"German", u"Linux"]])
+
+
+    def test_element_renamed(self):
+        """Renaming an element changes the names of its environments."""
+        e = self.env()
+        e.element_names
+        el = e.elements.get(name="OS X")
+        el.name = "Linux"
+        el.save()
+
+        self.assertEqual(self.refresh(e).element_names, [u"English", u"Linux"])
+
+
+    def test_element_added(self):
+        """Adding an element changes the names, even of the same instance."""
+        e = self.env()
+        e.element_names
+
+        e.elements.add(self.F.ElementFactory.create(
+                name="Firefox",
+                category=self.F.CategoryFactory.create(name="Browser")))
+
+        self.assertEqual(e.element_names, [u"Firefox", u"English", u"OS X"])
+
+
+
+class FingerprintTest(case.DBTestCase):
+    """Tests for the maintained element-set fingerprint of environments."""
+    def elements(self):
+        """Return an OS element and a Language element."""
+        os = self.F.ElementFactory.create(
+            name="OS X", category=self.F.CategoryFactory.create(name="OS"))
+        lang = self.F.ElementFactory.create(
+            name="English",
+            category=self.F.CategoryFactory.create(name="Language"))
+        return os, lang
+
+
+    def test_add_remove_clear(self):
+        """Fingerprint follows changes to an environment's elements."""
+        os, lang = self.elements()
+        env = self.F.EnvironmentFactory.create()
+        fp = self.model.Environment.fingerprint_for
+
+        env.elements.add(os, lang)
+        self.assertEqual(self.refresh(env).fingerprint, fp([lang.id, os.id]))
+
+        env.elements.remove(lang)
+        self.assertEqual(self.refresh(env).fingerprint, fp([os.id]))
+
+        env.elements.clear()
+        self.assertEqual(self.refresh(env).fingerprint, fp([]))
+
+
+    def test_reverse_clear(self):
+        """Clearing an element's environments updates their fingerprints."""
+        os, lang = self.elements()
+        env = self.F.EnvironmentFactory.create()
+        env.elements.add(os, lang)
+
+        lang.environments.clear()
+
+        self.assertEqual(
+            self.refresh(env).fingerprint,
+            self.model.Environment.fingerprint_for([os.id]))
+
+
+    def test_generate(self):
+        """Generated environments get their fingerprints."""
+        os, lang = self.elements()
+
+        p = self.model.Profile.generate("Foo", os, lang)
+
+        self.assertEqual(
+            p.environments.get().fingerprint,
+            self.model.Environment.fingerprint_for([os.id, lang.id]))
+
+
+    def test_clone(self):
+        """A cloned environment has the same fingerprint."""
+        os, lang = self.elements()
+        env = self.F.EnvironmentFactory.create()
+        env.elements.add(os, lang)
+
+        clone = env.clone()
+
+        self.assertEqual(
+            self.refresh(clone).fingerprint, self.refresh(env).fingerprint)
+
+
+    def test_matching_ids(self):
+        """Environments with exactly the given element ids match."""
+        os, lang = self.elements()
+        both = self.F.EnvironmentFactory.create()
+        both.elements.add(os, lang)
+        just_os = self.F.EnvironmentFactory.create()
+        just_os.elements.add(os)
+
+        self.assertEqual(
+            list(self.model.Environment.matching([lang.id, os.id])), [both])
+        self.assertEqual(
+            list(self.model.Environment.matching([str(os.id)])), [just_os])
+
+
+    def test_matching_names(self):
+        """Element names match case-insensitively."""
+        os, lang = self.elements()
+        env = self.F.EnvironmentFactory.create()
+        env.elements.add(os, lang)
+
+        self.assertEqual(
+            list(self.model.Environment.matching(["os x", "English"])), [env])
+        self.assertEqual(
+            list(self.model.Environment.matching(["OS X", "French"])), [])
+
+
+    def test_matching_within(self):
+        """With ``within``, only that object's environments match."""
+        os, lang = self.elements()
+        envs = []
+        for i in range(2):
+            env = self.F.EnvironmentFactory.create()
+            env.elements.add(os, lang)
+            envs.append(env)
+        pv = self.F.ProductVersionFactory.create(environments=[envs[1]])
+
+        self.assertEqual(
+            list(self.model.Environment.matching([os.id, lang.id], pv)),
+            [envs[1]])
@@ -24,3 +24,65 @@ class HasEnvironmentsModelTest(case.TestCase):
     def test_cascade_envs_to(self):
         """cascade_envs_to returns empty dict in base class."""
         self.assertEqual(self.model_class.cascade_envs_to([], True), {})
+
+
+
+class EnvironmentMatrixTest(case.DBTestCase):
+    """Tests for environment matrices of objects with environments."""
+    def test_build(self):
+        """Matrix has categories, elements and element ids of each env."""
+        envs = self.F.EnvironmentFactory.create_set(
+            ["OS", "Browser"], ["OS X", "Safari"], ["Windows", "IE"])
+        envs.append(self.F.EnvironmentFactory.create())
+        envs[2].elements.add(self.model.Element.objects.get(name="Windows"))
+        osx, safari, windows, ie = [
+            self.model.Element.objects.get(name=n)
+            for n in ["OS X", "Safari", "Windows", "IE"]]
+
+        m = self.model.EnvironmentMatrix.build(
+            self.model.Environment.objects.all())
+
+        self.assertEqual(
+            m.categories,
+            [(safari.category.id, "Browser"), (osx.category.id, "OS")],
+            )
+        self.assertEqual(
+            m.elements,
+            [
+                [(ie.id, "IE"), (safari.id, "Safari")],
+                [(osx.id, "OS X"), (windows.id, "Windows")],
+                ],
+            )
+        self.assertEqual(m.env_ids, [e.id for e in envs])
+        self.assertEqual(
+            m.rows,
+            [[safari.id, osx.id], [ie.id, windows.id], [None, windows.id]],
+            )
+        self.assertEqual(m.row(envs[1].id), [ie.id, windows.id])
+        self.assertIsNone(m.row(0))
+        self.assertEqual(m.matches([windows.id]), [envs[2].id])
+
+
+    def test_cached(self):
+        """An object's matrix is only built once."""
+        envs = self.F.EnvironmentFactory.create_full_set(
+            {"OS": ["OS X", "Linux"]})
+        r = self.F.RunFactory.create(environments=envs)
+        r.environment_matrix()
+
+        with self.assertNumQueries(0):
+            m = r.environment_matrix()
+
+        self.assertEqual(m.env_ids, [e.id for e in envs])
+
+
+    def test_environments_changed(self):
+        """An object's matrix changes with its environments."""
+        envs = self.F.EnvironmentFactory.create_full_set(
+            {"OS": ["OS X", "Linux"]})
+        r = self.F.RunFactory.create(environments=envs)
+        r.environment_matrix()
+
+        r.remove_envs(envs[0])
+
+        self.assertEqual(r.environment_matrix().env_ids, [envs[1].id])
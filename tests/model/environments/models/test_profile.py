@@ -43,6 +43,63 @@ class ProfileTest(case.DBTestCase):
             )
 
 
+    def elements(self, **counts):
+        """Create ``counts[category]`` elements in each named category."""
+        elements = []
+        for name, count in sorted(counts.items()):
+            category = self.F.CategoryFactory.create(name=name)
+            elements.extend(
+                self.F.ElementFactory.create(
+                    name="{0} {1}".format(name, i), category=category)
+                for i in range(count)
+                )
+        return elements
+
+
+    def test_generate_batches(self):
+        """Combinations are created in batches, reporting progress."""
+        elements = self.elements(OS=3, Browser=2)
+        progress = []
+
+        p = self.model.Profile.generate(
+            "Foo",
+            *elements,
+            batch_size=4,
+            progress=lambda done, total: progress.append((done, total))
+            )
+
+        self.assertEqual(progress, [(0, 6), (4, 6), (6, 6)])
+        envs = list(p.environments.all())
+        self.assertEqual(len(envs), 6)
+        self.assertEqual(
+            len(set(frozenset(e.elements.all()) for e in envs)), 6)
+        for env in envs:
+            self.assertEqual(
+                set(el.category.name for el in env.elements.all()),
+                set(["OS", "Browser"]))
+
+
+    def test_generate_too_large(self):
+        """Exceeding max_environments raises before creating anything."""
+        elements = self.elements(OS=3, Browser=2)
+
+        with self.assertRaises(self.model.ProfileTooLarge):
+            self.model.Profile.generate("Foo", *elements, max_environments=5)
+
+        self.assertEqual(self.model.Profile.everything.count(), 0)
+        self.assertEqual(self.model.Environment.everything.count(), 0)
+
+
+    def test_count_combinations(self):
+        """Number of combinations is product of elements per category."""
+        elements = self.elements(A=2, B=3, C=4)
+
+        self.assertEqual(
+            self.model.Profile.count_combinations(*elements), 24)
+        self.assertEqual(
+            self.model.Profile.count_combinations(*(elements + elements)), 24)
+
+
     def test_clone(self):
         """Cloning a profile prefixes name with 'Cloned'."""
         p = self.F.ProfileFactory.create(name="Foo")
@@ -2,6 +2,8 @@
 Tests for Result model.
 
 """
+from mock import patch
+
 from tests import case
 
 
@@ -67,3 +69,269 @@ class ResultTest(case.DBTestCase):
         self.assertEqual(r2.status, "failed")
         self.assertEqual(r2.is_latest, True)
         self.assertEqual(r1.is_latest, False)
+
+
+    def assertSummaryCurrent(self, run):
+        """Assert that stored result summary counts of ``run`` are live."""
+        S = self.model.RunResultSummary
+        stored = dict(
+            ((r, e, s), c) for r, e, s, c
+            in S.objects.filter(run=run, count__gt=0).values_list(
+                "run", "environment", "status", "count")
+            )
+        self.assertEqual(stored, S.live([run.id]))
+
+
+    def test_edit_status_updates_summary(self):
+        """Editing an existing result's status updates the run summary."""
+        r = self.F.ResultFactory.create(status="passed")
+        run = r.runcaseversion.run
+
+        r.status = "failed"
+        r.save()
+
+        self.assertSummaryCurrent(run)
+        self.assertEqual(
+            self.model.RunResultSummary.counts(run).get("failed"), 1)
+
+
+    def test_set_latest_existing_updates_summary(self):
+        """set_latest and save of an existing result update the summary."""
+        r1 = self.F.ResultFactory.create(status="passed")
+        r2 = self.F.ResultFactory.create(
+            status="failed",
+            runcaseversion=r1.runcaseversion,
+            environment=r1.environment,
+            tester=r1.tester,
+            )
+        run = r1.runcaseversion.run
+        # simulate duplicate latest results
+        self.model.Result.objects.filter(pk=r1.pk).update(is_latest=True)
+        self.model.RunResultSummary.rebuild([run.id])
+
+        r2.set_latest()
+        r2.save()
+
+        self.assertSummaryCurrent(run)
+        self.assertEqual(
+            self.model.RunResultSummary.counts(run).get("passed", 0), 0)
+
+
+    def test_edit_comment_keeps_summary(self):
+        """Editing a field the summary doesn't depend on doesn't recount."""
+        r = self.F.ResultFactory.create(status="passed")
+        r.comment = "changed"
+
+        with patch(
+                "moztrap.model.execution.models.RunResultSummary.rebuild"
+                ) as rebuild:
+            r.save()
+
+        self.assertFalse(rebuild.called)
+
+
+
+class RecordResultsTest(case.DBTestCase):
+    """Tests for bulk recording of submitted results."""
+    def setUp(self):
+        """A run with two cases in two environments, and a tester."""
+        self.envs = self.F.EnvironmentFactory.create_full_set(
+            {"OS": ["OS X", "Linux"]})
+        pv = self.F.ProductVersionFactory.create(environments=self.envs)
+        self.run = self.F.RunFactory.create(productversion=pv)
+        self.rcvs = [
+            self.F.RunCaseVersionFactory.create(
+                run=self.run, caseversion__productversion=pv)
+            for i in range(2)
+            ]
+        self.step = self.F.CaseStepFactory.create(
+            caseversion=self.rcvs[1].caseversion, number=1)
+        self.user = self.F.UserFactory.create()
+
+
+    def record(self, *items):
+        from moztrap.model.execution.models import record_results
+        return record_results(
+            [
+                dict(
+                    run_id=self.run.id,
+                    case=rcv.caseversion.case_id,
+                    environment=env.id,
+                    status=status,
+                    **extra
+                    )
+                for rcv, env, status, extra in items
+                ],
+            self.user,
+            batch_size=3,
+            )
+
+
+    def test_latest(self):
+        """Only the last result for a case/env is latest, across batches."""
+        self.F.ResultFactory.create(
+            runcaseversion=self.rcvs[0], environment=self.envs[0],
+            tester=self.user, status="started")
+        self.record(
+            (self.rcvs[0], self.envs[0], "passed", {}),
+            (self.rcvs[0], self.envs[1], "blocked", {"comment": "no"}),
+            (self.rcvs[1], self.envs[0], "invalidated", {}),
+            (self.rcvs[0], self.envs[0], "failed", {}),
+            )
+
+        latest = self.model.Result.objects.filter(is_latest=True)
+        self.assertEqual(
+            set(latest.values_list(
+                    "runcaseversion", "environment", "status", "comment")),
+            set([
+                    (self.rcvs[0].id, self.envs[0].id, "failed", ""),
+                    (self.rcvs[0].id, self.envs[1].id, "blocked", "no"),
+                    (self.rcvs[1].id, self.envs[0].id, "invalidated", ""),
+                    ])
+            )
+        self.assertEqual(self.model.Result.objects.count(), 5)
+
+
+    def test_skip_all_envs(self):
+        """A skipped result is recorded for all environments of the case."""
+        self.record((self.rcvs[0], self.envs[0], "skipped", {}))
+
+        self.assertEqual(
+            set(self.rcvs[0].results.values_list("environment", "status")),
+            set([(e.id, "skipped") for e in self.envs]),
+            )
+
+
+    def test_failed_step(self):
+        """A failed result with a step number gets a step result."""
+        self.record(
+            (self.rcvs[1], self.envs[0], "failed", {}),
+            (self.rcvs[1], self.envs[1], "failed",
+             {"stepnumber": 1, "bug": "http://example.com/1"}),
+            )
+
+        r = self.model.Result.objects.get(
+            runcaseversion=self.rcvs[1], environment=self.envs[1])
+        self.assertEqual(
+            list(r.stepresults.values_list("step", "status", "bug_url")),
+            [(self.step.id, "failed", "http://example.com/1")],
+            )
+        self.assertEqual(
+            self.model.StepResult.objects.count(), 1)
+
+
+    def test_failed_step_string_number(self):
+        """A step number given as a string still gets a step result."""
+        self.record(
+            (self.rcvs[1], self.envs[0], "failed",
+             {"stepnumber": "1", "bug": "http://example.com/1"}),
+            )
+
+        self.assertEqual(
+            list(
+                self.model.StepResult.objects.values_list(
+                    "step", "bug_url")),
+            [(self.step.id, "http://example.com/1")],
+            )
+
+
+    def test_failed_step_bad_number(self):
+        """A non-numeric step number is a validation error."""
+        from django.core.exceptions import ValidationError
+
+        with self.assertRaises(ValidationError):
+            self.record(
+                (self.rcvs[1], self.envs[0], "failed", {"stepnumber": "one"}),
+                )
+
+        self.assertEqual(self.model.Result.objects.count(), 0)
+
+
+    def test_failed_steps_same_env(self):
+        """Step results go to the right one of several results for an env."""
+        self.record(
+            (self.rcvs[1], self.envs[0], "failed",
+             {"stepnumber": 1, "bug": "http://example.com/1"}),
+            (self.rcvs[1], self.envs[0], "passed", {}),
+            (self.rcvs[1], self.envs[0], "failed",
+             {"stepnumber": 1, "bug": "http://example.com/2"}),
+            )
+
+        self.assertEqual(
+            list(
+                self.model.StepResult.objects.order_by("id").values_list(
+                    "result__status", "result__is_latest", "bug_url")),
+            [
+                ("failed", False, "http://example.com/1"),
+                ("failed", True, "http://example.com/2"),
+                ],
+            )
+
+
+    def test_failed_step_concurrent(self):
+        """Raises RuntimeError if others' results can't be told apart."""
+        from moztrap.model.mtmodel import MTQuerySet
+        bulk_create = MTQuerySet.bulk_create
+        F = self.F
+
+        def bulk_create_and_more(qs, objs, *args, **kwargs):
+            ret = bulk_create(qs, objs, *args, **kwargs)
+            if objs and isinstance(objs[0], self.model.Result):
+                F.ResultFactory.create(
+                    runcaseversion=objs[0].runcaseversion,
+                    environment=objs[0].environment,
+                    tester=objs[0].tester,
+                    status="failed",
+                    )
+            return ret
+
+        with patch.object(MTQuerySet, "bulk_create", bulk_create_and_more):
+            with self.assertRaises(RuntimeError):
+                self.record(
+                    (self.rcvs[1], self.envs[0], "failed", {"stepnumber": 1}),
+                    )
+
+        self.assertEqual(self.model.StepResult.objects.count(), 0)
+
+
+    def test_summary(self):
+        """Run result summary counts are kept current."""
+        self.F.ResultFactory.create(
+            runcaseversion=self.rcvs[0], environment=self.envs[0],
+            status="passed")
+        self.record(
+            (self.rcvs[0], self.envs[0], "passed", {}),
+            (self.rcvs[1], self.envs[0], "failed", {}),
+            (self.rcvs[0], self.envs[0], "skipped", {}),
+            )
+
+        S = self.model.RunResultSummary
+        stored = dict(
+            ((r, e, s), c) for r, e, s, c
+            in S.objects.filter(count__gt=0).values_list(
+                "run", "environment", "status", "count")
+            )
+        self.assertEqual(stored, S.live([self.run.id]))
+        self.assertEqual(self.run.completion(), 1.0)
+
+
+    def test_invalid(self):
+        """Nothing is recorded if any item doesn't resolve to a case/env."""
+        from django.core.exceptions import ValidationError
+        other = self.F.EnvironmentFactory.create()
+
+        with self.assertRaises(ValidationError):
+            self.record(
+                (self.rcvs[0], self.envs[0], "passed", {}),
+                (self.rcvs[1], other, "passed", {}),
+                )
+
+        self.assertEqual(self.model.Result.objects.count(), 0)
+
+
+    def test_unknown_status(self):
+        """An unknown status is a validation error."""
+        from django.core.exceptions import ValidationError
+
+        with self.assertRaises(ValidationError):
+            self.record((self.rcvs[0], self.envs[0], "started", {}))
@@ -666,10 +666,25 @@ class RunActivationTest(case.DBTestCase):
         """
         Count number of queries needed for activation of complex run.
 
+        The number of queries is constant; it does not depend on the number
+        of suites, cases or environments in the run.
+
         Queries explained:
         ------------------
 
-        Query 1: Get the environment ids from this run
+        Query 1-2: Snapshot the lock watermark: an aggregate over the
+            caseversions that could be in the run, and one query of scalar
+            subqueries over run suites, suites, suite cases and environments.
+
+            "SELECT COUNT(`library_caseversion`.`id`) AS `count`,
+            MAX(`library_caseversion`.`modified_on`) AS `modified_on`,
+            SUM(`library_caseversion`.`cc_version`) AS `cc_version` FROM
+            `library_caseversion` WHERE ...",
+
+            "SELECT (SELECT COUNT(*) FROM execution_runsuite
+            WHERE run_id = 1), ...",
+
+        Query 3: Get the environment ids from this run
 
             "SELECT `environments_environment`.`id` FROM
             `environments_environment` INNER JOIN
@@ -678,10 +693,10 @@ class RunActivationTest(case.DBTestCase):
              `environments_environment`.`deleted_on` IS NULL AND
              `execution_run_environments`.`run_id` = 1 )",
 
-        Query 2: Get the caseversion ids that SHOULD be included in this run,
+        Query 4: Get the caseversion ids that SHOULD be included in this run,
             in order
 
-            "SELECT DISTINCT cv.id as id
+            "SELECT DISTINCT cv.id as id, rs.`order`, sc.`order`
             FROM execution_run as r
                 INNER JOIN execution_runsuite as rs
                     ON rs.run_id = r.id
@@ -695,193 +710,98 @@ class RunActivationTest(case.DBTestCase):
                 INNER JOIN library_caseversion_environments as cve
                     ON cv.id = cve.caseversion_id
             WHERE cv.status = 'active'
+                AND cv.deleted_on IS NULL
                 AND s.status = 'active'
                 AND rs.run_id = 1
                 AND cve.environment_id IN (1,2,3,4)
-            ORDER BY rs.order, sc.order
+            ORDER BY rs.`order`, sc.`order`
             ",
 
-        Query 3-6: Get all the runcaseversions that are not in the result of
-         Query 2
-            to be used for delete. and then delete them.
+        Query 5: Get the existing runcaseversions, with the id of their
+            latest result (used to pick a survivor among duplicates).
 
             "SELECT `execution_runcaseversion`.`id`,
-            `execution_runcaseversion`.`created_on`,
-            `execution_runcaseversion`.`created_by_id`,
-            `execution_runcaseversion`.`modified_on`,
-            `execution_runcaseversion`.`modified_by_id`,
-            `execution_runcaseversion`.`deleted_on`,
-            `execution_runcaseversion`.`deleted_by_id`,
-            `execution_runcaseversion`.`cc_version`,
-            `execution_runcaseversion`.`run_id`, `execution_runcaseversion`
-            .`caseversion_id`, `execution_runcaseversion`.`order` FROM
-            `execution_runcaseversion` WHERE (`execution_runcaseversion`
-            .`deleted_on` IS NULL AND `execution_runcaseversion`.`run_id` =
-            1  AND NOT (`execution_runcaseversion`.`caseversion_id` IN (2,
-            3, 4, 5, 6, 7))) ORDER BY `execution_runcaseversion`.`order` ASC",
-
-            "SELECT `execution_result`.`id`, `execution_result`
-            .`created_on`, `execution_result`.`created_by_id`,
-            `execution_result`.`modified_on`,
-            `execution_result`.`modified_by_id`,
-            `execution_result`.`deleted_on`, `execution_result`
-            .`deleted_by_id`, `execution_result`.`cc_version`,
-            `execution_result`.`tester_id`, `execution_result`
-            .`runcaseversion_id`, `execution_result`.`environment_id`,
-            `execution_result`.`status`, `execution_result`.`comment`,
-            `execution_result`.`is_latest`, `execution_result`.`review`,
-            `execution_result`.`reviewed_by_id` FROM `execution_result`
-            WHERE `execution_result`.`runcaseversion_id` IN (1)",
-
-            "DELETE FROM `execution_runcaseversion_environments` WHERE
-            `runcaseversion_id` IN (1)",
-
-            "DELETE FROM `execution_runcaseversion` WHERE `id` IN (1)",
-
-        Query 7: find duplicates in the existing rcvs, if they exist
-
-            SELECT `execution_runcaseversion`.`caseversion_id`,
-            COUNT(`execution_runcaseversion`.`caseversion_id`) AS
-            `num_records` FROM `execution_runcaseversion` WHERE (
-            `execution_runcaseversion`.`deleted_on` IS NULL AND
-            `execution_runcaseversion`.`run_id` = 8 ) GROUP BY
-            `execution_runcaseversion`.`caseversion_id` HAVING COUNT(
-            `execution_runcaseversion`.`caseversion_id`) > 1  ORDER BY
-            `execution_runcaseversion`.`order` ASC
-
-        Query 8: Get existing runcaseversions with the caseversion ids so we
-         can use
-            Them to build the new RunCaseVersion objects we will only be
-            updated
-            with order in the bulk create.
+            `execution_runcaseversion`.`caseversion_id`,
+            `execution_runcaseversion`.`order`,
+            MAX(`execution_result`.`id`) AS `latest_result` FROM
+            `execution_runcaseversion` LEFT OUTER JOIN `execution_result` ON
+            (`execution_runcaseversion`.`id` =
+            `execution_result`.`runcaseversion_id`) WHERE
+            (`execution_runcaseversion`.`deleted_on` IS NULL AND
+            `execution_runcaseversion`.`run_id` = 1 ) GROUP BY ...",
 
-            "SELECT `execution_runcaseversion`.`id`,
-            `execution_runcaseversion`.`caseversion_id` FROM
-            `execution_runcaseversion` WHERE (`execution_runcaseversion`
-            .`deleted_on` IS NULL AND `execution_runcaseversion`.`run_id` =
-            1 ) ORDER BY `execution_runcaseversion`.`order` ASC",
+        Query 6-9: Permanently delete the runcaseversions not in the result of
+            Query 4 (and duplicates), cascading to step results, results and
+            runcaseversion environments.
 
-        Query 9: update order on existing rcvs
+            "DELETE FROM execution_stepresult WHERE result_id IN
+            (SELECT id FROM execution_result WHERE runcaseversion_id IN (1))",
 
-            "UPDATE `execution_runcaseversion` SET `modified_on` =
-            '2013-03-15 01:00:08', `modified_by_id` = NULL, `order` = 4,
-            `cc_version` = `execution_runcaseversion`.`cc_version` + 1 WHERE
-             (`execution_runcaseversion`.`deleted_on` IS NULL AND
-             `execution_runcaseversion`.`run_id` = 8  AND
-             `execution_runcaseversion`.`caseversion_id` = 16 )",
+            "DELETE FROM execution_result WHERE runcaseversion_id IN (1)",
 
-        Query 10: bulk insert for RunCaseVersions
+            "DELETE FROM execution_runcaseversion_environments WHERE
+            runcaseversion_id IN (1)",
+
+            "DELETE FROM execution_runcaseversion WHERE id IN (1)",
+
+        Query 10: update order on all existing rcvs that moved
+
+            "UPDATE execution_runcaseversion
+            SET `order` = CASE id WHEN 2 THEN 4 END,
+                modified_on = '2013-03-15 01:00:08',
+                modified_by_id = NULL,
+                cc_version = cc_version + 1
+            WHERE id IN (2)",
+
+        Query 11: bulk insert for RunCaseVersions
 
             "INSERT INTO `execution_runcaseversion` (`created_on`,
             `created_by_id`, `modified_on`, `modified_by_id`, `deleted_on`,
             `deleted_by_id`, `cc_version`, `run_id`, `caseversion_id`,
             `order`) VALUES ('2013-03-15 01:00:08', NULL,
-            '2013-03-15 01:00:08', NULL, NULL, NULL, 0, 8, 13, 1),
-            ('2013-03-15 01:00:08', NULL, '2013-03-15 01:00:08', NULL, NULL,
-             NULL, 0, 8, 14, 2), ('2013-03-15 01:00:08', NULL,
-             '2013-03-15 01:00:08', NULL, NULL, NULL, 0, 8, 15, 3),
-             ('2013-03-15 01:00:08', NULL, '2013-03-15 01:00:08', NULL, NULL,
-             NULL, 0, 8, 17, 5), ('2013-03-15 01:00:08', NULL,
-             '2013-03-15 01:00:08', NULL, NULL, NULL, 0, 8, 18, 6)"
-
-        Query 11: In order to add the runcaseversion_environment records,
-            we need to have all the relevant runcaseversions and prefetch the
-            environments for the caseversions
-
-            "SELECT `execution_runcaseversion`.`id`,
-            `execution_runcaseversion`.`created_on`,
-            `execution_runcaseversion`.`created_by_id`,
-            `execution_runcaseversion`.`modified_on`,
-            `execution_runcaseversion`.`modified_by_id`,
-            `execution_runcaseversion`.`deleted_on`,
-            `execution_runcaseversion`.`deleted_by_id`,
-            `execution_runcaseversion`.`cc_version`,
-            `execution_runcaseversion`.`run_id`, `execution_runcaseversion`
-            .`caseversion_id`, `execution_runcaseversion`.`order`,
-            `library_caseversion`.`id`, `library_caseversion`.`created_on`,
-            `library_caseversion`.`created_by_id`, `library_caseversion`
-            .`modified_on`, `library_caseversion`.`modified_by_id`,
-            `library_caseversion`.`deleted_on`, `library_caseversion`
-            .`deleted_by_id`, `library_caseversion`.`cc_version`,
-            `library_caseversion`.`status`, `library_caseversion`
-            .`productversion_id`, `library_caseversion`.`case_id`,
-            `library_caseversion`.`name`, `library_caseversion`
-            .`description`, `library_caseversion`.`latest`,
-            `library_caseversion`.`envs_narrowed` FROM
-            `execution_runcaseversion` INNER JOIN `library_caseversion` ON (
-            `execution_runcaseversion`.`caseversion_id` =
-            `library_caseversion`.`id`) WHERE (`execution_runcaseversion`
-            .`deleted_on` IS NULL AND `execution_runcaseversion`.`run_id` =
-            1 ) ORDER BY `execution_runcaseversion`.`order` ASC",
-
-        Query 12: This is the prefetch_related query used with Query 9.  Django
-            makes a separate query and links them in-memory.
-
-            "SELECT (`library_caseversion_environments`.`caseversion_id`) AS
-             `_prefetch_related_val`, `environments_environment`.`id`,
-             `environments_environment`.`created_on`,
-             `environments_environment`.`created_by_id`,
-             `environments_environment`.`modified_on`,
-             `environments_environment`.`modified_by_id`,
-             `environments_environment`.`deleted_on`,
-             `environments_environment`.`deleted_by_id`,
-             `environments_environment`.`cc_version`,
-             `environments_environment`.`profile_id` FROM
-             `environments_environment` INNER JOIN
-             `library_caseversion_environments` ON (
-             `environments_environment`.`id` =
-             `library_caseversion_environments`.`environment_id`) WHERE (
-             `environments_environment`.`deleted_on` IS NULL AND
-             `library_caseversion_environments`.`caseversion_id` IN (2, 3,
-             4, 5, 6, 7))",
-
-        Query 13: runcaseversion_environments that already existed that
-        pertain to
-            the runcaseversions that are still relevant.
+            '2013-03-15 01:00:08', NULL, NULL, NULL, 0, 8, 13, 1), ..."
 
-            "SELECT `execution_runcaseversion_environments`
-            .`runcaseversion_id`, `execution_runcaseversion_environments`
-            .`environment_id` FROM `execution_runcaseversion_environments`
-            WHERE `execution_runcaseversion_environments`
-            .`runcaseversion_id` IN (3, 4, 5, 2, 6, 7)",
+        Query 12: Delete runcaseversion environments that are not in both the
+            run and the caseversion anymore.
 
-        Query 14: Get the environments for this run so we can find the
-        intersection
-            with the caseversions.
+            "DELETE FROM execution_runcaseversion_environments
+            WHERE runcaseversion_id IN (
+                SELECT rcv.id FROM execution_runcaseversion as rcv
+                WHERE rcv.run_id = 1 AND rcv.deleted_on IS NULL)
+            AND (
+                environment_id NOT IN (1,2,3,4)
+                OR NOT EXISTS (...))",
 
-            "SELECT `environments_environment`.`id` FROM
-            `environments_environment` INNER JOIN
-            `execution_run_environments` ON (`environments_environment`.`id`
-             = `execution_run_environments`.`environment_id`) WHERE (
-             `environments_environment`.`deleted_on` IS NULL AND
-             `execution_run_environments`.`run_id` = 1 )",
+        Query 13: Insert missing runcaseversion environments.
 
-        Query 15: Find the runcaseversion_environments that are no longer
-        relevant.
+            "INSERT INTO execution_runcaseversion_environments
+            (runcaseversion_id, environment_id)
+            SELECT rcv.id, cve.environment_id
+            FROM execution_runcaseversion as rcv
+                INNER JOIN library_caseversion_environments as cve
+                    ON cve.caseversion_id = rcv.caseversion_id
+            WHERE rcv.run_id = 1
+                AND rcv.deleted_on IS NULL
+                AND cve.environment_id IN (1,2,3,4)
+                AND NOT EXISTS (...)",
 
-            "SELECT `execution_runcaseversion_environments`.`id`,
-            `execution_runcaseversion_environments`.`runcaseversion_id`,
-            `execution_runcaseversion_environments`.`environment_id` FROM
-            `execution_runcaseversion_environments`
-            WHERE ((`execution_runcaseversion_environments`.`runcaseversion_id`
-            = 2  AND `execution_runcaseversion_environments`.`environment_id`
-            = 5 ))",
+        Query 14-15: Rebuild the run's result summary counts.
 
-        Query 16: Delete the runcaseversion_environments that pertained to the
-            caseversion that are no longer relevant.
+            "DELETE FROM execution_runresultsummary WHERE run_id IN (1)",
 
-            "DELETE FROM `execution_runcaseversion_environments` WHERE `id`
-            IN (9)",
+            "INSERT INTO execution_runresultsummary (run_id, environment_id,
+            status, `count`) SELECT rcv.run_id, r.environment_id, r.status,
+            COUNT(*) FROM execution_result r ... UNION ALL ...",
 
-        Query 17: Bulk insert of runcaseversion_environment mappings.
+        Query 16: Store the lock watermark on the run.
 
-            "INSERT INTO `execution_runcaseversion_environments`
-            (`runcaseversion_id`, `environment_id`) VALUES (7, 3), (5, 4),
-            (3, 1), (3, 3), (6, 4), (7, 4), (5, 2), (6, 1), (4, 4), (3, 2),
-            (7, 1), (6, 3), (6, 2), (4, 3), (4, 2), (3, 4), (5, 1), (4, 1),
-            (7, 2), (5, 3)",
+            "UPDATE `execution_run` SET `lock_watermark` = '...',
+            `lock_watermark_on` = '2013-03-15 01:00:08', `cc_version` =
+            `execution_run`.`cc_version` + 1 WHERE
+            (`execution_run`.`deleted_on` IS NULL AND `execution_run`.`id` = 1
+            )",
 
-        Query 18: Update the test run to make it active.
+        Query 17: Update the test run to make it active.
 
             "UPDATE `execution_run` SET `created_on` = '2012-11-20 00:11:25',
             `created_by_id` = NULL, `modified_on` = '2012-11-20 00:11:25',
@@ -892,7 +812,7 @@ class RunActivationTest(case.DBTestCase):
             `is_series` = 0, `series_id` = NULL
             WHERE (`execution_run`.`deleted_on` IS NULL
             AND `execution_run`.`id` = 1
-            AND `execution_run`.`cc_version` = 0 )"
+            AND `execution_run`.`cc_version` = 1 )"
 
         """
 
@@ -957,10 +877,10 @@ class RunActivationTest(case.DBTestCase):
             updates = [x["sql"] for x in connection.queries if x["sql"].startswith("UPDATE")]
             deletes = [x["sql"] for x in connection.queries if x["sql"].startswith("DELETE")]
 
-            self.assertEqual(len(selects), 10)
-            self.assertEqual(len(inserts), 2)
-            self.assertEqual(len(updates), 2)
-            self.assertEqual(len(deletes), 3)
+            self.assertEqual(len(selects), 5)
+            self.assertEqual(len(inserts), 3)
+            self.assertEqual(len(updates), 3)
+            self.assertEqual(len(deletes), 6)
         except AssertionError as e:
             raise e
         finally:
@@ -1069,6 +989,157 @@ class RunActivationTest(case.DBTestCase):
             self.model.Result.objects.count(), 1)
 
 
+    def _active_run_with_cases(self, num=2):
+        """Create and activate a run with ``num`` cases in one suite."""
+        ts = self.F.SuiteFactory.create(product=self.p, status="active")
+        cvs = []
+        for i in range(num):
+            cv = self.F.CaseVersionFactory.create(
+                productversion=self.pv8, status="active")
+            self.F.SuiteCaseFactory.create(suite=ts, case=cv.case, order=i)
+            cvs.append(cv)
+        r = self.F.RunFactory.create(productversion=self.pv8)
+        self.F.RunSuiteFactory.create(suite=ts, run=r)
+        r.activate()
+        return r, ts, cvs
+
+
+    def test_activate_sets_lock_watermark(self):
+        """Activating a run records the lock watermark."""
+        r, ts, cvs = self._active_run_with_cases()
+
+        r = self.refresh(r)
+        self.assertEqual(len(r.lock_watermark), 64)
+        self.assertIsNotNone(r.lock_watermark_on)
+
+
+    def test_refresh_unchanged_is_noop(self):
+        """Refreshing a run with no changes only checks the watermark."""
+        r, ts, cvs = self._active_run_with_cases()
+        r = self.refresh(r)
+
+        with self.assertNumQueries(2):
+            r.refresh()
+
+
+    def test_refresh_edited_caseversion_no_full_lock(self):
+        """Edits that don't change run membership skip the full lock."""
+        r, ts, cvs = self._active_run_with_cases()
+        r = self.refresh(r)
+        cvs[0].name = "Renamed"
+        cvs[0].save()
+
+        with patch.object(Run, "_lock_case_versions") as lock:
+            r.refresh()
+
+        self.assertFalse(lock.called)
+        self.assertCaseVersions(r, cvs)
+
+
+    def test_refresh_deactivated_caseversion_incremental(self):
+        """A caseversion that drops out is removed without a full lock."""
+        r, ts, cvs = self._active_run_with_cases()
+        r = self.refresh(r)
+        cvs[0].deactivate()
+
+        with patch.object(Run, "_lock_case_versions") as lock:
+            r.refresh()
+
+        self.assertFalse(lock.called)
+        self.assertCaseVersions(r, cvs[1:])
+        # and the watermark has caught up
+        with self.assertNumQueries(2):
+            r.refresh()
+
+
+    def test_refresh_added_case(self):
+        """A case added to an included suite is locked in on refresh."""
+        r, ts, cvs = self._active_run_with_cases()
+        r = self.refresh(r)
+        cv = self.F.CaseVersionFactory.create(
+            productversion=self.pv8, status="active")
+        self.F.SuiteCaseFactory.create(suite=ts, case=cv.case, order=5)
+
+        r.refresh()
+
+        self.assertOrderedCaseVersions(r, cvs + [cv])
+
+
+    def test_refresh_activated_caseversion(self):
+        """A caseversion activated in place is locked in on refresh."""
+        r, ts, cvs = self._active_run_with_cases()
+        cvs[0].draft()
+        r.refresh()
+        r = self.refresh(r)
+        self.assertCaseVersions(r, cvs[1:])
+
+        cvs[0].activate()
+        r.refresh()
+
+        self.assertOrderedCaseVersions(r, cvs)
+
+
+    def test_refresh_environment_change(self):
+        """A caseversion environment change is applied on refresh."""
+        r, ts, cvs = self._active_run_with_cases()
+        r = self.refresh(r)
+        cvs[0].environments.remove(self.envs[0])
+
+        r.refresh()
+
+        rcv = r.runcaseversions.get(caseversion=cvs[0])
+        self.assertEqual(set(rcv.environments.all()), set(self.envs[1:]))
+
+
+    def test_refresh_environment_swap(self):
+        """Swapping caseversion environments with equal id sums relocks."""
+        a, b, c, d = sorted(self.envs, key=lambda e: e.id)
+        self.assertEqual(a.id + d.id, b.id + c.id)
+        r, ts, cvs = self._active_run_with_cases()
+        cvs[0].environments.remove(b, c)
+        r.refresh()
+        r = self.refresh(r)
+        cvs[0].environments.remove(a, d)
+        cvs[0].environments.add(b, c)
+
+        r.refresh()
+
+        rcv = r.runcaseversions.get(caseversion=cvs[0])
+        self.assertEqual(set(rcv.environments.all()), set([b, c]))
+
+
+    def test_refresh_first_caseversion(self):
+        """A run locked with no caseversions locks in new ones on refresh."""
+        ts = self.F.SuiteFactory.create(product=self.pv8.product)
+        c = self.F.CaseFactory.create(product=self.pv8.product)
+        self.F.SuiteCaseFactory.create(suite=ts, case=c)
+        r = self.F.RunFactory.create(productversion=self.pv8)
+        self.F.RunSuiteFactory.create(suite=ts, run=r)
+        r.activate()
+        r = self.refresh(r)
+        self.assertIsNone(r.lock_watermark_on)
+        # a caseversion without environments leaves the lock structure as is
+        cv = self.F.CaseVersionFactory.create(
+            case=c, productversion=self.pv8, status="active")
+        cv.environments.clear()
+
+        r.refresh()
+
+        self.assertCaseVersions(r, [])
+        self.assertIsNotNone(self.refresh(r).lock_watermark_on)
+
+
+    def test_refresh_full(self):
+        """Refresh with ``full=True`` always does a full lock."""
+        r, ts, cvs = self._active_run_with_cases()
+        r = self.refresh(r)
+
+        with patch.object(Run, "_lock_case_versions") as lock:
+            r.refresh(full=True)
+
+        self.assertTrue(lock.called)
+
+
 
 class RefreshTransactionTest(case.TransactionTestCase):
     """Tests for ``Importer`` transactional behavior."""
@@ -0,0 +1,149 @@
+"""
+Tests for RunCaseVersionStatus model.
+
+"""
+from tests import case
+
+
+
+class RunCaseVersionStatusTest(case.DBTestCase):
+    """Tests for maintenance of denormalized runcaseversion statuses."""
+    def setUp(self):
+        """A run with an rcv in two environments."""
+        self.envs = self.F.EnvironmentFactory.create_full_set(
+            {"OS": ["Windows", "Linux"]})
+        pv = self.F.ProductVersionFactory(environments=self.envs)
+        self.run = self.F.RunFactory(productversion=pv)
+        self.rcv = self.F.RunCaseVersionFactory(
+            run=self.run, caseversion__productversion=pv)
+
+
+    def assertStatusesCurrent(self):
+        """Assert the stored statuses match those determined from results."""
+        S = self.model.RunCaseVersionStatus
+        stored = dict(
+            ((rcv, env), status) for rcv, env, status
+            in S.objects.values_list("runcaseversion", "environment", "status")
+            )
+        self.assertEqual(stored, S.live([self.run.id]))
+
+
+    def status(self, environment):
+        """Return stored status of the rcv in given env, or None."""
+        try:
+            return self.model.RunCaseVersionStatus.objects.get(
+                runcaseversion=self.rcv, environment=environment).status
+        except self.model.RunCaseVersionStatus.DoesNotExist:
+            return None
+
+
+    def result(self, status, tester=None, environment=None):
+        """Create and return a result for the rcv."""
+        kwargs = {}
+        if tester is not None:
+            kwargs["tester"] = tester
+        return self.F.ResultFactory(
+            runcaseversion=self.rcv,
+            environment=environment or self.envs[0],
+            status=status,
+            **kwargs)
+
+
+    def test_newest_completed(self):
+        """The newest non-pending result of any tester is current."""
+        self.result("passed")
+        self.assertEqual(self.status(self.envs[0]), "passed")
+        self.assertEqual(self.status(self.envs[1]), None)
+
+        self.result("failed")
+        self.assertEqual(self.status(self.envs[0]), "failed")
+        self.assertStatusesCurrent()
+
+
+    def test_pending_only(self):
+        """Pending results give no current status."""
+        self.result("started")
+
+        self.assertEqual(self.status(self.envs[0]), None)
+        self.assertStatusesCurrent()
+
+
+    def test_started_again(self):
+        """Restarting falls back to another tester's result, or none."""
+        u1 = self.F.UserFactory()
+        u2 = self.F.UserFactory()
+        self.result("passed", tester=u1)
+        self.result("failed", tester=u2)
+
+        self.result("started", tester=u2)
+        self.assertEqual(self.status(self.envs[0]), "passed")
+
+        self.result("started", tester=u1)
+        self.assertEqual(self.status(self.envs[0]), None)
+        self.assertStatusesCurrent()
+
+
+    def test_result_deleted(self):
+        """Soft-deleting and undeleting a result updates the status."""
+        r = self.result("passed")
+
+        r.delete()
+        self.assertEqual(self.status(self.envs[0]), None)
+
+        r = self.model.Result.everything.get(pk=r.pk)
+        r.undelete()
+        self.assertEqual(self.status(self.envs[0]), "passed")
+        self.assertStatusesCurrent()
+
+
+    def test_result_edited(self):
+        """Saving an existing result refreshes the status."""
+        r = self.result("passed")
+
+        r.status = "invalidated"
+        r.save()
+
+        self.assertEqual(self.status(self.envs[0]), "invalidated")
+
+
+    def test_record_results(self):
+        """Results recorded in bulk update the statuses."""
+        from moztrap.model.execution.models import record_results
+        user = self.F.UserFactory()
+        record_results(
+            [
+                {
+                    "run_id": self.run.id,
+                    "case": self.rcv.caseversion.case.id,
+                    "environment": env.id,
+                    "status": "passed",
+                    }
+                for env in self.envs
+                ],
+            user,
+            )
+
+        self.assertEqual(self.status(self.envs[0]), "passed")
+        self.assertEqual(self.status(self.envs[1]), "passed")
+        self.assertStatusesCurrent()
+
+
+    def test_rebuild(self):
+        """``rebuild`` recomputes statuses from scratch."""
+        self.result("skipped")
+        self.model.RunCaseVersionStatus.objects.all().delete()
+
+        self.model.RunCaseVersionStatus.rebuild([self.run.id])
+
+        self.assertEqual(self.status(self.envs[0]), "skipped")
+        self.assertStatusesCurrent()
+
+
+    def test_rcvs_deleted_by_lock(self):
+        """Permanently deleting rcvs deletes their statuses."""
+        self.result("passed")
+
+        self.run._delete_runcaseversions([self.rcv.id])
+
+        self.assertEqual(
+            self.model.RunCaseVersionStatus.objects.count(), 0)
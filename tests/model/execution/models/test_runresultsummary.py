@@ -0,0 +1,177 @@
+"""
+Tests for RunResultSummary model.
+
+"""
+from mock import Mock, patch
+
+from tests import case
+
+
+
+class RunResultSummaryTest(case.DBTestCase):
+    """Tests for maintenance of denormalized run result counts."""
+    def setUp(self):
+        """A run with two rcvs in two environments."""
+        self.envs = self.F.EnvironmentFactory.create_full_set(
+            {"OS": ["Windows", "Linux"]})
+        pv = self.F.ProductVersionFactory(environments=self.envs)
+        self.run = self.F.RunFactory(productversion=pv)
+        self.rcv1 = self.F.RunCaseVersionFactory(
+            run=self.run, caseversion__productversion=pv)
+        self.rcv2 = self.F.RunCaseVersionFactory(
+            run=self.run, caseversion__productversion=pv)
+
+
+    def assertSummaryCurrent(self):
+        """Assert the stored summary counts match live result counts."""
+        S = self.model.RunResultSummary
+        stored = dict(
+            ((r, e, s), c) for r, e, s, c
+            in S.objects.filter(count__gt=0).values_list(
+                "run", "environment", "status", "count")
+            )
+        live = S.live([self.run.id])
+        self.assertEqual(stored, live)
+
+
+    def counts(self, environment=None):
+        return self.model.RunResultSummary.counts(self.run, environment)
+
+
+    def test_totals(self):
+        """New rcvs count their environments in the total."""
+        self.assertEqual(self.counts()["_total"], 4)
+        self.assertEqual(self.counts(self.envs[0])["_total"], 2)
+        self.assertSummaryCurrent()
+
+
+    def test_latest_replaced(self):
+        """A new result replaces the tester's previous latest in the counts."""
+        u = self.F.UserFactory()
+        self.F.ResultFactory(
+            tester=u, runcaseversion=self.rcv1, environment=self.envs[0],
+            status="started")
+        self.F.ResultFactory(
+            tester=u, runcaseversion=self.rcv1, environment=self.envs[0],
+            status="passed")
+
+        counts = self.counts()
+        self.assertEqual(counts["passed"], 1)
+        self.assertEqual(counts.get("started", 0), 0)
+        self.assertEqual(counts["_completed"], 1)
+        self.assertSummaryCurrent()
+
+
+    def test_completed_by_other_tester(self):
+        """Combo stays completed while any tester's latest is completed."""
+        u1 = self.F.UserFactory()
+        u2 = self.F.UserFactory()
+        self.F.ResultFactory(
+            tester=u1, runcaseversion=self.rcv1, environment=self.envs[0],
+            status="passed")
+        self.F.ResultFactory(
+            tester=u2, runcaseversion=self.rcv1, environment=self.envs[0],
+            status="failed")
+        self.assertEqual(self.counts()["_completed"], 1)
+
+        self.F.ResultFactory(
+            tester=u1, runcaseversion=self.rcv1, environment=self.envs[0],
+            status="started")
+        self.assertEqual(self.counts()["_completed"], 1)
+
+        self.F.ResultFactory(
+            tester=u2, runcaseversion=self.rcv1, environment=self.envs[0],
+            status="started")
+        self.assertEqual(self.counts()["_completed"], 0)
+        self.assertSummaryCurrent()
+
+
+    def test_result_deleted(self):
+        """Soft-deleting and undeleting a result updates the counts."""
+        r = self.F.ResultFactory(
+            runcaseversion=self.rcv1, environment=self.envs[0],
+            status="passed")
+
+        r.delete()
+        self.assertEqual(self.counts().get("passed", 0), 0)
+        self.assertSummaryCurrent()
+
+        r = self.model.Result.everything.get(pk=r.pk)
+        r.undelete()
+        self.assertEqual(self.counts()["passed"], 1)
+        self.assertSummaryCurrent()
+
+
+    def test_environment_removed(self):
+        """Removing an environment from the product version cascades."""
+        self.run.productversion.remove_envs(self.envs[0])
+
+        self.assertEqual(self.counts()["_total"], 2)
+        self.assertEqual(self.counts(self.envs[0]), {})
+        self.assertSummaryCurrent()
+
+
+    def test_environment_added(self):
+        """Adding an environment to an rcv updates the total."""
+        env = self.F.EnvironmentFactory()
+        self.rcv1.add_envs(env)
+
+        self.assertEqual(self.counts()["_total"], 5)
+        self.assertSummaryCurrent()
+
+
+    def test_chunked_delete_rebuilds_once(self):
+        """A chunked soft-delete cascade rebuilds each run only once."""
+        from moztrap.model.mtmodel import SoftDeleteCollector
+        S = self.model.RunResultSummary
+        self.F.ResultFactory(
+            runcaseversion=self.rcv1, environment=self.envs[0],
+            status="passed")
+        self.F.ResultFactory(
+            runcaseversion=self.rcv2, environment=self.envs[0],
+            status="passed")
+
+        rebuild = Mock(side_effect=S.rebuild)
+        with patch.object(S, "rebuild", rebuild):
+            SoftDeleteCollector(using="default", chunk_size=1).delete(
+                self.model.RunCaseVersion.objects.filter(run=self.run))
+
+        self.assertEqual(rebuild.call_count, 1)
+        self.assertEqual(set(rebuild.call_args[0][0]), set([self.run.id]))
+        self.assertEqual(self.counts(), {})
+        self.assertSummaryCurrent()
+
+
+    def test_environment_removed_rebuilds_once(self):
+        """An environment removal cascade rebuilds each run only once."""
+        S = self.model.RunResultSummary
+
+        rebuild = Mock(side_effect=S.rebuild)
+        with patch.object(S, "rebuild", rebuild):
+            self.run.productversion.remove_envs(self.envs[0])
+
+        self.assertEqual(rebuild.call_count, 1)
+        self.assertSummaryCurrent()
+
+
+    def test_rebuild(self):
+        """``rebuild`` recomputes counts from scratch."""
+        self.F.ResultFactory(
+            runcaseversion=self.rcv1, environment=self.envs[0],
+            status="skipped")
+        self.model.RunResultSummary.objects.all().delete()
+
+        self.model.RunResultSummary.rebuild([self.run.id])
+
+        self.assertEqual(
+            self.counts(), {"_total": 4, "skipped": 1})
+
+
+    def test_completion_single_env(self):
+        """``completion_single_env`` reads the environment's counts."""
+        self.F.ResultFactory(
+            runcaseversion=self.rcv1, environment=self.envs[0],
+            status="passed")
+
+        self.assertEqual(self.run.completion_single_env(self.envs[0].id), 0.5)
+        self.assertEqual(self.run.completion_single_env(self.envs[1].id), 0.0)
@@ -368,6 +368,57 @@ class CaseVersionTest(case.DBTestCase):
         self.assertEqual(self.refresh(cv2).latest, False)
 
 
+    def test_set_latest_versions(self):
+        """set_latest_versions sets latest of all the product's cases."""
+        pv1 = self.F.ProductVersionFactory.create(version="1")
+        p = pv1.product
+        pv2 = self.F.ProductVersionFactory.create(product=p, version="2")
+        cv1a = self.F.CaseVersionFactory.create(productversion=pv1)
+        cv2a = self.F.CaseVersionFactory.create(
+            productversion=pv2, case=cv1a.case)
+        cv1b = self.F.CaseVersionFactory.create(productversion=pv1)
+        other = self.F.CaseVersionFactory.create()
+        # make the flags all wrong
+        self.model.CaseVersion.objects.update(latest=False, notrack=True)
+        self.model.CaseVersion.objects.filter(pk=cv1a.pk).update(
+            latest=True, notrack=True)
+
+        self.model.Case.set_latest_versions(p)
+
+        self.assertEqual(self.refresh(cv1a).latest, False)
+        self.assertEqual(self.refresh(cv2a).latest, True)
+        self.assertEqual(self.refresh(cv1b).latest, True)
+        self.assertEqual(self.refresh(other).latest, False)
+
+
+    def test_set_latest_versions_ignores_deleted(self):
+        """set_latest_versions ignores (and leaves alone) deleted versions."""
+        pv1 = self.F.ProductVersionFactory.create(version="1")
+        pv2 = self.F.ProductVersionFactory.create(
+            product=pv1.product, version="2")
+        cv1 = self.F.CaseVersionFactory.create(productversion=pv1)
+        cv2 = self.F.CaseVersionFactory.create(
+            productversion=pv2, case=cv1.case)
+        cv2.delete()
+        self.model.CaseVersion.everything.update(latest=False, notrack=True)
+
+        self.model.Case.set_latest_versions(pv1.product)
+
+        self.assertEqual(self.refresh(cv1).latest, True)
+        self.assertEqual(
+            self.model.CaseVersion.everything.get(pk=cv2.pk).latest, False)
+
+
+    def test_set_latest_versions_only_changed(self):
+        """Caseversions already flagged correctly are not updated."""
+        cv = self.F.CaseVersionFactory.create()
+        cc_version = self.refresh(cv).cc_version
+
+        self.model.Case.set_latest_versions(cv.productversion.product)
+
+        self.assertEqual(self.refresh(cv).cc_version, cc_version)
+
+
     def test_latest_version(self):
         """Case.latest_version() gets latest version."""
         c = self.F.CaseFactory.create()
@@ -441,6 +492,209 @@ class CaseVersionTest(case.DBTestCase):
 
 
 
+    def versions(self, num, **kwargs):
+        """Create and return ``num`` versions of one case."""
+        cv = self.F.CaseVersionFactory.create(
+            productversion__version="1", **kwargs)
+        cvs = [cv]
+        for i in range(2, num + 1):
+            cvs.append(
+                self.F.CaseVersionFactory.create(
+                    case=cv.case,
+                    productversion__product=cv.productversion.product,
+                    productversion__version=str(i),
+                    **kwargs)
+                )
+        return [self.refresh(cv) for cv in cvs]
+
+
+    def test_save_syncs_name(self):
+        """Saving a caseversion gives its name to the case's other versions."""
+        u = self.F.UserFactory.create()
+        cv1, cv2, cv3 = self.versions(3, name="Old")
+
+        cv1.name = "New"
+        cv1.save(user=u)
+
+        self.assertEqual(
+            [cv.name for cv in cv1.case.versions.all()], ["New"] * 3)
+        self.assertEqual(self.refresh(cv3).modified_by, u)
+
+
+    def test_save_syncs_name_query_count(self):
+        """Syncing the name takes one query, however many versions."""
+        cvs = self.versions(4)
+        cv = cvs[0]
+        cv.name = "New"
+
+        # query 1: update cv; 2: its case; 3-5: set latest version; 6: sync
+        # name
+        with self.assertNumQueries(6):
+            cv.save()
+
+
+    def test_save_skip_sync_name(self):
+        """Passing skip_sync_name to save skips syncing the name."""
+        cv1, cv2 = self.versions(2, name="Old")
+
+        cv1.name = "New"
+        cv1.save(skip_sync_name=True)
+
+        self.assertEqual(self.refresh(cv2).name, "Old")
+
+
+    def test_sync_names(self):
+        """sync_names syncs the names of a batch of caseversions' cases."""
+        a1, a2 = self.versions(2, name="A")
+        b1, b2, b3 = self.versions(3, name="B")
+        c1, = self.versions(1, name="C")
+        for cv, name in [(a2, "New A"), (b1, "New B"), (c1, "New C")]:
+            cv.name = name
+            cv.save(skip_sync_name=True)
+
+        with self.assertNumQueries(1):
+            self.model.CaseVersion.sync_names([a2, b1, c1])
+
+        self.assertEqual(
+            [self.refresh(cv).name for cv in [a1, a2, b1, b2, b3, c1]],
+            ["New A", "New A", "New B", "New B", "New B", "New C"],
+            )
+
+
+    def test_sync_names_chunks(self):
+        """sync_names updates in chunks of the given size."""
+        cvs = []
+        for i in range(3):
+            cv, other = self.versions(2, name="Old")
+            cv.name = "New {0}".format(i)
+            cv.save(skip_sync_name=True)
+            cvs.append(cv)
+
+        with self.assertNumQueries(2):
+            self.model.CaseVersion.sync_names(cvs, chunk_size=2)
+
+        self.assertEqual(
+            sorted(
+                self.model.CaseVersion.objects.filter(
+                    name__startswith="New").values_list("name", flat=True)),
+            ["New 0", "New 0", "New 1", "New 1", "New 2", "New 2"],
+            )
+
+
+    def test_sync_names_ignores_deleted(self):
+        """Deleted versions of the case are left alone."""
+        cv1, cv2 = self.versions(2, name="Old")
+        cv2.delete()
+
+        cv1 = self.refresh(cv1)
+        cv1.name = "New"
+        cv1.save()
+
+        self.assertEqual(
+            self.model.CaseVersion.everything.get(pk=cv2.pk).name, "Old")
+
+
+    def test_sync_names_empty(self):
+        """sync_names of no caseversions does nothing."""
+        with self.assertNumQueries(0):
+            self.model.CaseVersion.sync_names([])
+
+
+    def test_clone_forward(self):
+        """Clones caseversions, with children, into another productversion."""
+        cv = self.F.CaseVersionFactory.create(name="One")
+        self.F.CaseStepFactory.create(caseversion=cv, instruction="Do it")
+        tag = self.F.TagFactory.create()
+        cv.tags.add(tag)
+        envs = self.F.EnvironmentFactory.create_full_set({"OS": ["Linux"]})
+        cv.environments.add(*envs)
+        pv = self.F.ProductVersionFactory.create(
+            product=cv.productversion.product, version="2.0")
+        u = self.F.UserFactory.create()
+
+        count = self.model.CaseVersion.clone_forward(
+            cv.productversion, pv, user=u)
+
+        new = pv.caseversions.get()
+        self.assertEqual(count, 1)
+        self.assertEqual(new.case, cv.case)
+        self.assertEqual(new.name, "One")
+        self.assertEqual(new.created_by, u)
+        self.assertEqual(
+            [s.instruction for s in new.steps.all()], ["Do it"])
+        self.assertEqual(list(new.tags.all()), [tag])
+        self.assertEqual(set(new.environments.all()), set(envs))
+
+
+    def test_clone_forward_latest(self):
+        """Latest flags are recomputed for the new productversion."""
+        cv = self.F.CaseVersionFactory.create()
+        pv = self.F.ProductVersionFactory.create(
+            product=cv.productversion.product, version="2.0")
+
+        self.model.CaseVersion.clone_forward(cv.productversion, pv)
+
+        self.assertFalse(self.refresh(cv).latest)
+        self.assertTrue(pv.caseversions.get().latest)
+
+
+    def test_clone_forward_skips_existing(self):
+        """Cases that already have a version in the target are skipped."""
+        cv = self.F.CaseVersionFactory.create()
+        other = self.F.CaseVersionFactory.create(
+            productversion=cv.productversion)
+        pv = self.F.ProductVersionFactory.create(
+            product=cv.productversion.product, version="2.0")
+        existing = self.F.CaseVersionFactory.create(
+            case=cv.case, productversion=pv, name="Existing")
+
+        count = self.model.CaseVersion.clone_forward(cv.productversion, pv)
+
+        self.assertEqual(count, 1)
+        self.assertEqual(
+            set(pv.caseversions.all()),
+            set([existing, pv.caseversions.get(case=other.case)]),
+            )
+
+
+    def test_clone_forward_batches(self):
+        """Clones in batches, reporting progress after each."""
+        source = self.F.ProductVersionFactory.create(version="1.0")
+        for i in range(3):
+            self.F.CaseVersionFactory.create(productversion=source)
+        pv = self.F.ProductVersionFactory.create(
+            product=source.product, version="2.0")
+        progress = []
+
+        count = self.model.CaseVersion.clone_forward(
+            source, pv, batch_size=2,
+            progress=lambda done, total: progress.append((done, total)))
+
+        self.assertEqual(count, 3)
+        self.assertEqual(progress, [(2, 3), (3, 3)])
+        self.assertEqual(pv.caseversions.count(), 3)
+
+
+    def test_clone_forward_concurrent(self):
+        """A concurrent clone of the same case into the target is an error."""
+        from moztrap.model.mtmodel import MTQuerySet
+        cv = self.F.CaseVersionFactory.create()
+        pv = self.F.ProductVersionFactory.create(
+            product=cv.productversion.product, version="2.0")
+        bulk_create = MTQuerySet.bulk_create
+
+        def bulk_create_twice(qs, objs, *args, **kwargs):
+            if qs.model is self.model.CaseVersion:
+                self.F.CaseVersionFactory.create(
+                    case=cv.case, productversion=pv)
+            return bulk_create(qs, objs, *args, **kwargs)
+
+        with patch.object(MTQuerySet, "bulk_create", bulk_create_twice):
+            with self.assertRaises(RuntimeError):
+                self.model.CaseVersion.clone_forward(cv.productversion, pv)
+
+
+
 class CaseStepTest(case.DBTestCase):
     """Tests for the CaseStep model."""
     def test_unicode(self):
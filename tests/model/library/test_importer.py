@@ -148,6 +148,8 @@ class ImporterTest(ImporterTestBase, case.DBTestCase):
 
         cv = self.model.CaseVersion.objects.get()
         self.assertEqual(cv.created_by, user)
+        self.assertEqual(cv.case.created_by, user)
+        self.assertEqual(cv.case.modified_by, user)
         self.assertEqual(result.num_cases, 1)
 
 
@@ -156,7 +158,7 @@ class ImporterTest(ImporterTestBase, case.DBTestCase):
         Two caseversions that both use the same user.  Test that import caches
         the user and doesn't have to query for it a second time.
 
-        Expect 19 queries for this import:
+        Expect 17 queries for this import:
 
         Query 1: Ensure this caseversion does not already exist for this
         productversion::
@@ -240,32 +242,7 @@ class ImporterTest(ImporterTestBase, case.DBTestCase):
             = Foo, `description` = , `latest` = True, `envs_narrowed` = False
             WHERE `library_caseversion`.`id` = 10
 
-        Query 9: During save, check if there are other caseversions for this
-                 case to sync names.
-            SELECT `library_caseversion`.`id`, `library_caseversion`
-            .`created_on`,
-            `library_caseversion`.`created_by_id`, `library_caseversion`
-            .`modified_on`,
-            `library_caseversion`.`modified_by_id`, `library_caseversion`
-            .`deleted_on`,
-            `library_caseversion`.`deleted_by_id`, `library_caseversion`
-            .`cc_version`,
-            `library_caseversion`.`status`, `library_caseversion`
-            .`productversion_id`,
-            `library_caseversion`.`case_id`, `library_caseversion`.`name`,
-            `library_caseversion`.`description`, `library_caseversion`
-            .`latest`,
-            `library_caseversion`.`envs_narrowed` FROM `library_caseversion`
-             INNER JOIN
-            `core_productversion` ON (`library_caseversion`
-            .`productversion_id` =
-            `core_productversion`.`id`) WHERE (`library_caseversion`
-            .`deleted_on` IS
-            NULL AND `library_caseversion`.`case_id` = 1 ) ORDER BY
-            `library_caseversion`.`case_id` ASC,
-            `core_productversion`.`order` ASC
-
-        Query 10: Add the new step to the caseversion::
+        Query 9: Add the new step to the caseversion::
 
             INSERT INTO `library_casestep` (`created_on`, `created_by_id`,
             `modified_on`, `modified_by_id`, `deleted_on`, `deleted_by_id`,
@@ -275,7 +252,7 @@ class ImporterTest(ImporterTestBase, case.DBTestCase):
 
         Transaction: RELEASE SAVEPOINT s140735243669888_x1
 
-        Query 11: Ensure the second caseversion with this name and pv doesn't
+        Query 10: Ensure the second caseversion with this name and pv doesn't
         exist::
 
             SELECT (1) AS `a` FROM `library_caseversion` WHERE
@@ -288,14 +265,14 @@ class ImporterTest(ImporterTestBase, case.DBTestCase):
         **NOTE: We didn't have to search for the user again, since it was
         cached**
 
-        Query 12: Create the second new case::
+        Query 11: Create the second new case::
 
             INSERT INTO `library_case` (`created_on`, `created_by_id`,
             `modified_on`, `modified_by_id`, `deleted_on`, `deleted_by_id`,
             `product_id`) VALUES (2012-03-07 19:35:34, None, 2012-03-07
             19:35:34, None, None, None, 12)
 
-        Queries 13-17: Create the second new caseversion::
+        Queries 12-16: Create the second new caseversion::
 
              INSERT INTO `library_caseversion` (`created_on`, `created_by_id`,
              `modified_on`, `modified_by_id`, `deleted_on`, `deleted_by_id`,
@@ -351,32 +328,7 @@ class ImporterTest(ImporterTestBase, case.DBTestCase):
              True, `envs_narrowed` = False WHERE `library_caseversion`.`id` =
              11
 
-        Query 18: Check for other caseversions for the same case to sync names
-
-            SELECT `library_caseversion`.`id`, `library_caseversion`
-            .`created_on`,
-            `library_caseversion`.`created_by_id`, `library_caseversion`
-            .`modified_on`,
-            `library_caseversion`.`modified_by_id`, `library_caseversion`
-            .`deleted_on`,
-            `library_caseversion`.`deleted_by_id`, `library_caseversion`
-            .`cc_version`,
-            `library_caseversion`.`status`, `library_caseversion`
-            .`productversion_id`,
-            `library_caseversion`.`case_id`, `library_caseversion`.`name`,
-            `library_caseversion`.`description`, `library_caseversion`
-            .`latest`,
-            `library_caseversion`.`envs_narrowed` FROM `library_caseversion`
-             INNER JOIN
-            `core_productversion` ON (`library_caseversion`
-            .`productversion_id` =
-            `core_productversion`.`id`) WHERE (`library_caseversion`
-            .`deleted_on` IS
-            NULL AND `library_caseversion`.`case_id` = 2 ) ORDER BY
-            `library_caseversion`.`case_id` ASC,
-            `core_productversion`.`order` ASC
-
-        Query 19: Add the step to the second caseversion::
+        Query 17: Add the step to the second caseversion::
 
             INSERT INTO `library_casestep` (`created_on`, `created_by_id`,
             `modified_on`, `modified_by_id`, `deleted_on`, `deleted_by_id`,
@@ -388,7 +340,7 @@ class ImporterTest(ImporterTestBase, case.DBTestCase):
 
         Note: Django 1.4 now logs transaction points in the connection.queries
 
-        EXPECT: 19 Queries + 4 Transaction actions = 23 queries.
+        EXPECT: 17 Queries + 4 Transaction actions = 21 queries.
 
         To re-capture this query list, use a block like this in place
             of the "with self.assertNumQueries..." block::
@@ -425,7 +377,7 @@ class ImporterTest(ImporterTestBase, case.DBTestCase):
             }
 
         # Test code as normal
-        with self.assertNumQueries(23):
+        with self.assertNumQueries(21):
             result = self.import_data(case_data)
 
         cv1 = self.model.CaseVersion.objects.get(name="Foo")
@@ -788,3 +740,176 @@ class ImporterTransactionTest(ImporterTestBase, case.TransactionTestCase):
             result.warnings[0]["reason"],
             ImportResult.SKIP_STEP_NO_INSTRUCTION,
             )
+
+
+
+class BulkImporterTest(ImporterTest):
+    """Tests for ``Importer`` in bulk mode; runs all ``ImporterTest`` tests."""
+    def import_data(self, case_data, **kwargs):
+        """Call ``import_data`` with ``bulk=True`` and return result."""
+        from moztrap.model.library.importer import Importer
+        return Importer().import_data(self.pv, case_data, bulk=True, **kwargs)
+
+
+    def test_create_two_caseversions_same_user(self):
+        """
+        Query count for bulk import doesn't depend on the number of cases.
+
+        Query 1: existing case names for the productversion; 2: users for the
+        emails; 3: last case id; 4: insert cases; 5: fetch cases back; 6:
+        insert caseversions; 7: fetch caseversions back; 8: productversion
+        environments; 9: insert steps; 10: insert caseversion environments.
+
+        """
+        user = self.F.UserFactory.create(email="sumbudee@mozilla.com")
+        self.pv.environments.add(self.F.EnvironmentFactory.create())
+
+        cases = [
+            {
+                "created_by": "sumbudee@mozilla.com",
+                "name": "Foo {0}".format(i),
+                "steps": [{"instruction": "do this"}],
+                }
+            for i in range(5)
+            ]
+        with self.assertNumQueries(10):
+            self.import_data({"cases": cases})
+
+        cvs = self.model.CaseVersion.objects.all()
+        self.assertEqual(len(cvs), 5)
+        for cv in cvs:
+            self.assertEqual(cv.created_by, user)
+            self.assertTrue(cv.latest)
+            self.assertEqual(cv.steps.count(), 1)
+            self.assertEqual(cv.environments.count(), 1)
+
+
+    def test_chunks(self):
+        """Cases are created in chunks, keeping case data together."""
+        from moztrap.model.library.importer import CaseImporter
+        cases = [
+            {
+                "name": "Foo {0}".format(i),
+                "description": "desc {0}".format(i),
+                "steps": [{"instruction": "do {0}".format(i)}],
+                "suites": ["S"],
+                }
+            for i in range(5)
+            ]
+
+        result = CaseImporter(self.pv).bulk_import_cases(cases, chunk_size=2)
+
+        self.assertEqual(result.num_cases, 5)
+        self.assertEqual(
+            set(
+                self.model.CaseVersion.objects.values_list(
+                    "name", "description", "steps__instruction")),
+            set(
+                ("Foo {0}".format(i), "desc {0}".format(i), "do {0}".format(i))
+                for i in range(5)
+                )
+            )
+        self.assertEqual(self.model.Suite.objects.get().cases.count(), 5)
+
+
+    def test_duplicate_in_data_skip(self):
+        """A case with the same name as one earlier in the data is skipped."""
+        result = self.import_data(
+            {
+                "cases": [
+                    {"name": "Foo", "steps": [{"expected": "no instruction"}]},
+                    {"name": "Foo", "steps": [{"instruction": "do this"}]},
+                    {"name": "Foo", "steps": [{"instruction": "do that"}]},
+                    ]
+                }
+            )
+
+        cv = self.model.CaseVersion.objects.get()
+        self.assertEqual(cv.steps.get().instruction, "do this")
+        self.assertEqual(result.num_cases, 1)
+        self.assertEqual(
+            [w["reason"] for w in result.warnings],
+            [
+                ImportResult.SKIP_STEP_NO_INSTRUCTION,
+                ImportResult.SKIP_CASE_NAME_CONFLICT,
+                ],
+            )
+
+
+    def test_force_dupes(self):
+        """With ``force_dupes``, cases with duplicate names are imported."""
+        self.F.CaseVersionFactory.create(productversion=self.pv, name="Foo")
+
+        result = self.import_data(
+            {"cases": [{"name": "Foo"}, {"name": "Foo"}]}, force_dupes=True)
+
+        self.assertEqual(result.num_cases, 2)
+        self.assertEqual(
+            self.model.CaseVersion.objects.filter(name="Foo").count(), 3)
+
+
+
+class StreamImporterTest(ImporterTest):
+    """Tests for ``Importer.import_stream``; runs all ``ImporterTest`` tests."""
+    def items(self, case_data):
+        """Yield (section, item) pairs from data, like ``iter_sections``."""
+        for section in sorted(case_data, reverse=True):
+            value = case_data[section]
+            if isinstance(value, list):
+                for item in value:
+                    yield section, item
+            else:
+                yield section, value
+
+
+    def import_data(self, case_data, **kwargs):
+        """Call ``import_stream`` with the data's items and return result."""
+        from moztrap.model.library.importer import Importer
+        return Importer().import_stream(
+            self.pv, self.items(case_data), **kwargs)
+
+
+    def test_chunks_progress(self):
+        """Cases are imported in chunks, calling progress after each."""
+        progress = []
+        result = self.import_data(
+            {"cases": [{"name": "Foo {0}".format(i)} for i in range(5)]},
+            chunk_size=2,
+            progress=lambda r: progress.append(r.num_cases),
+            )
+
+        self.assertEqual(progress, [2, 4, 5])
+        self.assertEqual(result.num_cases, 5)
+        self.assertEqual(self.model.CaseVersion.objects.count(), 5)
+
+
+    def test_suite_after_cases(self):
+        """A suite that comes after cases using it gets its description."""
+        result = self.stream(
+            ("cases", {"name": "Foo", "suites": ["FooSuite"]}),
+            ("suites", {"name": "FooSuite", "description": "foo"}),
+            )
+
+        suite = self.model.Suite.objects.get()
+        self.assertEqual(suite.description, "foo")
+        self.assertEqual(suite.cases.get().versions.get().name, "Foo")
+        self.assertEqual(result.num_suites, 1)
+
+
+    def test_existing_suite_description_unchanged(self):
+        """The description of a suite that already existed isn't changed."""
+        self.F.SuiteFactory.create(
+            product=self.pv.product, name="FooSuite", description="old")
+
+        self.stream(
+            ("cases", {"name": "Foo", "suites": ["FooSuite"]}),
+            ("suites", {"name": "FooSuite", "description": "new"}),
+            )
+
+        self.assertEqual(self.model.Suite.objects.get().description, "old")
+
+
+    def stream(self, *items):
+        """Call ``import_stream`` with given items and return result."""
+        from moztrap.model.library.importer import Importer
+        return Importer().import_stream(self.pv, iter(items))
@@ -0,0 +1,108 @@
+"""Tests for incremental parsing of JSON import files."""
+from cStringIO import StringIO
+import json
+
+from tests import case
+
+
+
+class IterSectionsTest(case.TestCase):
+    """Tests for ``iter_sections``."""
+    def iter_sections(self, data, chunk_size=3):
+        """Parse given string with a small chunk size; return list of items."""
+        from moztrap.model.library.jsonstream import iter_sections
+        return list(iter_sections(StringIO(data), chunk_size=chunk_size))
+
+
+    def test_sections(self):
+        """Yields each item of each array, in file order."""
+        data = {
+            "suites": [{"name": "S", "description": "d"}],
+            "cases": [
+                {"name": "Foo", "steps": [{"instruction": "do this"}]},
+                {"name": "Bar", "tags": ["a", "b"]},
+                ],
+            }
+        text = json.dumps(data, indent=2)
+        expected = [
+            (k, item) for k, v in json.loads(text).items() for item in v]
+
+        self.assertEqual(self.iter_sections(text), expected)
+
+
+    def test_chunk_boundaries(self):
+        """Values split across chunks (including numbers) decode whole."""
+        text = '{"a": [12345, 678.5e2, true, null, "x y z"], "b": [1234]}'
+
+        for chunk_size in range(1, len(text) + 1):
+            self.assertEqual(
+                self.iter_sections(text, chunk_size=chunk_size),
+                [
+                    ("a", 12345), ("a", 67850.0), ("a", True), ("a", None),
+                    ("a", "x y z"), ("b", 1234),
+                    ],
+                chunk_size,
+                )
+
+
+    def test_non_array_values(self):
+        """Values that aren't arrays are yielded whole."""
+        self.assertEqual(
+            self.iter_sections('{"a": {"b": 1}, "c": 2}'),
+            [("a", {"b": 1}), ("c", 2)],
+            )
+
+
+    def test_empty(self):
+        """Empty object or arrays yield nothing."""
+        self.assertEqual(self.iter_sections(' { "a" : [ ] } '), [])
+        self.assertEqual(self.iter_sections('{}'), [])
+
+
+    def test_unicode(self):
+        """Strings are decoded to unicode."""
+        self.assertEqual(
+            self.iter_sections('{"a": ["\\u00e9"]}'), [("a", u"\xe9")])
+
+
+    def assertInvalid(self, text):
+        """Assert that parsing ``text`` raises ValueError."""
+        with self.assertRaises(ValueError):
+            self.iter_sections(text)
+
+
+    def test_not_object(self):
+        """ValueError if top level isn't an object."""
+        self.assertInvalid('[1, 2]')
+
+
+    def test_truncated(self):
+        """ValueError if file is truncated."""
+        self.assertInvalid('{"cases": [{"name": "Foo"')
+        self.assertInvalid('{"cases": [1, 2')
+        self.assertInvalid('{"cases": [1]')
+        self.assertInvalid('')
+
+
+    def test_bad_delimiter(self):
+        """ValueError if items aren't delimited with commas."""
+        self.assertInvalid('{"cases": [1 2]}')
+        self.assertInvalid('{"a": 1 "b": 2}')
+
+
+    def test_bad_key(self):
+        """ValueError if key isn't a string."""
+        self.assertInvalid('{1: [2]}')
+
+
+    def test_extra_data(self):
+        """ValueError if there's data after the top-level object."""
+        self.assertInvalid('{"a": []} {}')
+
+
+    def test_error_offset(self):
+        """Error message includes the offset of the error in the file."""
+        with self.assertRaises(ValueError) as cm:
+            self.iter_sections('{"cases": [1 2]}')
+
+        self.assertEqual(str(cm.exception), "Expecting , delimiter: char 13")
@@ -434,6 +434,87 @@ class CascadeDeleteTest(MTModelTestCase):
 
 
 
+class ChunkedCascadeTest(MTModelTestCase):
+    """Tests for the set-based, chunked soft-delete cascade."""
+    def collector(self, chunk_size=2):
+        from moztrap.model.mtmodel import SoftDeleteCollector
+        return SoftDeleteCollector(using="default", chunk_size=chunk_size)
+
+
+    def test_counts(self):
+        """Returns number of rows (un)deleted per model."""
+        p = self.F.ProductFactory.create()
+        for i in range(3):
+            self.F.SuiteFactory.create(product=p)
+        self.F.ProductVersionFactory.create(product=p)
+
+        counts = p.delete()
+
+        self.assertEqual(counts[self.model.Product], 1)
+        self.assertEqual(counts[self.model.Suite], 3)
+        self.assertEqual(counts[self.model.ProductVersion], 1)
+
+        counts = self.model.Product.everything.all().undelete()
+
+        self.assertEqual(counts[self.model.Suite], 3)
+
+
+    def test_chunks(self):
+        """Deletes and undeletes every row of a cascade larger than a chunk."""
+        p = self.F.ProductFactory.create()
+        suites = [self.F.SuiteFactory.create(product=p) for i in range(5)]
+        for suite in suites:
+            self.F.SuiteCaseFactory.create(suite=suite)
+
+        counts = self.collector().delete(
+            self.model.Product.objects.filter(pk=p.pk), self.user)
+
+        self.assertEqual(counts[self.model.SuiteCase], 5)
+        self.assertEqual(
+            self.model.Suite.objects.filter(product=p).count(), 0)
+        self.assertEqual(self.model.SuiteCase.objects.count(), 0)
+
+        self.collector().undelete([self.refresh(p)], self.user)
+
+        self.assertEqual(
+            self.model.Suite.objects.filter(product=p).count(), 5)
+        self.assertEqual(self.model.SuiteCase.objects.count(), 5)
+
+
+    def test_signal_per_chunk(self):
+        """post_soft_delete is sent with the pks of each chunk."""
+        from moztrap.model.mtmodel import post_soft_delete
+        p = self.F.ProductFactory.create()
+        suites = [self.F.SuiteFactory.create(product=p) for i in range(3)]
+        sent = []
+        def receiver(sender, pks, **kwargs):
+            sent.append(pks)
+        post_soft_delete.connect(receiver, sender=self.model.Suite)
+        self.addCleanup(
+            post_soft_delete.disconnect, receiver, sender=self.model.Suite)
+
+        self.collector().delete([p])
+
+        self.assertEqual(sent, [[s.id for s in suites[:2]], [suites[2].id]])
+
+
+    def test_already_deleted_not_cascaded(self):
+        """Cascade doesn't pass through rows that were already deleted."""
+        p = self.F.ProductFactory.create()
+        s = self.F.SuiteFactory.create(product=p)
+        # case in another product, so suite is the only path to the suitecase
+        sc = self.F.SuiteCaseFactory.create(
+            suite=s, case=self.F.CaseFactory.create())
+        self.model.Suite.objects.filter(pk=s.pk).update(
+            deleted_on=datetime.datetime(2011, 12, 13))
+
+        counts = p.delete()
+
+        self.assertEqual(self.refresh(sc).deleted_on, None)
+        self.assertNotIn(self.model.Suite, counts)
+
+
+
 class UndeleteMixin(object):
     """Utility assertions mixin for undelete tests."""
     def assertNotDeleted(self, obj):
@@ -570,6 +651,323 @@ class CloneTest(UndeleteMixin, MTModelTestCase):
         self.assertEqual(new.modified_by, u2)
 
 
+    def test_default_cascade(self):
+        """Without a ``cascade``, the model's ``clone_cascade`` is used."""
+        s = self.F.SuiteFactory.create()
+        sc = self.F.SuiteCaseFactory.create(suite=s)
+
+        new = s.clone()
+
+        self.assertEqual([c.case for c in new.suitecases.all()], [sc.case])
+
+
+    def test_cascade_created_by(self):
+        """Cascade-cloned objects are also created by the cloning user."""
+        s = self.F.SuiteFactory.create()
+        self.F.SuiteCaseFactory.create(suite=s)
+
+        new = s.clone(user=self.user)
+
+        self.assertEqual(new.suitecases.get().created_by, self.user)
+
+
+
+class BulkCloneTest(MTModelTestCase):
+    """Tests for bulk cloning."""
+    def count_queries(self, func):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as queries:
+            func()
+        return len(queries)
+
+
+    def test_clones(self):
+        """Returns new instances, with overrides, in order of the sources."""
+        p1 = self.F.ProductFactory.create(name="One")
+        p2 = self.F.ProductFactory.create(name="Two")
+
+        new = self.model.Product.bulk_clone(
+            [p1, p2], overrides={"description": "cloned"}, user=self.user)
+
+        self.assertEqual([n.name for n in new], ["One", "Two"])
+        self.assertEqual(
+            [self.refresh(n).description for n in new], ["cloned"] * 2)
+        self.assertNotIn(new[0].id, [p1.id, p2.id, None])
+        self.assertEqual(self.refresh(new[1]).created_by, self.user)
+
+
+    def test_empty(self):
+        """Bulk-cloning nothing clones nothing."""
+        self.assertEqual(self.model.Product.bulk_clone([]), [])
+
+
+    def test_reverse_fk_remapped(self):
+        """Cascade clones point to the clone of their source's parent."""
+        s1 = self.F.SuiteFactory.create()
+        s2 = self.F.SuiteFactory.create()
+        sc1 = self.F.SuiteCaseFactory.create(suite=s1)
+        sc2 = self.F.SuiteCaseFactory.create(suite=s2)
+
+        n1, n2 = self.model.Suite.bulk_clone([s1, s2])
+
+        self.assertEqual([c.case for c in n1.suitecases.all()], [sc1.case])
+        self.assertEqual([c.case for c in n2.suitecases.all()], [sc2.case])
+        self.assertEqual(
+            [c.case for c in s1.suitecases.all()], [sc1.case])
+
+
+    def test_nested_m2m(self):
+        """Relations of cascade clones are cloned too, at every level."""
+        profile = self.F.ProfileFactory.create()
+        envs = self.F.EnvironmentFactory.create_full_set(
+            {"OS": ["Linux", "Windows"], "Browser": ["Firefox"]}, profile)
+
+        new = self.model.Profile.bulk_clone([profile])[0]
+
+        self.assertEqual(
+            set(frozenset(e.elements.all()) for e in new.environments.all()),
+            set(frozenset(e.elements.all()) for e in envs),
+            )
+        self.assertEqual(
+            self.model.Environment.objects.filter(profile=profile).count(), 2)
+
+
+    def test_m2m_filter(self):
+        """A cascade filter function limits the m2m relations cloned."""
+        pv = self.F.ProductVersionFactory.create()
+        envs = self.F.EnvironmentFactory.create_full_set(
+            {"OS": ["Linux", "Windows"]})
+        pv.add_envs(*envs)
+
+        new = self.model.ProductVersion.bulk_clone(
+            [pv],
+            cascade={"environments": lambda qs: qs.filter(pk=envs[0].pk)},
+            overrides={"version": "2.0"},
+            )[0]
+
+        self.assertEqual(list(new.environments.all()), [envs[0]])
+
+
+    def test_skips_deleted(self):
+        """Deleted related objects aren't cloned."""
+        s = self.F.SuiteFactory.create()
+        self.F.SuiteCaseFactory.create(suite=s).delete()
+
+        new = self.model.Suite.bulk_clone([s])[0]
+
+        self.assertEqual(new.suitecases.count(), 0)
+
+
+    def test_constant_queries(self):
+        """The number of queries doesn't depend on the size of the cascade."""
+        def clone_with(num):
+            profile = self.F.ProfileFactory.create()
+            self.F.EnvironmentFactory.create_full_set(
+                {"OS": ["OS{0}".format(i) for i in range(num)],
+                 "Browser": ["Firefox"]},
+                profile,
+                )
+            return self.count_queries(
+                lambda: self.model.Profile.bulk_clone([profile]))
+
+        self.assertEqual(clone_with(1), clone_with(4))
+
+
+    def test_concurrent_insert(self):
+        """Rows inserted at the same time by others aren't taken for clones."""
+        from moztrap.model.mtmodel import MTQuerySet
+        p = self.F.ProductFactory.create(name="One")
+        bulk_create = MTQuerySet.bulk_create
+        others = []
+
+        def bulk_create_and_more(qs, objs, *args, **kwargs):
+            others.append(self.F.ProductFactory.create(name="Other"))
+            ret = bulk_create(qs, objs, *args, **kwargs)
+            others.append(self.F.ProductFactory.create(name="Other"))
+            return ret
+
+        with patch.object(MTQuerySet, "bulk_create", bulk_create_and_more):
+            new = self.model.Product.bulk_clone([p])[0]
+
+        self.assertNotIn(new.id, [o.id for o in others])
+        self.assertEqual(self.refresh(new).name, "One")
+        self.assertEqual(self.refresh(new).cc_version, 0)
+
+
+    def test_clones_not_found(self):
+        """Raises RuntimeError if the clones can't all be found again."""
+        from moztrap.model.mtmodel import MTQuerySet
+        p = self.F.ProductFactory.create()
+
+        with patch.object(MTQuerySet, "bulk_create"):
+            with self.assertRaises(RuntimeError):
+                self.model.Product.bulk_clone([p])
+
+
+    def test_key(self):
+        """With a key, clones are matched up by its fields."""
+        s1 = self.F.SuiteFactory.create(name="One")
+        s2 = self.F.SuiteFactory.create(name="Two", product=s1.product)
+        self.F.SuiteCaseFactory.create(suite=s1)
+
+        n1, n2 = self.model.Suite.bulk_clone(
+            [s1, s2],
+            overrides={"description": "clone"},
+            key=("name", "description"),
+            )
+
+        self.assertEqual(self.refresh(n1).name, "One")
+        self.assertEqual(self.refresh(n2).name, "Two")
+        self.assertEqual(n1.suitecases.count(), 1)
+
+
+
+# calls made to ``record_ids`` by ``DeferTest``
+recorded = []
+
+
+
+def record_ids(ids):
+    recorded.append(ids)
+
+
+
+class DeferTest(case.TestCase):
+    """Tests for ``defer`` and ``deferring``."""
+    def setUp(self):
+        del recorded[:]
+
+
+    def test_immediate(self):
+        """Outside a ``deferring`` block, ``defer`` calls right away."""
+        from moztrap.model.mtmodel import defer
+
+        defer(record_ids, [1, 2])
+
+        self.assertEqual(recorded, [[1, 2]])
+
+
+    def test_deferred_once(self):
+        """Deferred calls are merged and made once, after outermost block."""
+        from moztrap.model.mtmodel import defer, deferring
+
+        with deferring():
+            defer(record_ids, [1, 2])
+            with deferring():
+                defer(record_ids, [2, 3])
+            self.assertEqual(recorded, [])
+
+        self.assertEqual(recorded, [set([1, 2, 3])])
+
+
+    def test_raises(self):
+        """Nothing deferred is called if the block raises."""
+        from moztrap.model.mtmodel import defer, deferring
+
+        with self.assertRaises(ValueError):
+            with deferring():
+                defer(record_ids, [1])
+                raise ValueError()
+
+        defer(record_ids, [2])
+        self.assertEqual(recorded, [[2]])
+
+
+
+class ChoicesGenerationTest(MTModelTestCase):
+    """Tests for choices generation counters."""
+    def setUp(self):
+        super(ChoicesGenerationTest, self).setUp()
+        from django.core.cache import cache
+        cache.clear()
+
+
+    def generation(self, model):
+        from moztrap.model.mtmodel import choices_generation
+        return choices_generation(model)
+
+
+    def test_stable(self):
+        """Generation doesn't change without changes to instances."""
+        self.assertEqual(
+            self.generation(self.model.Product),
+            self.generation(self.model.Product),
+            )
+
+
+    def test_save(self):
+        """Saving an instance of a tracked model starts a new generation."""
+        p = self.F.ProductFactory.create()
+        gen = self.generation(self.model.Product)
+
+        p.save()
+
+        self.assertNotEqual(self.generation(self.model.Product), gen)
+
+
+    def test_update(self):
+        """A queryset update starts a new generation."""
+        self.F.ProductFactory.create()
+        gen = self.generation(self.model.Product)
+
+        self.model.Product.objects.update(name="New")
+
+        self.assertNotEqual(self.generation(self.model.Product), gen)
+
+
+    def test_bulk_create(self):
+        """A bulk insert starts a new generation."""
+        gen = self.generation(self.model.Product)
+
+        self.model.Product.objects.bulk_create(
+            [self.model.Product(name="One"), self.model.Product(name="Two")])
+
+        self.assertNotEqual(self.generation(self.model.Product), gen)
+
+
+    def test_m2m(self):
+        """Changing a tracked many-to-many relation starts a new generation."""
+        pv = self.F.ProductVersionFactory.create()
+        env = self.F.EnvironmentFactory.create()
+        through = self.model.ProductVersion.environments.through
+        gen = self.generation(through)
+
+        pv.environments.add(env)
+
+        self.assertNotEqual(self.generation(through), gen)
+
+
+    def test_soft_delete_cascade(self):
+        """Models (un)deleted in a cascade get a new generation."""
+        pv = self.F.ProductVersionFactory.create()
+        gen = self.generation(self.model.ProductVersion)
+
+        pv.product.delete()
+
+        self.assertNotEqual(self.generation(self.model.ProductVersion), gen)
+
+
+    def test_untracked(self):
+        """Saving instances of models not tracked touches no counter."""
+        from django.core.cache import cache
+        from moztrap.model.mtmodel import _choices_generation_key
+        self.F.CaseStepFactory.create()
+
+        self.assertIsNone(
+            cache.get(_choices_generation_key(self.model.CaseStep)))
+
+
+    def test_evicted(self):
+        """A counter lost from the cache comes back at a new generation."""
+        from django.core.cache import cache
+        gen = self.generation(self.model.Product)
+
+        cache.clear()
+
+        self.assertGreater(self.generation(self.model.Product), gen)
+
+
 
 class MTManagerTest(MTModelTestCase):
     """Tests for MTManager."""
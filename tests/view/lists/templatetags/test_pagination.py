@@ -51,6 +51,27 @@ class PaginateTest(case.DBTestCase):
         )
 
 
+    def test_keyset_unkeyable_ordering(self):
+        """Falls back to Pager if ordering can't be paged by key."""
+        from moztrap.model.execution.models import Run
+
+        tpl = template.Template(
+            "{% load pagination %}{% paginate queryset as pager keyset %}"
+            "{{ pager.keyset|yesno:'keyset,offset' }} "
+            "{% for obj in pager.objects %}{{ obj.name }} {% endfor %}")
+
+        request = Mock()
+        request.GET = {"pagesize": 20, "pagenumber": 1}
+
+        self.F.RunFactory.create(name="One")
+        qs = Run.objects.order_by("runcaseversions__order")
+
+        output = tpl.render(
+            template.Context({"request": request, "queryset": qs}))
+
+        self.assertEqual(output, "offset One ")
+
+
 class FilterTest(case.TestCase):
     """Tests for template filters."""
     def test_pagenumber_url(self):
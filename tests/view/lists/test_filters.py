@@ -614,6 +614,184 @@ class ModelFilterTest(FiltersTestCase):
 
 
 
+class ModelFilterCacheTest(case.DBTestCase):
+    """Tests for caching of ModelFilter choices."""
+    def setUp(self):
+        super(ModelFilterCacheTest, self).setUp()
+        cache.clear()
+
+
+    def filter(self, queryset=None):
+        from moztrap.view.lists.filters import ModelFilter
+        if queryset is None:
+            queryset = self.model.Product.objects.order_by("name")
+        return ModelFilter("product", queryset=queryset)
+
+
+    def test_cached(self):
+        """Choices are cached across filter instances."""
+        p = self.F.ProductFactory.create(name="One")
+        self.filter().get_choices()
+
+        with self.assertNumQueries(0):
+            choices = self.filter().get_choices()
+
+        self.assertEqual(choices, [(p.id, "One")])
+
+
+    def test_save(self):
+        """Saving an instance invalidates cached choices."""
+        p = self.F.ProductFactory.create(name="One")
+        self.filter().get_choices()
+
+        p.name = "Two"
+        p.save()
+
+        self.assertEqual(self.filter().get_choices(), [(p.id, "Two")])
+
+
+    def test_queryset_update(self):
+        """A queryset update invalidates cached choices."""
+        p = self.F.ProductFactory.create(name="One")
+        self.filter().get_choices()
+
+        self.model.Product.objects.filter(pk=p.pk).update(name="Two")
+
+        self.assertEqual(self.filter().get_choices(), [(p.id, "Two")])
+
+
+    def test_delete(self):
+        """Deleting an instance invalidates cached choices."""
+        p = self.F.ProductFactory.create(name="One")
+        self.filter().get_choices()
+
+        self.model.Product.objects.filter(pk=p.pk).delete()
+
+        self.assertEqual(self.filter().get_choices(), [])
+
+
+    def test_distinct_querysets(self):
+        """Filters of one model with different querysets don't share a key."""
+        r = self.F.RunFactory.create(name="Series", is_series=True)
+        self.F.RunFactory.create(name="Single")
+        self.filter(self.model.Run.objects.order_by("name")).get_choices()
+
+        choices = self.filter(
+            self.model.Run.objects.filter(is_series=True)).get_choices()
+
+        self.assertEqual(choices, [(r.id, "Series")])
+
+
+
+class ModelFilterSearchTest(case.DBTestCase):
+    """Tests for ModelFilter in search mode."""
+    def setUp(self):
+        super(ModelFilterSearchTest, self).setUp()
+        cache.clear()
+
+
+    def filter(self):
+        from moztrap.view.lists.filters import ModelFilter
+        return ModelFilter(
+            "tag",
+            queryset=self.model.Tag.objects.order_by("name"),
+            search="name",
+            )
+
+
+    def test_cls(self):
+        """Search-mode filters have the "search" class."""
+        self.assertEqual(self.filter().cls, "search")
+
+
+    def test_options_only_selected(self):
+        """Only selected options are displayed."""
+        t = self.F.TagFactory.create(name="one")
+        self.F.TagFactory.create(name="two")
+
+        f = self.filter()
+
+        self.assertEqual(f.options([t.id]), [(t.id, "one")])
+        with self.assertNumQueries(0):
+            self.assertEqual(f.options([]), [])
+
+
+    def test_values(self):
+        """Selected values must be of existing options."""
+        t = self.F.TagFactory.create(name="one")
+
+        values = self.filter().values({"tag": [str(t.id), "0", "foo"]})
+
+        self.assertEqual(values, [t.id])
+
+
+    def test_selected_cached(self):
+        """Selected options are looked up once, until a tag changes."""
+        t = self.F.TagFactory.create(name="one")
+        f = self.filter()
+        f.options([t.id])
+
+        with self.assertNumQueries(0):
+            self.assertEqual(f.values({"tag": [str(t.id)]}), [t.id])
+            self.assertEqual(f.options([t.id]), [(t.id, "one")])
+
+        t.name = "new"
+        t.save()
+
+        self.assertEqual(f.options([t.id]), [(t.id, "new")])
+
+
+    def test_search(self):
+        """Options are prefix-matched case-insensitively, in order."""
+        t1 = self.F.TagFactory.create(name="Foo")
+        t2 = self.F.TagFactory.create(name="Fab")
+        self.F.TagFactory.create(name="afoo")
+
+        options, more = self.filter().search("f")
+
+        self.assertEqual(options, [(t2.id, "Fab"), (t1.id, "Foo")])
+        self.assertFalse(more)
+
+
+    def test_search_pages(self):
+        """Search results are paginated."""
+        tags = [self.F.TagFactory.create(name="t{0}".format(i))
+                for i in range(3)]
+        f = self.filter()
+        f.search_page_size = 2
+
+        self.assertEqual(
+            f.search("t"), ([(t.id, t.name) for t in tags[:2]], True))
+        self.assertEqual(
+            f.search("t", page=2), ([(tags[2].id, "t2")], False))
+
+
+    def test_search_label_fields(self):
+        """With several search fields, a prefix of the label matches."""
+        from moztrap.view.lists.filters import ModelFilter
+        ff10 = self.F.ProductVersionFactory.create(
+            product__name="Fire Fox", version="10")
+        ff2 = self.F.ProductVersionFactory.create(
+            product=ff10.product, version="2")
+        other = self.F.ProductVersionFactory.create(
+            product__name="Other", version="1")
+        f = ModelFilter(
+            "productversion",
+            queryset=self.model.ProductVersion.objects.all(),
+            search=("product__name", "version"),
+            )
+
+        def ids(text):
+            return [pk for pk, label in f.search(text)[0]]
+
+        self.assertEqual(ids("fire"), [ff10.id, ff2.id])
+        self.assertEqual(ids("Fire Fox"), [ff10.id, ff2.id])
+        self.assertEqual(ids("fire fox 1"), [ff10.id])
+        self.assertEqual(ids("1"), [ff10.id, other.id])
+        self.assertEqual(ids("Fire Fox 10 x"), [])
+
+
+
 class KeywordExactFilterTest(FiltersTestCase):
     """Tests for KeywordExactFilter."""
     def test_options(self):
@@ -2,7 +2,7 @@
 Tests for pagination utilities.
 
 """
-from mock import Mock
+from mock import Mock, patch
 
 from django.core.exceptions import SuspiciousOperation
 
@@ -121,7 +121,7 @@ class TestPager(case.DBTestCase):
         """Returns mock queryset with given count."""
         qs = Mock()
         qs.count.return_value = count
-        qs.empty.return_value = []
+        qs.none.return_value = []
         qs.__getitem__ = Mock()
         return qs
 
@@ -235,6 +235,15 @@ class TestPager(case.DBTestCase):
         self.assertEqual(qs.count.call_count, 1)
 
 
+    def test_total_given(self):
+        """A given total is used without counting the queryset."""
+        qs = self.qs(10)
+        p = self.pager(qs, 20, 1, total=12)
+
+        self.assertEqual(p.total, 12)
+        self.assertEqual(qs.count.call_count, 0)
+
+
     def test_objects(self):
         """.objects is list of objects on current page."""
         products = [
@@ -355,6 +364,238 @@ class TestPager(case.DBTestCase):
 
 
 
+class TestCursorUrl(case.TestCase):
+    """Tests for ``cursor_url`` function."""
+    @property
+    def func(self):
+        """The function under test."""
+        from moztrap.view.lists.pagination import cursor_url
+        return cursor_url
+
+
+    def test_after(self):
+        """Sets the after cursor, removing any before cursor."""
+        self.assertEqual(
+            Url(self.func("http://fake.base/?pagebefore=b&pagesize=10", "a")),
+            Url("http://fake.base/?pageafter=a&pagesize=10"))
+
+
+    def test_first(self):
+        """Without cursors, removes both; absent keys are no problem."""
+        self.assertEqual(
+            Url(self.func("http://fake.base/?pageafter=a")),
+            Url("http://fake.base/"))
+
+
+
+class TestKeysetPager(case.DBTestCase):
+    """Tests for ``KeysetPager`` class."""
+    @property
+    def pager(self):
+        """The class under test."""
+        from moztrap.view.lists.pagination import KeysetPager
+        return KeysetPager
+
+
+    def runs(self, *ends):
+        """Create runs named r0, r1... with given end dates; return them."""
+        return [
+            self.F.RunFactory.create(name="r{0}".format(i), end=end)
+            for i, end in enumerate(ends)
+            ]
+
+
+    def walk(self, qs, pagesize):
+        """Return list of pages (lists of objects) paging forward."""
+        pages = []
+        pager = self.pager(qs, pagesize)
+        while True:
+            pages.append(pager.objects)
+            if pager.next is None:
+                return pages
+            pager = self.pager(qs, pagesize, after=pager.next)
+
+
+    def test_first_page(self):
+        """First page has no prev, and a next if there is more."""
+        self.runs(None, None, None)
+        pager = self.pager(
+            self.model.Run.objects.order_by("name"), 2)
+
+        self.assertEqual([r.name for r in pager.objects], ["r0", "r1"])
+        self.assertEqual(pager.count, 2)
+        self.assertIsNone(pager.prev)
+        self.assertIsNotNone(pager.next)
+        self.assertTrue(pager.first)
+        self.assertIsNone(pager.total)
+
+
+    def test_forward(self):
+        """Paging forward visits all objects once, in order."""
+        self.runs(*[None] * 5)
+        pages = self.walk(self.model.Run.objects.order_by("-name"), 2)
+
+        self.assertEqual(
+            [[r.name for r in p] for p in pages],
+            [["r4", "r3"], ["r2", "r1"], ["r0"]])
+
+
+    def test_ties_and_nulls(self):
+        """Ties are broken by pk, nulls sort as the database sorts them."""
+        import datetime
+        d1, d2 = datetime.date(2012, 1, 1), datetime.date(2012, 2, 1)
+        self.runs(d2, None, d1, None, d2, d1)
+
+        for order, tiebreak in [("end", "pk"), ("-end", "-pk")]:
+            qs = self.model.Run.objects.order_by(order)
+            expected = [r.name for r in qs.order_by(order, tiebreak)]
+            pages = self.walk(qs, 2)
+            self.assertEqual([r.name for p in pages for r in p], expected)
+
+
+    def test_backward(self):
+        """The before cursor of a page gives the page preceding it."""
+        self.runs(*[None] * 5)
+        qs = self.model.Run.objects.order_by("name")
+        second = self.pager(qs, 2, after=self.pager(qs, 2).next)
+        third = self.pager(qs, 2, after=second.next)
+
+        back = self.pager(qs, 2, before=third.prev)
+
+        self.assertEqual([r.name for r in back.objects], ["r2", "r3"])
+        self.assertIsNotNone(back.prev)
+        self.assertIsNotNone(back.next)
+
+        first = self.pager(qs, 2, before=back.prev)
+        self.assertEqual([r.name for r in first.objects], ["r0", "r1"])
+        self.assertIsNone(first.prev)
+
+
+    def test_bad_cursor(self):
+        """A malformed cursor, or one from another sort, gives first page."""
+        self.runs(*[None] * 3)
+        qs = self.model.Run.objects.order_by("name")
+        other = self.pager(self.model.Run.objects.order_by("-name"), 1).next
+
+        for cursor in ["garbage", other]:
+            pager = self.pager(qs, 1, after=cursor)
+            self.assertEqual([r.name for r in pager.objects], ["r0"])
+            self.assertTrue(pager.first)
+
+
+    def test_related_ordering(self):
+        """Ordering on a relation follows the related model's ordering."""
+        from moztrap.view.lists.pagination import sort_keys
+        qs = self.model.RunCaseVersion.objects.order_by(
+            "run__productversion")
+
+        self.assertEqual(
+            sort_keys(qs),
+            [
+                "run__productversion__product__name",
+                "run__productversion__order",
+                "pk",
+                ]
+            )
+        self.assertEqual(
+            sort_keys(self.model.RunCaseVersion.objects.order_by("-run")),
+            ["-run__pk", "-pk"])
+
+
+    def test_unsupported_ordering(self):
+        """Orderings that can't be keyed on raise ValueError."""
+        from moztrap.view.lists.pagination import sort_keys
+        with self.assertRaises(ValueError):
+            sort_keys(self.model.Run.objects.order_by("?"))
+        with self.assertRaises(ValueError):
+            sort_keys(self.model.Run.objects.order_by("runcaseversions"))
+
+
+    def test_total(self):
+        """A known or estimated total can be given; it isn't counted."""
+        pager = self.pager(
+            self.model.Run.objects.all(), 20, total=1000, estimated=True)
+
+        self.assertEqual(pager.total, 1000)
+        self.assertTrue(pager.estimated)
+
+
+
+class TestListTotal(case.DBTestCase):
+    """Tests for ``list_total`` and ``cached_count`` functions."""
+    @property
+    def func(self):
+        """The function under test."""
+        from moztrap.view.lists.pagination import list_total
+        return list_total
+
+
+    def test_cached(self):
+        """The count is cached; ordering doesn't matter to the cache."""
+        self.F.RunFactory.create()
+        self.assertEqual(
+            self.func(self.model.Run.objects.order_by("name")), (1, False))
+
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                self.func(self.model.Run.objects.order_by("-start")),
+                (1, False))
+
+
+    def test_filtered(self):
+        """Differently filtered querysets are counted separately."""
+        self.F.RunFactory.create(name="Foo")
+        self.F.RunFactory.create(name="Bar")
+        self.func(self.model.Run.objects.all())
+
+        self.assertEqual(
+            self.func(self.model.Run.objects.filter(name="Foo")), (1, False))
+
+
+    def test_invalidated(self):
+        """Changes to any tracked model the query touches start a new count."""
+        r = self.F.RunFactory.create()
+        env = self.F.EnvironmentFactory.create()
+        qs = self.model.Run.objects.filter(environments__isnull=False)
+        self.assertEqual(self.func(qs), (0, False))
+
+        r.environments.add(env)
+
+        self.assertEqual(self.func(qs), (1, False))
+
+
+    def test_estimate(self):
+        """Large unfiltered querysets get the query planner's estimate."""
+        self.F.RunFactory.create()
+        qs = self.model.Run.objects.all()
+        target = "moztrap.view.lists.pagination.estimated_count"
+
+        with patch(target) as mock_estimate:
+            mock_estimate.return_value = 200000
+            with self.settings(LIST_TOTAL_ESTIMATE_THRESHOLD=100000):
+                self.assertEqual(self.func(qs, estimate=True), (200000, True))
+                self.assertEqual(
+                    self.func(qs.filter(name="Foo"), estimate=True), (0, False))
+            with self.settings(LIST_TOTAL_ESTIMATE_THRESHOLD=None):
+                self.assertEqual(self.func(qs, estimate=True), (1, False))
+
+            mock_estimate.return_value = 20
+            with self.settings(LIST_TOTAL_ESTIMATE_THRESHOLD=100000):
+                self.assertEqual(self.func(qs, estimate=True), (1, False))
+
+
+    def test_is_unfiltered(self):
+        """Ordering, select_related and only don't make a queryset filtered."""
+        from moztrap.view.lists.pagination import is_unfiltered
+        qs = self.model.Run.objects.all()
+
+        self.assertTrue(
+            is_unfiltered(qs.order_by("name").select_related().only("name")))
+        self.assertFalse(is_unfiltered(qs.filter(name="Foo")))
+        self.assertFalse(is_unfiltered(self.model.Run.everything.all()))
+
+
+
 class TestPositiveInteger(case.TestCase):
     """Tests for ``positive_integer`` function."""
     @property
@@ -38,6 +38,26 @@ class AddProfileFormTest(case.DBTestCase):
             set(p.environments.get().elements.all()), set([e1, e2]))
 
 
+    def test_too_many_environments(self):
+        """Elements that would generate too many environments are invalid."""
+        e1 = self.F.ElementFactory.create(category__name="One")
+        e2 = self.F.ElementFactory.create(category=e1.category)
+
+        with self.settings(MAX_PROFILE_ENVIRONMENTS=1):
+            f = self.form(
+                {
+                    "elements": [str(e1.id), str(e2.id)],
+                    "name": "Foo",
+                    "cc_version": "0"},
+                )
+            self.assertFalse(f.is_valid())
+
+        self.assertEqual(
+            f.errors["elements"],
+            ["These elements would generate 2 environments; "
+             "the maximum is 1."])
+
+
     def test_empty_category_rendered(self):
         """A category with no elements is still rendered in elements widget."""
         self.F.CategoryFactory.create(name="EmptyCat")
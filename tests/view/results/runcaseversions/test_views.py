@@ -40,6 +40,25 @@ class RunCaseVersionResultsViewTest(case.view.ListViewTestCase,
         self.assertNotInList(res, "Case 2")
 
 
+    def test_filter_by_result_status(self):
+        """Can filter by current result status in any environment."""
+        rcv1 = self.F.RunCaseVersionFactory.create(caseversion__name="Case 1")
+        rcv2 = self.F.RunCaseVersionFactory.create(caseversion__name="Case 2")
+        env = self.F.EnvironmentFactory.create()
+        self.F.ResultFactory.create(
+            runcaseversion=rcv1, environment=env, status="passed")
+        # another tester's newer result is the current one
+        self.F.ResultFactory.create(
+            runcaseversion=rcv2, environment=env, status="passed")
+        self.F.ResultFactory.create(
+            runcaseversion=rcv2, environment=env, status="failed")
+
+        res = self.get(params={"filter-resultstatus": "passed"})
+
+        self.assertInList(res, "Case 1")
+        self.assertNotInList(res, "Case 2")
+
+
     def test_filter_by_id(self):
         """Can filter by id."""
         rcv1 = self.F.RunCaseVersionFactory.create(caseversion__name="Case 1")
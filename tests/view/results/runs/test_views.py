@@ -27,6 +27,36 @@ class RunResultsViewTest(case.view.ListViewTestCase,
         return reverse("results_runs")
 
 
+    def test_keyset_pages(self):
+        """List pages by sort key; next link leads to the following page."""
+        self.factory.create(name="Foo 1")
+        self.factory.create(name="Foo 2")
+
+        res = self.get(
+            params={"sortfield": "name", "sortdirection": "asc", "pagesize": 10})
+        res.mustcontain("showing 2")
+        self.assertNotIn("pageafter", res.body)
+
+        for i in range(9):
+            self.factory.create(name="Foo 3{0}".format(i))
+        res = self.get(
+            params={"sortfield": "name", "sortdirection": "asc", "pagesize": 10})
+        res = res.click(href="pageafter")
+
+        self.assertInList(res, "Foo 38")
+        self.assertNotInList(res, "Foo 1")
+        res.mustcontain("pagebefore")
+
+
+    def test_unkeyable_sortfield(self):
+        """A sort field that can't be paged by key pages by number."""
+        self.factory.create(name="Foo 1")
+
+        res = self.get(params={"sortfield": "runcaseversions__order"})
+
+        self.assertInList(res, "Foo 1")
+
+
 
 class RunDetailTest(case.view.AuthenticatedViewTestCase):
     """Test for run-detail ajax view."""
@@ -246,3 +246,129 @@ class SuitesForTest(case.DBTestCase):
                 "{% for suite in suites %}{{ suite.id }} {% endfor %}"),
             "{0} ".format(ts.id)
         )
+
+
+
+class ResultIndexTest(case.DBTestCase):
+    """Tests for the result_index template tag and its use by other tags."""
+    def setUp(self):
+        """Set up an active run with two cases, both in a suite."""
+        super(ResultIndexTest, self).setUp()
+        self.envs = self.F.EnvironmentFactory.create_full_set({"OS": ["OS X"]})
+        self.env = self.envs[0]
+        self.pv = self.F.ProductVersionFactory(environments=self.envs)
+        self.suite = self.F.SuiteFactory.create(
+            product=self.pv.product, status="active")
+        for i in range(2):
+            cv = self.F.CaseVersionFactory.create(
+                productversion=self.pv, status="active")
+            self.F.CaseStepFactory.create(caseversion=cv)
+            self.F.SuiteCaseFactory.create(suite=self.suite, case=cv.case)
+        self.run = self.F.RunFactory.create(
+            productversion=self.pv, environments=self.envs)
+        self.F.RunSuiteFactory.create(suite=self.suite, run=self.run)
+        self.run.activate()
+        self.user = self.F.UserFactory.create()
+
+
+    def render(self, render):
+        """Render given string for each rcv of the run, with an index."""
+        t = Template(
+            "{% load execution %}"
+            "{% result_index rcvs user env run %}"
+            "{% for rcv in rcvs %}" + render + "{% endfor %}")
+        return t.render(
+            Context({
+                    "rcvs": self.run.runcaseversions.select_related(
+                        "caseversion"),
+                    "user": self.user,
+                    "env": self.env,
+                    "run": self.run,
+                    }))
+
+
+    def test_results(self):
+        """Finds the user's results and other users' completed results."""
+        rcv1, rcv2 = self.run.runcaseversions.all()
+        r = self.F.ResultFactory.create(
+            runcaseversion=rcv1, tester=self.user, environment=self.env)
+        other = self.F.ResultFactory.create(
+            runcaseversion=rcv2, environment=self.env, status="passed")
+
+        self.assertEqual(
+            self.render(
+                "{% result_for rcv user env as result %}"
+                "{% other_result_for rcv user env as other %}"
+                "{{ result.id }}-{{ other.id }} "),
+            "{0}- None-{1} ".format(r.id, other.id),
+            )
+
+
+    def test_stepresults_and_bug_urls(self):
+        """Finds step results and bug URLs of the user's results."""
+        rcv1, rcv2 = self.run.runcaseversions.all()
+        r = self.F.ResultFactory.create(
+            runcaseversion=rcv1,
+            tester=self.user,
+            environment=self.env,
+            status="failed",
+            )
+        step = rcv1.caseversion.steps.get()
+        sr = self.F.StepResultFactory.create(
+            result=r, step=step, status="failed", bug_url="http://bug/1")
+
+        self.assertEqual(
+            self.render(
+                "{% result_for rcv user env as result %}"
+                "{% for step in rcv.caseversion.steps.all %}"
+                "{% stepresult_for result step as stepresult %}"
+                "{{ stepresult.id }}{% endfor %}"
+                "{% bug_urls_for result as rbugs %}"
+                "{% bug_urls_for rcv.caseversion as cvbugs %}"
+                "/{{ rbugs|join:',' }}/{{ cvbugs|join:',' }} "),
+            "{0}/http://bug/1/http://bug/1 None// ".format(sr.id),
+            )
+
+
+    def test_suites(self):
+        """Finds the run's suites each case is in."""
+        self.assertEqual(
+            self.render(
+                "{% suites_for run rcv as suites %}"
+                "{% for suite in suites %}{{ suite.id }}{% endfor %} "),
+            "{0} {0} ".format(self.suite.id),
+            )
+
+
+    def test_constant_queries(self):
+        """Number of queries doesn't depend on the number of cases."""
+        for rcv in self.run.runcaseversions.all():
+            self.F.ResultFactory.create(
+                runcaseversion=rcv,
+                tester=self.user,
+                environment=self.env,
+                status="failed",
+                )
+        tags = (
+            "{% result_for rcv user env as result %}"
+            "{% other_result_for rcv user env as other %}"
+            "{% suites_for run rcv as suites %}"
+            "{% bug_urls_for result as rbugs %}"
+            "{% bug_urls_for rcv.caseversion as cvbugs %}"
+            )
+
+        # runcaseversions, results, step results, suites (2), bug URLs
+        with self.assertNumQueries(6):
+            self.render(tags)
+
+
+    def test_fallback_without_index(self):
+        """Without an index, bug_urls_for queries the object itself."""
+        r = self.F.ResultFactory.create()
+        self.F.StepResultFactory.create(result=r, bug_url="http://bug/2")
+        t = Template(
+            "{% load execution %}"
+            "{% bug_urls_for result as bugs %}{{ bugs|join:',' }}")
+
+        self.assertEqual(
+            t.render(Context({"result": r})), "http://bug/2")
@@ -2,6 +2,8 @@
 Tests for runtests forms.
 
 """
+import json
+
 from tests import case
 
 
@@ -175,6 +177,36 @@ class EnvironmentSelectionFormTest(case.DBTestCase):
         self.assertEqual(f.save(), winff.id)
 
 
+    def test_matrix(self):
+        """Can pass in matrix of environments instead."""
+        envs = self.F.EnvironmentFactory.create_full_set(
+            {"OS": ["Linux", "Windows"]})
+        cat = self.model.Category.objects.get()
+        run = self.F.RunFactory.create(environments=envs)
+
+        f = self.form(
+            {"category_{0}".format(cat.id): str(envs[1].elements.get().id)},
+            matrix=run.environment_matrix())
+
+        self.assertTrue(f.is_valid(), f.errors)
+        self.assertEqual(f.save(), envs[1].id)
+
+
+    def test_valid_environments_json(self):
+        """Valid environments are element ids ordered by category."""
+        self.F.EnvironmentFactory.create_set(
+            ["OS", "Browser"], ["OS X", "Safari"], ["Windows", "IE"])
+        el = dict(
+            (e.name, e.id) for e in self.model.Element.objects.all())
+
+        f = self.form(environments=self.model.Environment.objects.all())
+
+        self.assertEqual(
+            json.loads(f.valid_environments_json()),
+            [[el["Safari"], el["OS X"]], [el["IE"], el["Windows"]]],
+            )
+
+
 
 class EnvironmentBuildSelectionFormTest(case.DBTestCase):
     """
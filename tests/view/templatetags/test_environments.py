@@ -0,0 +1,47 @@
+"""
+Tests for environment template filters.
+
+"""
+from django.template import Template, Context
+
+from tests import case
+
+
+
+class WithElementNamesTest(case.DBTestCase):
+    """Tests for with_element_names filter."""
+    def render(self, template, **context):
+        """Render given template string with given context."""
+        return Template(
+            "{% load environments %}" + template).render(Context(context))
+
+
+    def test_environments(self):
+        """Element names of all the environments are fetched at once."""
+        envs = self.F.EnvironmentFactory.create_set(
+            ["OS", "Language"], ["OS X", "English"], ["Linux", "German"])
+        qs = self.model.Environment.objects.filter(
+            pk__in=[e.id for e in envs]).order_by("id")
+
+        with self.assertNumQueries(2):
+            out = self.render(
+                "{% for env in envs|with_element_names %}"
+                "{{ env }};{% endfor %}",
+                envs=qs,
+                )
+
+        self.assertEqual(out, "English, OS X;German, Linux;")
+
+
+    def test_attr(self):
+        """Given an attribute, names of those environments are fetched."""
+        r = self.F.ResultFactory.create()
+        r.environment.elements.add(self.F.ElementFactory.create(name="Linux"))
+
+        out = self.render(
+            "{% for r in results|with_element_names:'environment' %}"
+            "{{ r.environment }}{% endfor %}",
+            results=[self.refresh(r)],
+            )
+
+        self.assertEqual(out, "Linux")
@@ -56,3 +56,57 @@ class GoogleAnalyticsViewTest(case.view.AuthenticatedViewTestCase):
     def test_google_analytics_present(self):
         res = self.get(status=200)
         self.assertTrue(settings.GOOGLE_ANALYTICS_ID in res.content)
+
+
+
+class FilterOptionsViewTest(case.view.AuthenticatedViewTestCase):
+    """Tests for options lookup of search-mode list filters."""
+    @property
+    def url(self):
+        return reverse("filter_options")
+
+
+    def get_json(self, **params):
+        params.setdefault("path", reverse("manage_runs"))
+        return json.loads(self.get(params=params).content)
+
+
+    def test_search(self):
+        """Returns options of search-mode filters matching typed prefix."""
+        self.F.UserFactory.create(username="foo")
+        self.F.UserFactory.create(username="bar")
+
+        data = self.get_json(text="fo", key="creator")
+
+        self.assertEqual(
+            [(s["name"], s["type"], s["typedText"], s["postText"])
+             for s in data["suggestions"]],
+            [("foo", "creator", "fo", "o")],
+            )
+        self.assertFalse(data["more"])
+
+
+    def test_all_search_filters(self):
+        """Without a key, all search-mode filters of the list are searched."""
+        u = self.F.UserFactory.create(username="foo")
+        pv = self.F.ProductVersionFactory.create(version="fo1")
+
+        data = self.get_json(text="fo")
+
+        self.assertEqual(
+            set((s["type"], s["id"]) for s in data["suggestions"]),
+            set([("creator", u.id), ("productversion", pv.id)]),
+            )
+
+
+    def test_no_text(self):
+        """Without typed text, there are no suggestions."""
+        self.F.UserFactory.create(username="foo")
+
+        self.assertEqual(self.get_json(text="")["suggestions"], [])
+
+
+    def test_bad_path(self):
+        """Path must be of a list page with filters."""
+        self.get(params={"path": "/nonexistent/", "text": "a"}, status=404)
+        self.get(params={"path": reverse("home"), "text": "a"}, status=404)